@@ -0,0 +1,735 @@
+import asyncio
+import contextlib
+import datetime
+import os
+import sys
+from decimal import Decimal
+from typing import List, Optional
+
+import aiomysql
+from fastapi import Depends, FastAPI, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+import migrations
+from auth import LOGIN_SQL, TOKEN_SECRET, password_hasher, session_tokens
+from bank import (ARCHIVE_BOUNDARY_SQL, BENEFICIARIES_SQL, CENT, CUSTOMER_ACCOUNTS_SQL, LOAN_INTEREST_RATE,
+                  POST_BALANCE_SQL, PRIMARY_ACCOUNT_SQL, INSERT_CARD_SQL, INSERT_TRANSACTION_SQL,
+                  REMOVE_BENEFICIARY_SQL, RETRYABLE_ERRNOS, TRANSFER_RETRIES, archive_boundary,
+                  check_card_request, decode_page_token, fd_interest_rate, lock_retry_delay, merge_page_rows,
+                  page_needs_archive, signed_amount, transaction_page, transaction_page_query, transfer_legs)
+from cards import CARD_BIN, CUSTOMER_CARDS_SQL, RESERVE_SQL, SEQUENCE_INIT_SQL, card_numbers, existing_numbers_query
+from config import database_settings, get_setting
+from loans import LOAN_TERMS_COLUMNS, loan_summaries, schedules
+from notifications import (CHUNK_SIZE as NOTIFICATION_CHUNK_SIZE, MARK_READ_BEFORE_SQL, UNREAD_COUNT_SQL,
+                           feed_page, feed_query, mark_read_query)
+from outbox import ENQUEUE_SQL, card_issued_event
+from query_stats import ENABLED as QUERY_STATS_ENABLED, AsyncInstrumentedCursor, query_stats
+
+# Async HTTP front end for the bank (run with `uvicorn api:app --workers N`).
+# Each worker process holds one aiomysql pool. Database work is admitted
+# through a semaphore the size of the pool, so a connection is always free
+# once a request gets in; requests that cannot get in within queue_timeout
+# are answered 503 instead of piling up behind the pool.
+
+POOL_SIZE = get_setting('api', 'pool_size', 20, int)
+QUEUE_TIMEOUT = get_setting('api', 'queue_timeout', 2.0, float)
+# Worker processes serving the API. When unset it is read from the server's
+# --workers/-w flag (spawned workers inherit sys.argv) or WEB_CONCURRENCY.
+# More than one worker needs a shared auth.token_secret.
+WORKERS = get_setting('api', 'workers', None, int)
+
+# MySQL errors that tell IntegrityErrors apart
+ER_DUP_ENTRY = 1062
+ER_NO_REFERENCED_ROW = 1452
+# Card numbers tried before giving up on an issue request
+CARD_INSERT_ATTEMPTS = 3
+
+# Deadlock/lock-wait retries and transfers abandoned after the last retry in
+# this worker, as BankManagement.transfer_stats counts them
+transfer_stats = {'retries': 0, 'aborts': 0}
+
+
+def worker_count():
+    if WORKERS is not None:
+        return WORKERS
+    argv = sys.argv
+    for i, arg in enumerate(argv):
+        if arg in ('--workers', '-w') and i + 1 < len(argv):
+            return int(argv[i + 1])
+        if arg.startswith('--workers='):
+            return int(arg.split('=', 1)[1])
+    return int(os.environ.get('WEB_CONCURRENCY', 1))
+
+
+def check_token_secret():
+    # Without a shared secret each worker signs with its own random key and
+    # rejects every token issued by the others
+    workers = worker_count()
+    if workers > 1 and not TOKEN_SECRET:
+        raise RuntimeError(f"API running with {workers} workers needs auth.token_secret "
+                           "(BANK_AUTH_TOKEN_SECRET) set to the same value on every worker")
+
+
+class AsyncSession:
+    __slots__ = ('connection', 'cursor')
+
+    def __init__(self, connection, cursor):
+        self.connection = connection
+        self.cursor = cursor
+
+
+class AsyncDatabase:
+    def __init__(self, pool_size=POOL_SIZE, queue_timeout=QUEUE_TIMEOUT):
+        self.pool_size = pool_size
+        self.queue_timeout = queue_timeout
+        self.pool = None
+        self.slots = None
+
+    async def open(self):
+        settings = database_settings()
+        self.pool = await aiomysql.create_pool(host=settings['host'], port=settings['port'],
+                                               user=settings['user'], password=settings['password'],
+                                               db=settings['database'],
+                                               connect_timeout=settings['connect_timeout'],
+                                               minsize=1, maxsize=self.pool_size,
+                                               autocommit=False, pool_recycle=3600)
+        self.slots = asyncio.Semaphore(self.pool_size)
+        async with self.session() as session:
+            try:
+                await session.cursor.execute("SELECT MAX(version) FROM schema_version")
+                version = (await session.cursor.fetchone())[0] or 0
+            except aiomysql.ProgrammingError as e:
+                # An empty database has no schema_version table yet
+                if e.args[0] != migrations.ER_NO_SUCH_TABLE:
+                    raise
+                version = 0
+        if version < migrations.LATEST_VERSION:
+            await self.close()
+            raise RuntimeError(f"Schema is at version {version}, expected {migrations.LATEST_VERSION}; "
+                               "run `python migrations.py` first")
+
+    async def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            await self.pool.wait_closed()
+            self.pool = None
+
+    @contextlib.asynccontextmanager
+    async def session(self):
+        """Yield an AsyncSession; uncommitted work is rolled back on exit."""
+        try:
+            await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=503, detail="Server busy, retry shortly")
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.cursor() as cursor:
+                    try:
+                        yield AsyncSession(connection,
+                                           AsyncInstrumentedCursor(cursor) if QUERY_STATS_ENABLED else cursor)
+                    finally:
+                        # Also ends read-only transactions so the pool keeps the connection
+                        with contextlib.suppress(aiomysql.Error):
+                            await connection.rollback()
+        finally:
+            self.slots.release()
+
+
+db = AsyncDatabase()
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    check_token_secret()
+    await db.open()
+    try:
+        yield
+    finally:
+        await db.close()
+
+
+app = FastAPI(title="Bank Management API", lifespan=lifespan)
+
+
+# ---------------------------------------------------------
+# Request bodies
+# ---------------------------------------------------------
+class CustomerIn(BaseModel):
+    name: str
+    address: str = ''
+    phone: str = ''
+    email: str
+    password: str = Field(min_length=1)
+
+
+class LoginIn(BaseModel):
+    email: str
+    password: str
+
+
+class AccountIn(BaseModel):
+    account_type: str = Field(pattern='^(Savings|Checking)$')
+    initial_balance: Decimal = Field(default=Decimal('0'), ge=0, max_digits=15, decimal_places=2)
+
+
+class PostingIn(BaseModel):
+    amount: Decimal = Field(gt=0, max_digits=15, decimal_places=2)
+    description: Optional[str] = None
+
+
+class TransferIn(BaseModel):
+    from_account_id: int
+    to_account_id: int
+    amount: Decimal = Field(gt=0, max_digits=15, decimal_places=2)
+
+
+class LoanIn(BaseModel):
+    loan_type: str = Field(pattern='^(Personal|Home|Vehicle|Education|Business)$')
+    amount: Decimal = Field(ge=1000, max_digits=15, decimal_places=2)
+    term_months: int = Field(ge=6, le=360)
+    branch_id: int
+
+
+class CardIn(BaseModel):
+    card_type: str
+    credit_limit: Decimal = Field(ge=0, max_digits=15, decimal_places=2)
+
+
+class FixedDepositIn(BaseModel):
+    amount: Decimal = Field(ge=1000, max_digits=15, decimal_places=2)
+    term_months: int = Field(ge=1, le=120)
+    account_id: Optional[int] = None
+
+
+class MarkReadIn(BaseModel):
+    notification_ids: List[int] = Field(default_factory=list, max_length=1000)
+    before: Optional[datetime.datetime] = None
+
+
+class BeneficiaryIn(BaseModel):
+    name: str = Field(min_length=1)
+    account_number: str = Field(min_length=1)
+    bank_name: str = Field(min_length=1)
+    ifsc_code: str = Field(min_length=1)
+    relationship: str = 'Other'
+
+
+# ---------------------------------------------------------
+# Helpers
+# ---------------------------------------------------------
+def _money(value):
+    # Amounts go out as strings so clients never see float rounding
+    return None if value is None else str(Decimal(value).quantize(CENT))
+
+
+def _rows(cursor, rows):
+    names = [column[0] for column in cursor.description]
+    return [dict(zip(names, row)) for row in rows]
+
+
+async def _post(cursor, account_id, txn_type, amount, description):
+    """Async twin of bank.post_transaction; does not commit."""
+    delta = signed_amount(txn_type, amount)
+    await cursor.execute(POST_BALANCE_SQL, (delta, account_id, delta))
+    if cursor.rowcount != 1:
+        return None
+    new_balance = (Decimal(cursor.lastrowid) * CENT).quantize(CENT)
+    await cursor.execute(INSERT_TRANSACTION_SQL, (account_id, txn_type, amount, description))
+    return new_balance
+
+
+async def _posting_refused(cursor, account_id):
+    """Turn a refused conditional write into the matching HTTP error."""
+    await cursor.execute("SELECT status FROM accounts WHERE account_id = %s", (account_id,))
+    row = await cursor.fetchone()
+    if row is None:
+        return HTTPException(status_code=404, detail=f"Account {account_id} not found")
+    if row[0] != 'active':
+        return HTTPException(status_code=409, detail=f"Account {account_id} is {row[0]}")
+    return HTTPException(status_code=409, detail=f"Insufficient balance in account {account_id}")
+
+
+async def _own_account(cursor, account_id, customer_id):
+    """404 unless the account exists and belongs to ``customer_id`` (others' ids are not revealed)."""
+    await cursor.execute("SELECT 1 FROM accounts WHERE account_id = %s AND customer_id = %s",
+                         (account_id, customer_id))
+    if await cursor.fetchone() is None:
+        raise HTTPException(status_code=404, detail=f"Account {account_id} not found")
+
+
+async def _allocate_card_number(session):
+    """Async twin of CardNumberAllocator.allocate(1); commits the reservation.
+
+    The sequence value is reserved in its own short transaction so issuers
+    never queue on the row lock, and a number held by an older, randomly
+    generated card is skipped.
+    """
+    while True:
+        await session.cursor.execute(SEQUENCE_INIT_SQL, (CARD_BIN,))
+        await session.cursor.execute(RESERVE_SQL, (1, CARD_BIN))
+        card_number = card_numbers(session.cursor.lastrowid - 1, 1)[0]
+        await session.connection.commit()
+        await session.cursor.execute(*existing_numbers_query([card_number]))
+        if await session.cursor.fetchone() is None:
+            return card_number
+
+
+async def _with_lock_retry(work):
+    """Await ``work()`` (which opens its own session), retrying it on deadlock or lock wait timeout.
+
+    Async twin of BankManagement._with_lock_retry; a request still failing
+    after TRANSFER_RETRIES retries is answered 503.
+    """
+    for attempt in range(TRANSFER_RETRIES + 1):
+        try:
+            return await work()
+        except aiomysql.Error as e:
+            if not e.args or e.args[0] not in RETRYABLE_ERRNOS:
+                raise
+            if attempt == TRANSFER_RETRIES:
+                transfer_stats['aborts'] += 1
+                raise HTTPException(status_code=503, detail="Accounts are busy, retry shortly") from e
+            transfer_stats['retries'] += 1
+            await asyncio.sleep(lock_retry_delay(attempt))
+
+
+async def _primary_account(cursor, customer_id):
+    await cursor.execute(PRIMARY_ACCOUNT_SQL, (customer_id,))
+    row = await cursor.fetchone()
+    if row is None:
+        raise HTTPException(status_code=409, detail="Customer has no active account")
+    return row[0]
+
+
+async def _post_single(account_id, txn_type, body, customer_id):
+    async with db.session() as session:
+        await _own_account(session.cursor, account_id, customer_id)
+        balance = await _post(session.cursor, account_id, txn_type, body.amount, body.description)
+        if balance is None:
+            raise await _posting_refused(session.cursor, account_id)
+        await session.connection.commit()
+    return {'account_id': account_id, 'balance': _money(balance)}
+
+
+# ---------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------
+@app.get('/metrics', response_class=PlainTextResponse)
+async def metrics():
+    """Per-statement query and transfer retry counters of this worker, in Prometheus text format."""
+    lines = [query_stats.prometheus()]
+    for key, help_text in (('retries', 'Transfers retried after a deadlock or lock wait timeout'),
+                           ('aborts', 'Transfers abandoned after the last retry')):
+        lines.append(f"# HELP bank_transfer_{key}_total {help_text}.\n"
+                     f"# TYPE bank_transfer_{key}_total counter\n"
+                     f"bank_transfer_{key}_total {transfer_stats[key]}\n")
+    return PlainTextResponse(''.join(lines), media_type='text/plain; version=0.0.4')
+
+
+# ---------------------------------------------------------
+# Sessions
+# ---------------------------------------------------------
+def _bearer_token(authorization):
+    scheme, _, token = (authorization or '').partition(' ')
+    return token if scheme.lower() == 'bearer' else None
+
+
+async def current_customer(authorization: Optional[str] = Header(None)):
+    """customer_id of the request's bearer token; verified from memory, no query."""
+    customer_id = session_tokens.verify(_bearer_token(authorization))
+    if customer_id is None:
+        raise HTTPException(status_code=401, detail="Missing, invalid or expired session token")
+    return customer_id
+
+
+async def authorized_customer(customer_id: int, token_customer: int = Depends(current_customer)):
+    """The path's customer_id when it is the token's own; other customers' data is 403."""
+    if customer_id != token_customer:
+        raise HTTPException(status_code=403, detail="Not allowed to access another customer's data")
+    return customer_id
+
+
+# Routes under /customers/{customer_id} serve only the bearer token's customer
+OWN_CUSTOMER = [Depends(authorized_customer)]
+
+
+@app.post('/sessions', status_code=201)
+async def login(body: LoginIn):
+    async with db.session() as session:
+        await session.cursor.execute(LOGIN_SQL, (body.email,))
+        row = await session.cursor.fetchone()
+    # The KDF runs on the hashing pool, outside the database slot and the event loop
+    matches, new_hash = await password_hasher.verify_async(body.password, row[1] if row else None)
+    if not matches:
+        raise HTTPException(status_code=401, detail="Invalid email or password")
+    if new_hash:
+        async with db.session() as session:
+            await session.cursor.execute('''UPDATE customers SET password = %s
+                                            WHERE customer_id = %s AND password = %s''', (new_hash, row[0], row[1]))
+            await session.connection.commit()
+    return {'customer_id': row[0], 'token': session_tokens.issue(row[0]), 'expires_in': session_tokens.ttl}
+
+
+@app.get('/sessions/me')
+async def whoami(customer_id: int = Depends(current_customer)):
+    return {'customer_id': customer_id}
+
+
+@app.delete('/sessions', status_code=204)
+async def logout(authorization: Optional[str] = Header(None)):
+    token = _bearer_token(authorization)
+    if token:
+        session_tokens.revoke(token)
+
+
+# ---------------------------------------------------------
+# Customers and accounts
+# ---------------------------------------------------------
+@app.post('/customers', status_code=201)
+async def create_customer(body: CustomerIn):
+    async with db.session() as session:
+        try:
+            await session.cursor.execute('''INSERT INTO customers (name, address, phone, email, password)
+                                            VALUES (%s, %s, %s, %s, %s)''',
+                                         (body.name, body.address, body.phone, body.email,
+                                          await password_hasher.hash_async(body.password)))
+        except aiomysql.IntegrityError:
+            raise HTTPException(status_code=409, detail="Email already registered")
+        customer_id = session.cursor.lastrowid
+        await session.connection.commit()
+    return {'customer_id': customer_id}
+
+
+@app.get('/customers/{customer_id}/accounts', dependencies=OWN_CUSTOMER)
+async def list_accounts(customer_id: int):
+    async with db.session() as session:
+        await session.cursor.execute(CUSTOMER_ACCOUNTS_SQL, (customer_id,))
+        accounts = _rows(session.cursor, await session.cursor.fetchall())
+    for account in accounts:
+        account['balance'] = _money(account['balance'])
+    return accounts
+
+
+@app.post('/customers/{customer_id}/accounts', status_code=201, dependencies=OWN_CUSTOMER)
+async def create_account(customer_id: int, body: AccountIn):
+    async with db.session() as session:
+        try:
+            await session.cursor.execute('''INSERT INTO accounts (customer_id, account_type, balance)
+                                            VALUES (%s, %s, %s)''',
+                                         (customer_id, body.account_type, body.initial_balance))
+        except aiomysql.IntegrityError:
+            raise HTTPException(status_code=404, detail=f"Customer {customer_id} not found")
+        account_id = session.cursor.lastrowid
+        if body.initial_balance > 0:
+            await session.cursor.execute(INSERT_TRANSACTION_SQL,
+                                         (account_id, 'deposit', body.initial_balance, 'Initial deposit'))
+        await session.connection.commit()
+    return {'account_id': account_id}
+
+
+@app.get('/accounts/{account_id}')
+async def get_account(account_id: int, customer_id: int = Depends(current_customer)):
+    async with db.session() as session:
+        await session.cursor.execute('''SELECT account_id, customer_id, account_type, balance, status, created_at
+                                        FROM accounts WHERE account_id = %s AND customer_id = %s''',
+                                     (account_id, customer_id))
+        rows = _rows(session.cursor, await session.cursor.fetchall())
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"Account {account_id} not found")
+    rows[0]['balance'] = _money(rows[0]['balance'])
+    return rows[0]
+
+
+# ---------------------------------------------------------
+# Postings and history
+# ---------------------------------------------------------
+@app.post('/accounts/{account_id}/deposit')
+async def deposit(account_id: int, body: PostingIn, customer_id: int = Depends(current_customer)):
+    return await _post_single(account_id, 'deposit', body, customer_id)
+
+
+@app.post('/accounts/{account_id}/withdraw')
+async def withdraw(account_id: int, body: PostingIn, customer_id: int = Depends(current_customer)):
+    return await _post_single(account_id, 'withdrawal', body, customer_id)
+
+
+@app.post('/transfers')
+async def transfer(body: TransferIn, customer_id: int = Depends(current_customer)):
+    """Move money out of one of the caller's accounts into any active account."""
+    if body.from_account_id == body.to_account_id:
+        raise HTTPException(status_code=400, detail="Cannot transfer to the same account")
+
+    async def work():
+        balances = {}
+        async with db.session() as session:
+            await _own_account(session.cursor, body.from_account_id, customer_id)
+            for account_id, txn_type, amount, description in transfer_legs(body.from_account_id,
+                                                                            body.to_account_id, body.amount):
+                balance = await _post(session.cursor, account_id, txn_type, amount, description)
+                if balance is None:
+                    raise await _posting_refused(session.cursor, account_id)
+                balances[account_id] = balance
+            await session.connection.commit()
+        return balances
+
+    balances = await _with_lock_retry(work)
+    return {'from_account_id': body.from_account_id, 'to_account_id': body.to_account_id,
+            'amount': _money(body.amount), 'from_balance': _money(balances[body.from_account_id])}
+
+
+@app.get('/accounts/{account_id}/transactions')
+async def transaction_history(account_id: int,
+                              page_size: int = Query(50, ge=1, le=500),
+                              after: Optional[str] = None,
+                              before: Optional[str] = None,
+                              start_date: Optional[datetime.date] = None,
+                              end_date: Optional[datetime.date] = None,
+                              types: Optional[List[str]] = Query(None, alias='type'),
+                              customer_id: int = Depends(current_customer)):
+    """Keyset-paged history, newest first; follow ``next``/``previous`` tokens."""
+    if after and before:
+        raise HTTPException(status_code=400, detail="Pass either after or before, not both")
+    newer = before is not None
+    try:
+        token = decode_page_token(before if newer else after) if (before or after) else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query, params = transaction_page_query(account_id, page_size, token, newer, start_date, end_date, types)
+    async with db.session() as session:
+        await _own_account(session.cursor, account_id, customer_id)
+        await session.cursor.execute(ARCHIVE_BOUNDARY_SQL)
+        boundary = archive_boundary(await session.cursor.fetchone())
+        await session.cursor.execute(query, params)
+        rows = await session.cursor.fetchall()
+        if page_needs_archive(boundary, rows, page_size, token, newer, start_date):
+            query, params = transaction_page_query(account_id, page_size, token, newer, start_date, end_date,
+                                                   types, table='transactions_archive')
+            await session.cursor.execute(query, params)
+            rows = merge_page_rows(rows, await session.cursor.fetchall(), page_size, newer)
+        page = transaction_page(rows, page_size, token, newer)
+    page['rows'] = [{'transaction_id': txn_id, 'type': txn_type, 'amount': _money(amount),
+                     'description': description, 'transaction_date': when}
+                    for txn_id, txn_type, amount, description, when in page['rows']]
+    return page
+
+
+# ---------------------------------------------------------
+# Loans, cards and fixed deposits
+# ---------------------------------------------------------
+@app.get('/customers/{customer_id}/loans', dependencies=OWN_CUSTOMER)
+async def list_loans(customer_id: int):
+    async with db.session() as session:
+        await session.cursor.execute('''SELECT l.loan_id, l.loan_type, l.amount, l.interest_rate,
+                                               l.term_months, l.start_date, l.end_date, l.status,
+                                               b.branch_name
+                                        FROM loans l JOIN branches b ON l.branch_id = b.branch_id
+                                        WHERE l.customer_id = %s ORDER BY l.created_at DESC''', (customer_id,))
+        loans = _rows(session.cursor, await session.cursor.fetchall())
+    summaries = loan_summaries([(loan['loan_id'], loan['amount'] * 100, loan['interest_rate'] * 100,
+                                 loan['term_months']) for loan in loans])
+    for loan in loans:
+        emi_cents, interest_cents = summaries[loan['loan_id']]
+        loan['amount'] = _money(loan['amount'])
+        loan['emi'] = _money(Decimal(emi_cents) * CENT)
+        loan['total_interest'] = _money(Decimal(interest_cents) * CENT)
+    return loans
+
+
+@app.get('/customers/{customer_id}/loans/{loan_id}/schedule', dependencies=OWN_CUSTOMER)
+async def loan_schedule(customer_id: int, loan_id: int):
+    async with db.session() as session:
+        await session.cursor.execute(f'''SELECT {LOAN_TERMS_COLUMNS} FROM loans
+                                         WHERE loan_id = %s AND customer_id = %s''', (loan_id, customer_id))
+        row = await session.cursor.fetchone()
+    if row is None:
+        raise HTTPException(status_code=404, detail=f"Loan {loan_id} not found")
+    key = tuple(row[1:4])
+    schedule = schedules([key])[key]
+    return {
+        'loan_id': loan_id,
+        'emi': _money(Decimal(schedule['emi_cents']) * CENT),
+        'months': [{'month': month + 1,
+                    'payment': _money(Decimal(int(payment)) * CENT),
+                    'principal': _money(Decimal(int(principal)) * CENT),
+                    'interest': _money(Decimal(int(interest)) * CENT),
+                    'balance': _money(Decimal(int(balance)) * CENT)}
+                   for month, (payment, principal, interest, balance) in enumerate(zip(
+                       schedule['payment_cents'], schedule['principal_cents'],
+                       schedule['interest_cents'], schedule['balance_cents']))],
+    }
+
+
+@app.post('/customers/{customer_id}/loans', status_code=201, dependencies=OWN_CUSTOMER)
+async def apply_loan(customer_id: int, body: LoanIn):
+    start_date = datetime.date.today()
+    end_date = start_date + datetime.timedelta(days=30 * body.term_months)
+    async with db.session() as session:
+        try:
+            await session.cursor.execute('''INSERT INTO loans (customer_id, branch_id, loan_type, amount,
+                                                               interest_rate, term_months, start_date,
+                                                               end_date, status)
+                                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                                         (customer_id, body.branch_id, body.loan_type, body.amount,
+                                          LOAN_INTEREST_RATE, body.term_months, start_date, end_date, 'pending'))
+        except aiomysql.IntegrityError:
+            raise HTTPException(status_code=404, detail="Unknown customer or branch")
+        loan_id = session.cursor.lastrowid
+        await session.connection.commit()
+    return {'loan_id': loan_id, 'status': 'pending'}
+
+
+@app.get('/customers/{customer_id}/cards', dependencies=OWN_CUSTOMER)
+async def list_cards(customer_id: int):
+    async with db.session() as session:
+        await session.cursor.execute(CUSTOMER_CARDS_SQL, (customer_id,))
+        cards = _rows(session.cursor, await session.cursor.fetchall())
+    for card in cards:
+        card['credit_limit'] = _money(card['credit_limit'])
+        card['current_balance'] = _money(card['current_balance'])
+    return cards
+
+
+@app.post('/customers/{customer_id}/cards', status_code=201, dependencies=OWN_CUSTOMER)
+async def issue_card(customer_id: int, body: CardIn):
+    try:
+        check_card_request(body.card_type, body.credit_limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    expiry_date = datetime.date.today() + datetime.timedelta(days=365 * 4)
+    async with db.session() as session:
+        for attempt in range(CARD_INSERT_ATTEMPTS):
+            card_number = await _allocate_card_number(session)
+            try:
+                await session.cursor.execute(INSERT_CARD_SQL, (customer_id, card_number, body.card_type,
+                                                               expiry_date, body.credit_limit, 0, 'active'))
+                break
+            except aiomysql.IntegrityError as e:
+                await session.connection.rollback()
+                if e.args[0] == ER_NO_REFERENCED_ROW:
+                    raise HTTPException(status_code=404, detail=f"Customer {customer_id} not found")
+                if e.args[0] != ER_DUP_ENTRY:
+                    raise
+                # A card with this number appeared since the check; take the next one
+                if attempt == CARD_INSERT_ATTEMPTS - 1:
+                    raise HTTPException(status_code=409, detail="Could not allocate a card number, retry")
+        await session.cursor.execute(ENQUEUE_SQL, card_issued_event(customer_id, card_number, body.card_type))
+        await session.connection.commit()
+    return {'card_number': card_number, 'expiry_date': expiry_date}
+
+
+@app.get('/customers/{customer_id}/fixed-deposits', dependencies=OWN_CUSTOMER)
+async def list_fixed_deposits(customer_id: int):
+    async with db.session() as session:
+        await session.cursor.execute('''SELECT fd.fd_id, fd.amount, fd.interest_rate, fd.term_months,
+                                               fd.start_date, fd.maturity_date, fd.status, a.account_id
+                                        FROM fixed_deposits fd JOIN accounts a ON fd.account_id = a.account_id
+                                        WHERE a.customer_id = %s ORDER BY fd.created_at DESC''', (customer_id,))
+        deposits = _rows(session.cursor, await session.cursor.fetchall())
+    for fd in deposits:
+        fd['amount'] = _money(fd['amount'])
+    return deposits
+
+
+@app.post('/customers/{customer_id}/fixed-deposits', status_code=201, dependencies=OWN_CUSTOMER)
+async def create_fixed_deposit(customer_id: int, body: FixedDepositIn):
+    interest_rate = fd_interest_rate(body.term_months)
+    start_date = datetime.date.today()
+    maturity_date = start_date + datetime.timedelta(days=30 * body.term_months)
+    async with db.session() as session:
+        cursor = session.cursor
+        if body.account_id is None:
+            account_id = await _primary_account(cursor, customer_id)
+        else:
+            await cursor.execute("SELECT 1 FROM accounts WHERE account_id = %s AND customer_id = %s",
+                                 (body.account_id, customer_id))
+            if await cursor.fetchone() is None:
+                raise HTTPException(status_code=404, detail=f"Account {body.account_id} not found")
+            account_id = body.account_id
+        if await _post(cursor, account_id, 'fd_investment', body.amount,
+                       f"Fixed deposit for {body.term_months} months") is None:
+            raise await _posting_refused(cursor, account_id)
+        await cursor.execute('''INSERT INTO fixed_deposits (account_id, amount, interest_rate,
+                                                            term_months, start_date, maturity_date)
+                                VALUES (%s, %s, %s, %s, %s, %s)''',
+                             (account_id, body.amount, interest_rate, body.term_months, start_date, maturity_date))
+        fd_id = cursor.lastrowid
+        await session.connection.commit()
+    return {'fd_id': fd_id, 'account_id': account_id, 'interest_rate': interest_rate,
+            'maturity_date': maturity_date}
+
+
+# ---------------------------------------------------------
+# Beneficiaries and notifications
+# ---------------------------------------------------------
+@app.get('/customers/{customer_id}/beneficiaries', dependencies=OWN_CUSTOMER)
+async def list_beneficiaries(customer_id: int):
+    async with db.session() as session:
+        await session.cursor.execute(BENEFICIARIES_SQL, (customer_id,))
+        return _rows(session.cursor, await session.cursor.fetchall())
+
+
+@app.post('/customers/{customer_id}/beneficiaries', status_code=201, dependencies=OWN_CUSTOMER)
+async def add_beneficiary(customer_id: int, body: BeneficiaryIn):
+    async with db.session() as session:
+        account_id = await _primary_account(session.cursor, customer_id)
+        await session.cursor.execute('''INSERT INTO beneficiaries (customer_id, account_id, name, account_number,
+                                                                   bank_name, ifsc_code, relationship)
+                                        VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                                     (customer_id, account_id, body.name, body.account_number,
+                                      body.bank_name, body.ifsc_code, body.relationship))
+        await session.connection.commit()
+    return {'name': body.name}
+
+
+@app.delete('/customers/{customer_id}/beneficiaries/{name}', status_code=204, dependencies=OWN_CUSTOMER)
+async def remove_beneficiary(customer_id: int, name: str):
+    async with db.session() as session:
+        await session.cursor.execute(REMOVE_BENEFICIARY_SQL, (customer_id, name))
+        if session.cursor.rowcount == 0:
+            raise HTTPException(status_code=404, detail=f"Beneficiary {name} not found")
+        await session.connection.commit()
+
+
+@app.get('/customers/{customer_id}/notifications', dependencies=OWN_CUSTOMER)
+async def list_notifications(customer_id: int, page_size: int = Query(20, ge=1, le=200),
+                             after: Optional[str] = None):
+    """Keyset-paged feed plus the unread counter; follow ``next`` for older items."""
+    try:
+        token = decode_page_token(after) if after else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    query, params = feed_query(customer_id, page_size, token)
+    async with db.session() as session:
+        await session.cursor.execute(UNREAD_COUNT_SQL, (customer_id,))
+        row = await session.cursor.fetchone()
+        await session.cursor.execute(query, params)
+        page = feed_page(await session.cursor.fetchall(), page_size)
+    page['unread'] = row[0] if row else 0
+    page['rows'] = [{'notification_id': notif_id, 'title': title, 'message': message, 'type': type_,
+                     'is_read': bool(is_read), 'created_at': created_at}
+                    for notif_id, title, message, type_, is_read, created_at in page['rows']]
+    return page
+
+
+@app.post('/customers/{customer_id}/notifications/read', dependencies=OWN_CUSTOMER)
+async def mark_notifications_read(customer_id: int, body: MarkReadIn):
+    """Mark the listed ids read, or everything created before ``before``."""
+    if body.notification_ids:
+        query, params = mark_read_query(customer_id, body.notification_ids)
+        async with db.session() as session:
+            await session.cursor.execute(query, params)
+            changed = session.cursor.rowcount
+            await session.connection.commit()
+        return {'marked_read': changed}
+
+    before = body.before or datetime.datetime.now()
+    changed = 0
+    while True:
+        async with db.session() as session:
+            await session.cursor.execute(MARK_READ_BEFORE_SQL, (customer_id, before, NOTIFICATION_CHUNK_SIZE))
+            count = session.cursor.rowcount
+            await session.connection.commit()
+        changed += count
+        if count < NOTIFICATION_CHUNK_SIZE:
+            return {'marked_read': changed}
@@ -1,33 +1,53 @@
 import streamlit as st
 import mysql.connector
+from auth import authenticate, password_hasher, session_tokens
 from database import DatabaseConnection
-from bank import CARD_LIMITS
+from notifications import NotificationService
+from outbox import IN_PROCESS as OUTBOX_IN_PROCESS, start_dispatcher
+from page_data import PageData
+import profiler
+from query_stats import query_stats, start_metrics_server
+from fixed_deposits import CUSTOMER_FDS_SQL, portfolio, to_amount
+from loans import CUSTOMER_LOANS_SQL, loan_summaries, schedules
+from cards import CUSTOMER_CARDS_SQL
+from bank import (BankManagement, BENEFICIARIES_SQL, BRANCH_COUNT_SQL, CARD_LIMITS, CENT, LOAN_INTEREST_RATE,
+                  PRIMARY_ACCOUNT_SQL, REMOVE_BENEFICIARY_SQL, fd_interest_rate, post_transaction)
 import pandas as pd
 from datetime import datetime, date, timedelta
+from decimal import Decimal
+from contextlib import nullcontext
 
 
 # ---------------------------------------------------------
 # Initialize Database Connection
 # ---------------------------------------------------------
 @st.cache_resource
-def init_connection():
+def init_bank():
+    # One BankManagement (pool + read cache) shared by every browser session
     db = DatabaseConnection()
+    # Prometheus /metrics on metrics.port (off when 0)
+    start_metrics_server()
+    # Deliver queued notifications from this process unless a separate
+    # outbox.py worker does (outbox.in_process = false)
+    if OUTBOX_IN_PROCESS:
+        start_dispatcher(db)
     ensure_default_branch(db)
-    return db
+    return BankManagement(db)
 
 
 def ensure_default_branch(db):
     """Ensure at least one branch exists."""
     try:
-        db.cursor.execute("SELECT COUNT(*) FROM branches")
-        count = db.cursor.fetchone()[0]
-
-        if count == 0:
-            db.cursor.execute("""
-                INSERT INTO branches (branch_name, location, city, contact_number, email)
-                VALUES (%s, %s, %s, %s, %s)
-            """, ("Main Branch", "123 Main St", "City", "1234567890", "main.branch@bank.com"))
-            db.connection.commit()
+        with db.session() as session:
+            session.cursor.execute(BRANCH_COUNT_SQL)
+            count = session.cursor.fetchone()[0]
+
+            if count == 0:
+                session.cursor.execute("""
+                    INSERT INTO branches (branch_name, branch_code, address, city, state, phone, email)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s)
+                """, ("Main Branch", "MAIN001", "123 Main St", "City", "State", "1234567890", "main.branch@bank.com"))
+                session.connection.commit()
     except Exception as e:
         st.error(f"Error creating default branch: {e}")
 
@@ -51,12 +71,33 @@ if 'user_id' not in st.session_state:
     st.session_state.user_id = None
 if 'account_id' not in st.session_state:
     st.session_state.account_id = None
+if 'txn_cursor' not in st.session_state:
+    st.session_state.txn_cursor = {}
+if 'notif_cursor' not in st.session_state:
+    st.session_state.notif_cursor = None
+if 'auth_token' not in st.session_state:
+    st.session_state.auth_token = None
+# ?profile=1 turns the render profiler on for this browser session when
+# profiler.session_flag allows it (profiler.enabled turns it on for all)
+if 'profiling' not in st.session_state:
+    st.session_state.profiling = False
+if profiler.SESSION_FLAG and 'profile' in st.query_params:
+    st.session_state.profiling = st.query_params['profile'] == '1'
+
+# Every rerun re-checks the session token (a cached HMAC check, no query);
+# an expired or revoked token logs the user out
+if st.session_state.authenticated and session_tokens.verify(st.session_state.auth_token) != st.session_state.user_id:
+    st.session_state.authenticated = False
+    st.session_state.user_id = None
+    st.session_state.auth_token = None
 
 
 # ---------------------------------------------------------
 # Database Connection
 # ---------------------------------------------------------
-db = init_connection()
+bank = init_bank()
+db = bank.db
+notification_service = NotificationService(db)
 
 
 # ---------------------------------------------------------
@@ -72,12 +113,11 @@ def login_user():
 
         if submitted:
             try:
-                db.cursor.execute("SELECT customer_id, password FROM customers WHERE email = %s", (email,))
-                result = db.cursor.fetchone()
-
-                if result and result[1] == password:  # In production: use hashed passwords!
+                customer_id = authenticate(db, email, password)
+                if customer_id is not None:
                     st.session_state.authenticated = True
-                    st.session_state.user_id = result[0]
+                    st.session_state.user_id = customer_id
+                    st.session_state.auth_token = session_tokens.issue(customer_id)
                     st.success("Login successful!")
                     st.rerun()
                 else:
@@ -105,11 +145,13 @@ def register_user():
                 return
 
             try:
-                db.cursor.execute("""
-                    INSERT INTO customers (name, email, phone, address, password)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (name, email, phone, address, password))
-                db.connection.commit()
+                hashed_password = password_hasher.hash(password)
+                with db.session() as session:
+                    session.cursor.execute("""
+                        INSERT INTO customers (name, email, phone, address, password)
+                        VALUES (%s, %s, %s, %s, %s)
+                    """, (name, email, phone, address, hashed_password))
+                    session.connection.commit()
                 st.success("Registration successful! Please login.")
             except mysql.connector.Error as e:
                 if e.errno == 1062:
@@ -131,39 +173,38 @@ def create_account():
 
         if submitted:
             try:
-                db.cursor.execute("""
-                    INSERT INTO accounts (customer_id, account_type, balance)
-                    VALUES (%s, %s, %s)
-                """, (st.session_state.user_id, account_type, initial_deposit))
-
-                account_id = db.cursor.lastrowid
-
-                if initial_deposit > 0:
-                    db.cursor.execute("""
-                        INSERT INTO transactions (account_id, type, amount, description)
-                        VALUES (%s, %s, %s, %s)
-                    """, (account_id, "deposit", initial_deposit, "Initial deposit"))
-
-                db.connection.commit()
+                with db.session() as session:
+                    session.cursor.execute("""
+                        INSERT INTO accounts (customer_id, account_type, balance)
+                        VALUES (%s, %s, %s)
+                    """, (st.session_state.user_id, account_type, initial_deposit))
+
+                    account_id = session.cursor.lastrowid
+
+                    if initial_deposit > 0:
+                        session.cursor.execute("""
+                            INSERT INTO transactions (account_id, type, amount, description)
+                            VALUES (%s, %s, %s, %s)
+                        """, (account_id, "deposit", initial_deposit, "Initial deposit"))
+
+                    session.connection.commit()
+                bank.cache.invalidate(('accounts', st.session_state.user_id))
                 st.success("Account created successfully!")
             except Exception as e:
                 st.error(f"Error creating account: {e}")
 
 
-def view_accounts():
+def view_accounts(data):
     st.subheader("Your Accounts")
 
-    db.cursor.execute("""
-        SELECT account_id, account_type, balance, status, created_at
-        FROM accounts
-        WHERE customer_id = %s
-    """, (st.session_state.user_id,))
-
-    accounts = db.cursor.fetchall()
+    with profiler.phase("query"):
+        accounts = data.accounts()
 
     if accounts:
-        df = pd.DataFrame(accounts, columns=["Account ID", "Account Type", "Balance", "Status", "Created At"])
-        st.dataframe(df)
+        with profiler.phase("dataframe"):
+            df = pd.DataFrame(accounts, columns=["Account ID", "Account Type", "Balance", "Status", "Created At"])
+        with profiler.phase("render"):
+            st.dataframe(df)
         # Filter only Savings accounts for transaction selection
         savings_accounts = [
             (acc[0], f"Account {acc[0]} - Balance: ${acc[2]:,.2f}")
@@ -187,20 +228,13 @@ def view_accounts():
 # ---------------------------------------------------------
 # Transactions
 # ---------------------------------------------------------
-def make_transaction():
+def make_transaction(data):
     if not st.session_state.account_id:
         st.warning("Please select a Savings account first!")
         return
         
     # Verify that selected account is a Savings account
-    db.cursor.execute("""
-        SELECT account_type 
-        FROM accounts 
-        WHERE account_id = %s AND customer_id = %s
-    """, (st.session_state.account_id, st.session_state.user_id))
-    
-    account = db.cursor.fetchone()
-    if not account or account[0] != 'Savings':
+    if data.account_type(st.session_state.account_id) != 'Savings':
         st.error("Transactions can only be performed with Savings accounts.")
         return
 
@@ -214,31 +248,13 @@ def make_transaction():
 
         if submitted:
             try:
-                from decimal import Decimal
-                amount_decimal = Decimal(str(amount))
-
-                db.cursor.execute("SELECT balance FROM accounts WHERE account_id = %s",
-                                (st.session_state.account_id,))
-                current_balance = db.cursor.fetchone()[0]
-
-                if transaction_type == "withdrawal" and amount_decimal > current_balance:
+                new_balance = bank.post(st.session_state.account_id, transaction_type, round(amount, 2),
+                                        description or None)
+                if new_balance is None:
                     st.error("Insufficient funds!")
                     return
 
-                new_balance = current_balance + amount_decimal if transaction_type == "deposit" else current_balance - amount_decimal
-
-                db.cursor.execute("""
-                    UPDATE accounts SET balance = %s WHERE account_id = %s
-                """, (new_balance, st.session_state.account_id))
-
-                db.cursor.execute("""
-                    INSERT INTO transactions (account_id, type, amount, description)
-                    VALUES (%s, %s, %s, %s)
-                """, (st.session_state.account_id, transaction_type, amount, description))
-
-                db.connection.commit()
                 st.success(f"Transaction successful! New balance: ${new_balance:,.2f}")
-
             except Exception as e:
                 st.error(f"Error processing transaction: {e}")
 
@@ -250,26 +266,93 @@ def view_transactions():
         st.warning("Please select an account first!")
         return
 
-    db.cursor.execute("""
-        SELECT transaction_id, type, amount, description, transaction_date
-        FROM transactions
-        WHERE account_id = %s
-        ORDER BY transaction_date DESC
-    """, (st.session_state.account_id,))
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        date_range = st.date_input("Date Range", value=(), key="txn_date_range")
+    with col2:
+        types = st.multiselect("Type", ["deposit", "withdrawal", "transfer_in", "transfer_out"], key="txn_types")
+    with col3:
+        page_size = st.selectbox("Rows per Page", [25, 50, 100], key="txn_page_size")
+    start_date = date_range[0] if len(date_range) > 0 else None
+    end_date = date_range[1] if len(date_range) > 1 else None
+
+    # Start again from the newest page whenever the account or filters change
+    filter_key = (st.session_state.account_id, start_date, end_date, tuple(types), page_size)
+    if st.session_state.get('txn_filter_key') != filter_key:
+        st.session_state.txn_filter_key = filter_key
+        st.session_state.txn_cursor = {}
+
+    with profiler.phase("query"):
+        page = bank.get_transaction_page(
+            st.session_state.account_id, page_size=page_size,
+            start_date=start_date, end_date=end_date, types=types or None,
+            **st.session_state.txn_cursor
+        )
+
+    if page['rows']:
+        with profiler.phase("dataframe"):
+            df = pd.DataFrame(page['rows'], columns=["Transaction ID", "Type", "Amount", "Description", "Date"])
+        with profiler.phase("render"):
+            st.dataframe(df)
+    else:
+        st.info("No transactions found for this account.")
 
-    transactions = db.cursor.fetchall()
+    nav1, nav2, nav3 = st.columns(3)
+    with nav1:
+        if st.session_state.txn_cursor and st.button("⏮ Newest"):
+            st.session_state.txn_cursor = {}
+            st.rerun()
+    with nav2:
+        if page['previous'] and st.button("◀ Newer"):
+            st.session_state.txn_cursor = {'before': page['previous']}
+            st.rerun()
+    with nav3:
+        if page['next'] and st.button("Older ▶"):
+            st.session_state.txn_cursor = {'after': page['next']}
+            st.rerun()
+
+
+def view_statement():
+    st.subheader("Account Statement")
 
-    if transactions:
-        df = pd.DataFrame(transactions, columns=["Transaction ID", "Type", "Amount", "Description", "Date"])
+    if not st.session_state.account_id:
+        st.warning("Please select an account first!")
+        return
+
+    today = date.today()
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("From", value=today.replace(day=1))
+    with col2:
+        end_date = st.date_input("To", value=today)
+    if start_date > end_date:
+        st.error("The start date must be on or before the end date.")
+        return
+
+    statement = bank.get_statement(st.session_state.account_id, start_date, end_date)
+    if statement is None:
+        st.error("Could not build the statement.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Opening Balance", f"${statement['opening_balance']:,.2f}")
+    with col2:
+        st.metric("Closing Balance", f"${statement['closing_balance']:,.2f}")
+
+    if statement['lines']:
+        df = pd.DataFrame(statement['lines'], columns=[
+            "Transaction ID", "Date", "Type", "Description", "Amount", "Balance"
+        ])
         st.dataframe(df)
     else:
-        st.info("No transactions found for this account.")
+        st.info("No transactions in this period.")
 
 
 # ---------------------------------------------------------
 # Loans Management
 # ---------------------------------------------------------
-def apply_loan():
+def apply_loan(data):
     st.subheader("Apply for a Loan")
     
     with st.form("loan_application"):
@@ -279,8 +362,7 @@ def apply_loan():
         purpose = st.text_area("Loan Purpose")
         
         # Get branches for selection
-        db.cursor.execute("SELECT branch_id, branch_name, city FROM branches")
-        branches = db.cursor.fetchall()
+        branches = data.branches()
         branch_options = {f"{b[1]} ({b[2]})": b[0] for b in branches}
         selected_branch = st.selectbox("Select Branch", list(branch_options.keys()))
         
@@ -291,49 +373,84 @@ def apply_loan():
                 branch_id = branch_options[selected_branch]
                 start_date = date.today()
                 end_date = start_date + timedelta(days=30*term_months)
-                interest_rate = 8.5  # Base interest rate, could be made dynamic
-                
-                db.cursor.execute("""
-                    INSERT INTO loans (customer_id, branch_id, loan_type, amount, 
-                                     interest_rate, term_months, start_date, end_date, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                """, (st.session_state.user_id, branch_id, loan_type, amount,
-                      interest_rate, term_months, start_date, end_date, 'pending'))
+                interest_rate = LOAN_INTEREST_RATE
                 
-                db.connection.commit()
+                with db.session() as session:
+                    session.cursor.execute("""
+                        INSERT INTO loans (customer_id, branch_id, loan_type, amount, 
+                                         interest_rate, term_months, start_date, end_date, status)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """, (st.session_state.user_id, branch_id, loan_type, amount,
+                          interest_rate, term_months, start_date, end_date, 'pending'))
+
+                    session.connection.commit()
                 st.success("Loan application submitted successfully!")
             except Exception as e:
                 st.error(f"Error submitting loan application: {e}")
 
 
+def customer_loans():
+    with db.session() as session:
+        session.cursor.execute(CUSTOMER_LOANS_SQL, (st.session_state.user_id,))
+
+        return session.cursor.fetchall()
+
+
 def view_loans():
     st.subheader("Your Loans")
     
-    db.cursor.execute("""
-        SELECT l.loan_id, l.loan_type, l.amount, l.interest_rate, 
-               l.term_months, l.start_date, l.end_date, l.status,
-               b.branch_name
-        FROM loans l
-        JOIN branches b ON l.branch_id = b.branch_id
-        WHERE l.customer_id = %s
-        ORDER BY l.created_at DESC
-    """, (st.session_state.user_id,))
-    
-    loans = db.cursor.fetchall()
+    loans = customer_loans()
     
     if loans:
-        df = pd.DataFrame(loans, columns=[
+        # EMI and total interest for every loan from the shared schedule cache
+        summaries = loan_summaries([(l[0], l[9], l[10], l[4]) for l in loans])
+        df = pd.DataFrame([l[:9] for l in loans], columns=[
             "Loan ID", "Type", "Amount", "Interest Rate",
             "Term (months)", "Start Date", "End Date", "Status", "Branch"
         ])
+        df["Monthly EMI"] = [summaries[l[0]][0] / 100 for l in loans]
+        df["Total Interest"] = [summaries[l[0]][1] / 100 for l in loans]
         # Format currency and percentages
-        df["Amount"] = df["Amount"].apply(lambda x: f"${x:,.2f}")
+        for column in ("Amount", "Monthly EMI", "Total Interest"):
+            df[column] = df[column].apply(lambda x: f"${x:,.2f}")
         df["Interest Rate"] = df["Interest Rate"].apply(lambda x: f"{x}%")
         st.dataframe(df)
     else:
         st.info("You don't have any loans yet.")
 
 
+def view_loan_schedule():
+    st.subheader("Loan Schedule")
+
+    loans = customer_loans()
+    if not loans:
+        st.info("You don't have any loans yet.")
+        return
+
+    options = {f"Loan {l[0]} - {l[1]} ${l[2]:,.2f} over {l[4]} months": l for l in loans}
+    loan = options[st.selectbox("Select Loan", list(options.keys()))]
+    schedule = schedules([(loan[9], loan[10], loan[4])])[(loan[9], loan[10], loan[4])]
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Monthly EMI", f"${schedule['emi_cents'] / 100:,.2f}")
+    with col2:
+        st.metric("Total Interest", f"${schedule['interest_cents'].sum() / 100:,.2f}")
+
+    df = pd.DataFrame({
+        "Month": range(1, loan[4] + 1),
+        "Due Date": pd.date_range(pd.Timestamp(loan[5]) + pd.DateOffset(months=1),
+                                  periods=loan[4], freq=pd.DateOffset(months=1)).date,
+        "Payment": schedule['payment_cents'] / 100,
+        "Principal": schedule['principal_cents'] / 100,
+        "Interest": schedule['interest_cents'] / 100,
+        "Balance": schedule['balance_cents'] / 100,
+    })
+    for column in ("Payment", "Principal", "Interest", "Balance"):
+        df[column] = df[column].apply(lambda x: f"${x:,.2f}")
+    st.dataframe(df, hide_index=True)
+
+
 # ---------------------------------------------------------
 # Credit Cards Management
 # ---------------------------------------------------------
@@ -349,10 +466,9 @@ def apply_credit_card():
         
         if submitted:
             try:
-                import random
-                card_number = ''.join([str(random.randint(0, 9)) for _ in range(16)])
                 expiry_date = date.today() + timedelta(days=365*5)  # 5 years validity
-                credit_limit = min(income * 0.4, 1000000)  # 40% of income or max 1M
+                # 40% of income or max 1M, in Decimal like CARD_LIMITS
+                credit_limit = min((Decimal(str(income)) * Decimal('0.4')).quantize(CENT), Decimal('1000000'))
                 
                 # Enforce tier limits
                 if card_type in CARD_LIMITS:
@@ -363,15 +479,11 @@ def apply_credit_card():
                     if credit_limit > max_lim:
                         credit_limit = max_lim
                 
-                db.cursor.execute("""
-                    INSERT INTO credit_cards (customer_id, card_number, card_type, 
-                                            expiry_date, credit_limit, status)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                """, (st.session_state.user_id, card_number, card_type,
-                      expiry_date, credit_limit, 'pending'))
-                
-                db.connection.commit()
-                st.success("Credit card application submitted successfully!")
+                if bank.issue_credit_card(st.session_state.user_id, card_type, credit_limit,
+                                          expiry_date, status='pending'):
+                    st.success("Credit card application submitted successfully!")
+                else:
+                    st.error("Error applying for credit card. Please try again.")
             except Exception as e:
                 st.error(f"Error applying for credit card: {e}")
 
@@ -379,40 +491,38 @@ def apply_credit_card():
 def view_credit_cards():
     st.subheader("Your Credit Cards")
     
-    db.cursor.execute("""
-        SELECT card_number, card_type, expiry_date, credit_limit,
-               current_balance, status, created_at
-        FROM credit_cards
-        WHERE customer_id = %s
-        ORDER BY created_at DESC
-    """, (st.session_state.user_id,))
-    
-    cards = db.cursor.fetchall()
+    with profiler.phase("query"), db.session() as session:
+        session.cursor.execute(CUSTOMER_CARDS_SQL, (st.session_state.user_id,))
+
+        cards = session.cursor.fetchall()
     
     if cards:
         # Process data for display
         display_cards = []
-        for card in cards:
-            # Mask card number
-            masked_number = 'xxxx-xxxx-xxxx-' + card[0][-4:]
-            # Calculate available credit
-            credit_limit = float(card[3])
-            current_balance = float(card[4]) if card[4] is not None else 0.0
-            available_credit = credit_limit - current_balance
-            
-            display_cards.append((
-                masked_number, card[1], card[2],
-                f"${credit_limit:,.2f}",
-                f"${current_balance:,.2f}",
-                f"${available_credit:,.2f}",
-                card[5]
-            ))
+        with profiler.phase("format"):
+            for card in cards:
+                # Mask card number
+                masked_number = 'xxxx-xxxx-xxxx-' + card[0][-4:]
+                # Calculate available credit
+                credit_limit = float(card[3])
+                current_balance = float(card[4]) if card[4] is not None else 0.0
+                available_credit = credit_limit - current_balance
+
+                display_cards.append((
+                    masked_number, card[1], card[2],
+                    f"${credit_limit:,.2f}",
+                    f"${current_balance:,.2f}",
+                    f"${available_credit:,.2f}",
+                    card[5]
+                ))
         
-        df = pd.DataFrame(display_cards, columns=[
-            "Card Number", "Type", "Expiry Date", "Credit Limit",
-            "Current Balance", "Available Credit", "Status"
-        ])
-        st.dataframe(df)
+        with profiler.phase("dataframe"):
+            df = pd.DataFrame(display_cards, columns=[
+                "Card Number", "Type", "Expiry Date", "Credit Limit",
+                "Current Balance", "Available Credit", "Status"
+            ])
+        with profiler.phase("render"):
+            st.dataframe(df)
     else:
         st.info("You don't have any credit cards yet.")
 
@@ -428,7 +538,7 @@ def create_fixed_deposit():
         term_months = st.selectbox("Term Period (months)", [12, 24, 36, 60])
         
         # Simple interest rate calculation
-        interest_rate = 5.0 + (term_months/12)  # Base rate + term bonus
+        interest_rate = fd_interest_rate(term_months)
         st.write(f"Interest Rate: {interest_rate}% per annum")
         
         # Show maturity amount
@@ -442,43 +552,34 @@ def create_fixed_deposit():
                 start_date = date.today()
                 maturity_date = start_date + timedelta(days=30*term_months)
                 
-                # Get user's primary account
-                db.cursor.execute("""
-                    SELECT account_id, balance 
-                    FROM accounts 
-                    WHERE customer_id = %s AND status = 'active'
-                    LIMIT 1
-                """, (st.session_state.user_id,))
-                
-                account = db.cursor.fetchone()
-                
-                if not account:
-                    st.error("Please create a bank account first!")
-                    return
-                
-                account_id, balance = account
-                
-                if balance < amount:
-                    st.error("Insufficient balance in your account!")
-                    return
-                
-                # Create FD and deduct amount from account
-                db.cursor.execute("""
-                    INSERT INTO fixed_deposits (
-                        account_id, amount, interest_rate,
-                        term_months, start_date, maturity_date
-                    ) VALUES (%s, %s, %s, %s, %s, %s)
-                """, (account_id, amount, interest_rate, term_months,
-                      start_date, maturity_date))
-                
-                # Update account balance
-                db.cursor.execute("""
-                    UPDATE accounts 
-                    SET balance = balance - %s 
-                    WHERE account_id = %s
-                """, (amount, account_id))
-                
-                db.connection.commit()
+                with db.session() as session:
+                    # Get user's primary account
+                    session.cursor.execute(PRIMARY_ACCOUNT_SQL, (st.session_state.user_id,))
+
+                    account = session.cursor.fetchone()
+
+                    if not account:
+                        st.error("Please create a bank account first!")
+                        return
+
+                    account_id = account[0]
+
+                    # Debit the account; refused if the balance would go negative
+                    if post_transaction(session.cursor, account_id, 'fd_investment', round(amount, 2),
+                                        f"Fixed deposit for {term_months} months") is None:
+                        st.error("Insufficient balance in your account!")
+                        return
+
+                    session.cursor.execute("""
+                        INSERT INTO fixed_deposits (
+                            account_id, amount, interest_rate,
+                            term_months, start_date, maturity_date
+                        ) VALUES (%s, %s, %s, %s, %s, %s)
+                    """, (account_id, amount, interest_rate, term_months,
+                          start_date, maturity_date))
+
+                    session.connection.commit()
+                bank.invalidate_accounts(account_id)
                 st.success("Fixed deposit created successfully!")
             except Exception as e:
                 st.error(f"Error creating fixed deposit: {e}")
@@ -487,85 +588,47 @@ def create_fixed_deposit():
 def view_fixed_deposits():
     st.subheader("Your Fixed Deposits")
     
-    db.cursor.execute("""
-        SELECT fd.fd_id, 
-               CAST(fd.amount AS DECIMAL(15,2)) as amount,
-               CAST(fd.interest_rate AS DECIMAL(5,2)) as interest_rate,
-               fd.term_months,
-               fd.start_date, fd.maturity_date, fd.status,
-               a.account_id, a.account_type
-        FROM fixed_deposits fd
-        JOIN accounts a ON fd.account_id = a.account_id
-        WHERE a.customer_id = %s
-        ORDER BY fd.created_at DESC
-    """, (st.session_state.user_id,))
-    
-    fds = db.cursor.fetchall()
+    with profiler.phase("query"), db.session() as session:
+        session.cursor.execute(CUSTOMER_FDS_SQL, (st.session_state.user_id,))
+
+        fds = session.cursor.fetchall()
     
     if fds:
-        # Process data for display
-        display_fds = []
-        from decimal import Decimal
-        
-        for fd in fds:
-            # Convert numeric values to Decimal for precise calculations
-            principal = Decimal(str(fd[1]))
-            rate = Decimal(str(fd[2]))
-            term = int(fd[3])
-            
-            # Calculate maturity amount
-            interest_fraction = rate / Decimal('100')
-            term_years = Decimal(str(term)) / Decimal('12')
-            interest_multiplier = Decimal('1') + (interest_fraction * term_years)
-            maturity_amount = principal * interest_multiplier
-            
-            days_remaining = (fd[5] - date.today()).days
-            status = fd[6]
-            if days_remaining < 0:
-                status = 'matured'
-            
-            display_fds.append((
-                fd[0],  # FD ID
-                f"${float(principal):,.2f}",  # Principal formatted
-                f"{float(rate)}%",  # Interest Rate formatted
-                term,  # Term (months)
-                fd[4],  # Start Date
-                fd[5],  # Maturity Date
-                f"${float(maturity_amount):,.2f}",  # Maturity Amount formatted
-                max(days_remaining, 0),  # Days Remaining
-                status,  # Status
-                fd[8]   # Linked Account
-            ))
-        
-        df = pd.DataFrame(display_fds, columns=[
-            "FD ID", "Principal", "Interest Rate", "Term (months)",
-            "Start Date", "Maturity Date", "Maturity Amount",
-            "Days Remaining", "Status", "Linked Account"
-        ])
-        st.dataframe(df)
-        
-        # Calculate summary metrics using Decimal for precision
-        total_invested = Decimal('0')
-        total_maturity = Decimal('0')
-        
-        for fd in fds:
-            principal = Decimal(str(fd[1]))
-            rate = Decimal(str(fd[2]))
-            term = int(fd[3])
-            
-            total_invested += principal
-            maturity = principal * (Decimal('1') + (rate / Decimal('100') * (Decimal(str(term)) / Decimal('12'))))
-            total_maturity += maturity
+        # Maturity value, accrued interest and days remaining for all deposits at once
+        with profiler.phase("compute"):
+            figures = portfolio([fd[:7] for fd in fds])
+        with profiler.phase("dataframe"):
+            df = pd.DataFrame({
+                "FD ID": figures['fd_id'],
+                "Principal": figures['principal_cents'] / 100,
+                "Interest Rate": [f"{fd[9]}%" for fd in fds],
+                "Term (months)": [fd[4] for fd in fds],
+                "Start Date": [fd[5] for fd in fds],
+                "Maturity Date": [fd[6] for fd in fds],
+                "Maturity Amount": figures['maturity_cents'] / 100,
+                "Accrued Interest": figures['accrued_cents'] / 100,
+                "Days Remaining": figures['days_remaining'],
+                "Status": [('matured' if matured and fd[7] == 'active' else fd[7])
+                           for fd, matured in zip(fds, figures['matured'])],
+                "Linked Account": [fd[8] for fd in fds],
+            })
+        with profiler.phase("format"):
+            for column in ("Principal", "Maturity Amount", "Accrued Interest"):
+                df[column] = df[column].map(lambda x: f"${x:,.2f}")
+        with profiler.phase("render"):
+            st.dataframe(df)
         
+        total_invested = to_amount(figures['principal_cents'].sum())
+        total_maturity = to_amount(figures['maturity_cents'].sum())
         total_earnings = total_maturity - total_invested
         
         col1, col2, col3 = st.columns(3)
         with col1:
-            st.metric("Total Investment", f"${float(total_invested):,.2f}")
+            st.metric("Total Investment", f"${total_invested:,.2f}")
         with col2:
-            st.metric("Total Maturity Value", f"${float(total_maturity):,.2f}")
+            st.metric("Total Maturity Value", f"${total_maturity:,.2f}")
         with col3:
-            st.metric("Expected Earnings", f"${float(total_earnings):,.2f}")
+            st.metric("Expected Earnings", f"${total_earnings:,.2f}")
     else:
         st.info("You don't have any fixed deposits yet.")
 
@@ -597,42 +660,33 @@ def manage_beneficiaries():
                 
                 try:
                     # Get user's primary account
-                    db.cursor.execute("""
-                        SELECT account_id 
-                        FROM accounts 
-                        WHERE customer_id = %s AND status = 'active'
-                        LIMIT 1
-                    """, (st.session_state.user_id,))
-                    
-                    account = db.cursor.fetchone()
-                    
-                    if account:
-                        db.cursor.execute("""
-                            INSERT INTO beneficiaries (
-                                customer_id, account_id, name,
-                                account_number, bank_name, ifsc_code,
-                                relationship
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        """, (st.session_state.user_id, account[0], name,
-                              account_number, bank_name, ifsc_code, relationship))
-                        
-                        db.connection.commit()
-                        st.success("Beneficiary added successfully!")
-                    else:
-                        st.error("Please create a bank account first!")
+                    with db.session() as session:
+                        session.cursor.execute(PRIMARY_ACCOUNT_SQL, (st.session_state.user_id,))
+
+                        account = session.cursor.fetchone()
+
+                        if account:
+                            session.cursor.execute("""
+                                INSERT INTO beneficiaries (
+                                    customer_id, account_id, name,
+                                    account_number, bank_name, ifsc_code,
+                                    relationship
+                                ) VALUES (%s, %s, %s, %s, %s, %s, %s)
+                            """, (st.session_state.user_id, account[0], name,
+                                  account_number, bank_name, ifsc_code, relationship))
+
+                            session.connection.commit()
+                            st.success("Beneficiary added successfully!")
+                        else:
+                            st.error("Please create a bank account first!")
                 except Exception as e:
                     st.error(f"Error adding beneficiary: {e}")
     
     with tab2:
-        db.cursor.execute("""
-            SELECT name, account_number, bank_name, ifsc_code, 
-                   relationship, created_at
-            FROM beneficiaries
-            WHERE customer_id = %s
-            ORDER BY created_at DESC
-        """, (st.session_state.user_id,))
-        
-        beneficiaries = db.cursor.fetchall()
+        with db.session() as session:
+            session.cursor.execute(BENEFICIARIES_SQL, (st.session_state.user_id,))
+
+            beneficiaries = session.cursor.fetchall()
         
         if beneficiaries:
             df = pd.DataFrame(beneficiaries, columns=[
@@ -650,12 +704,10 @@ def manage_beneficiaries():
             
             if st.button("Remove Selected Beneficiary"):
                 try:
-                    db.cursor.execute("""
-                        DELETE FROM beneficiaries
-                        WHERE customer_id = %s AND name = %s
-                    """, (st.session_state.user_id, selected_beneficiary))
-                    
-                    db.connection.commit()
+                    with db.session() as session:
+                        session.cursor.execute(REMOVE_BENEFICIARY_SQL, (st.session_state.user_id, selected_beneficiary))
+
+                        session.connection.commit()
                     st.success(f"Beneficiary {selected_beneficiary} removed successfully!")
                     st.rerun()
                 except Exception as e:
@@ -667,26 +719,24 @@ def manage_beneficiaries():
 # ---------------------------------------------------------
 # Notifications Management
 # ---------------------------------------------------------
-def view_notifications():
+def view_notifications(data):
     st.subheader("Notifications")
-    
-    db.cursor.execute("""
-        SELECT notification_id, title, message, type,
-               created_at, is_read
-        FROM notifications
-        WHERE customer_id = %s
-        ORDER BY created_at DESC
-    """, (st.session_state.user_id,))
-    
-    notifications = db.cursor.fetchall()
-    
-    if notifications:
-        unread = sum(1 for n in notifications if not n[5])
-        if unread > 0:
-            st.info(f"You have {unread} unread notification{'s' if unread != 1 else ''}.")
-        
-        for notif_id, title, message, type_, created_at, is_read in notifications:
-            with st.container():
+
+    customer_id = st.session_state.user_id
+    unread = data.unread_count()
+    if unread > 0:
+        st.info(f"You have {unread} unread notification{'s' if unread != 1 else ''}.")
+        if st.button("Mark all as read"):
+            notification_service.mark_all_read(customer_id)
+            st.session_state.notif_cursor = None
+            st.rerun()
+
+    page = notification_service.get_page(customer_id, page_size=20, after=st.session_state.notif_cursor)
+
+    if page['rows']:
+        with st.form("notifications_form"):
+            selected = []
+            for notif_id, title, message, type_, is_read, created_at in page['rows']:
                 col1, col2 = st.columns([5,1])
                 with col1:
                     if not is_read:
@@ -695,16 +745,22 @@ def view_notifications():
                     st.write(message)
                     st.caption(f"{created_at.strftime('%Y-%m-%d %H:%M:%S')}")
                 with col2:
-                    if not is_read:
-                        if st.button("Mark as Read", key=f"mark_read_{notif_id}"):
-                            db.cursor.execute("""
-                                UPDATE notifications
-                                SET is_read = TRUE
-                                WHERE notification_id = %s
-                            """, (notif_id,))
-                            db.connection.commit()
-                            st.rerun()
+                    if not is_read and st.checkbox("Read", key=f"mark_read_{notif_id}"):
+                        selected.append(notif_id)
                 st.divider()
+            if st.form_submit_button("Mark selected as read") and selected:
+                notification_service.mark_read(customer_id, selected)
+                st.rerun()
+
+        nav1, nav2 = st.columns(2)
+        with nav1:
+            if st.session_state.notif_cursor and st.button("⏮ Newest"):
+                st.session_state.notif_cursor = None
+                st.rerun()
+        with nav2:
+            if page['next'] and st.button("Older ▶"):
+                st.session_state.notif_cursor = page['next']
+                st.rerun()
     else:
         st.info("No notifications to display.")
 
@@ -714,6 +770,17 @@ def view_notifications():
 # ---------------------------------------------------------
 
 
+# Data each page reads through PageData, fetched together in one round trip
+# (the sidebar's unread badge is added for every page)
+PAGE_DATA = {
+    "Account Overview": ('accounts',),
+    "Make Transaction": ('accounts',),
+    "Transaction History": ('accounts',),
+    "Account Statement": ('accounts',),
+    "Apply for Loan": ('branches',),
+}
+
+
 def main():
     if not st.session_state.authenticated:
         tab1, tab2 = st.tabs(["Login", "Register"])
@@ -726,8 +793,8 @@ def main():
 
         menu_groups = {
             "Account Management": ["Account Overview", "Create Account"],
-            "Transactions": ["Make Transaction", "Transaction History"],
-            "Loans": ["Apply for Loan", "View Loans"],
+            "Transactions": ["Make Transaction", "Transaction History", "Account Statement"],
+            "Loans": ["Apply for Loan", "View Loans", "Loan Schedule"],
             "Credit Cards": ["Apply for Credit Card", "View Credit Cards"],
             "Investments": ["Create Fixed Deposit", "View Fixed Deposits"],
             "Other Services": ["Manage Beneficiaries", "Notifications"]
@@ -736,38 +803,91 @@ def main():
         selected_group = st.sidebar.selectbox("Menu", menu_groups.keys())
         page = st.sidebar.radio("Select Option", menu_groups[selected_group])
 
+        profiling = profiler.ENABLED or st.session_state.profiling
+        render = profiler.page_profiler.render(page) if profiling else nullcontext()
+        with render:
+            data = PageData(bank, st.session_state.user_id, PAGE_DATA.get(page, ()) + ('unread',))
+            with profiler.phase("page data"):
+                data.load()
+            render_page(page, data)
+
+        unread = data.unread_count()
+        if unread:
+            st.sidebar.caption(f"🔔 {unread} unread notification{'s' if unread != 1 else ''}")
+
+        with st.sidebar.expander("Cache"):
+            stats = bank.cache.stats()
+            st.caption(f"{stats['hits']} hits / {stats['misses']} misses, "
+                       f"{stats['size']} entries, {stats['evictions']} evicted")
+            st.caption(f"Page data: {data.round_trips} round trip{'s' if data.round_trips != 1 else ''}")
+
+        with st.sidebar.expander("Slowest Queries"):
+            for statement, stats in query_stats.top(5):
+                st.caption(f"{stats['seconds'] * 1000:,.0f} ms total, {stats['calls']} calls, "
+                           f"max {stats['max_seconds'] * 1000:,.1f} ms: `{statement[:120]}`")
+
         if st.sidebar.button("Logout"):
+            session_tokens.revoke(st.session_state.auth_token)
             st.session_state.authenticated = False
+            st.session_state.auth_token = None
             st.rerun()
 
-        # Page Routing
-        if page == "Account Overview":
-            st.title("Account Overview")
-            view_accounts()
-        elif page == "Create Account":
-            create_account()
-        elif page == "Make Transaction":
-            view_accounts()
-            make_transaction()
-        elif page == "Transaction History":
-            view_accounts()
-            view_transactions()
-        elif page == "Apply for Loan":
-            apply_loan()
-        elif page == "View Loans":
-            view_loans()
-        elif page == "Apply for Credit Card":
-            apply_credit_card()
-        elif page == "View Credit Cards":
-            view_credit_cards()
-        elif page == "Create Fixed Deposit":
-            create_fixed_deposit()
-        elif page == "View Fixed Deposits":
-            view_fixed_deposits()
-        elif page == "Manage Beneficiaries":
-            manage_beneficiaries()
-        elif page == "Notifications":
-            view_notifications()
+        if profiling:
+            show_profiler_panel(page)
+
+
+def render_page(page, data):
+    if page == "Account Overview":
+        st.title("Account Overview")
+        view_accounts(data)
+    elif page == "Create Account":
+        create_account()
+    elif page == "Make Transaction":
+        view_accounts(data)
+        make_transaction(data)
+    elif page == "Transaction History":
+        view_accounts(data)
+        view_transactions()
+    elif page == "Account Statement":
+        view_accounts(data)
+        view_statement()
+    elif page == "Apply for Loan":
+        apply_loan(data)
+    elif page == "View Loans":
+        view_loans()
+    elif page == "Loan Schedule":
+        view_loan_schedule()
+    elif page == "Apply for Credit Card":
+        apply_credit_card()
+    elif page == "View Credit Cards":
+        view_credit_cards()
+    elif page == "Create Fixed Deposit":
+        create_fixed_deposit()
+    elif page == "View Fixed Deposits":
+        view_fixed_deposits()
+    elif page == "Manage Beneficiaries":
+        manage_beneficiaries()
+    elif page == "Notifications":
+        view_notifications(data)
+
+
+def show_profiler_panel(page):
+    """Timing percentiles across reruns and a pstats download of the last renders."""
+    last = profiler.page_profiler.last.get(page, {})
+    with st.expander(f"⏱ Render profile: {last.get('total', 0) * 1000:,.1f} ms"):
+        st.caption("This render: " + ", ".join(f"{phase} {seconds * 1000:,.1f} ms"
+                                               for phase, seconds in sorted(last.items())))
+        summary = profiler.page_profiler.summary()
+        if summary:
+            st.dataframe(pd.DataFrame(summary, columns=["Page", "Phase", "Renders", "p50 (ms)",
+                                                        "p95 (ms)", "p99 (ms)", "Max (ms)"]).round(1))
+        dump = profiler.page_profiler.dump()
+        if dump:
+            st.download_button(f"Download cProfile of last {profiler.page_profiler.profiled_renders()} renders",
+                               dump, file_name="bank-app.pstats", mime="application/octet-stream")
+        else:
+            st.caption("No cProfile data yet (another render held the profiler).")
+
 
 if __name__ == "__main__":
     main()
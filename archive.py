@@ -0,0 +1,111 @@
+import argparse
+import datetime
+
+from bank import DAILY_BALANCES_JOB
+from config import get_setting
+from database import DatabaseConnection
+from jobs import peek_watermark
+
+# Hot/cold tiering of the ledger. Transactions older than ARCHIVE_AFTER_DAYS
+# are moved from transactions to transactions_archive in committed chunks,
+# each chunk copied and deleted in one transaction, so every row is in
+# exactly one table at any time. transaction_archive_state.archived_before
+# is raised before anything moves; readers (see BankManagement.
+# get_transaction_page and get_statement) only read the archive for date
+# ranges that reach back before it, so day-to-day history stays on the
+# small hot table. (MySQL cannot partition a table with foreign keys, which
+# rules out range partitioning of transactions.)
+#
+# Rows the daily_balances job has not yet processed are never moved, so the
+# job and statement opening balances only ever need the hot table.
+
+ARCHIVE_AFTER_DAYS = get_setting('archive', 'after_days', 365, int)
+CHUNK_SIZE = get_setting('archive', 'chunk_size', 5000, int)
+
+# Parameters: (after_id, last id processed by daily_balances, chunk_size)
+AGED_CHUNK_SQL = '''SELECT transaction_id, transaction_date FROM transactions
+                    WHERE transaction_id > %s AND transaction_id <= %s
+                    ORDER BY transaction_id
+                    LIMIT %s'''
+
+
+def raise_boundary(cursor, cutoff):
+    """Move archived_before forward to ``cutoff`` (never back); returns the boundary in force."""
+    cursor.execute('''UPDATE transaction_archive_state
+                      SET archived_before = GREATEST(COALESCE(archived_before, %s), %s)
+                      WHERE id = 1''', (cutoff, cutoff))
+    cursor.execute("SELECT archived_before FROM transaction_archive_state WHERE id = 1")
+    return cursor.fetchone()[0]
+
+
+def _archive_chunk(cursor, boundary, after_id, chunk_size):
+    """Move one chunk of rows dated before ``boundary`` with ids above ``after_id``.
+
+    Returns (rows moved, last id examined, finished).
+    """
+    # The state row lock keeps two archive runs from moving the same rows
+    cursor.execute("SELECT archived_before FROM transaction_archive_state WHERE id = 1 FOR UPDATE")
+    last_processed = peek_watermark(cursor, DAILY_BALANCES_JOB)
+
+    # Ids follow time, so aged rows sit at the front of the primary key; the
+    # scan stops at the first row that is still hot
+    cursor.execute(AGED_CHUNK_SQL, (after_id, last_processed, chunk_size))
+    rows = cursor.fetchall()
+    cutoff = datetime.datetime.combine(boundary, datetime.time())
+    ids = []
+    last_id = after_id
+    finished = len(rows) < chunk_size
+    for transaction_id, transaction_date in rows:
+        if transaction_date is not None and transaction_date >= cutoff:
+            finished = True
+            break
+        last_id = transaction_id
+        if transaction_date is not None:
+            ids.append(transaction_id)
+
+    if ids:
+        placeholders = ', '.join(['%s'] * len(ids))
+        cursor.execute(f'''INSERT INTO transactions_archive
+                           SELECT * FROM transactions WHERE transaction_id IN ({placeholders})''', ids)
+        cursor.execute(f"DELETE FROM transactions WHERE transaction_id IN ({placeholders})", ids)
+    return len(ids), last_id, finished
+
+
+def archive_transactions(db, older_than_days=ARCHIVE_AFTER_DAYS, chunk_size=CHUNK_SIZE):
+    """Move transactions dated more than ``older_than_days`` ago to the archive.
+
+    Returns (rows moved, archive boundary date). Safe to interrupt and rerun.
+    """
+    cutoff = datetime.date.today() - datetime.timedelta(days=older_than_days)
+    with db.session() as session:
+        boundary = raise_boundary(session.cursor, cutoff)
+        session.connection.commit()
+
+    moved = 0
+    after_id = 0
+    while True:
+        with db.session() as session:
+            count, after_id, finished = _archive_chunk(session.cursor, boundary, after_id, chunk_size)
+            session.connection.commit()
+        moved += count
+        if finished:
+            return moved, boundary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move aged transactions to transactions_archive.")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help="Archive transactions older than this many days")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows moved per committed chunk")
+    args = parser.parse_args()
+
+    db = DatabaseConnection()
+    try:
+        moved, boundary = archive_transactions(db, args.days, args.chunk_size)
+        print(f"Archived {moved} transactions dated before {boundary}")
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
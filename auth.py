@@ -0,0 +1,207 @@
+import asyncio
+import base64
+import functools
+import hashlib
+import hmac
+import re
+import secrets
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+from config import get_setting
+
+# Password hashing and session tokens. Passwords are stored as scrypt hashes
+# ("scrypt$n$r$p$salt$key"), or PBKDF2-SHA256 where OpenSSL lacks scrypt.
+# The KDF runs on a small bounded thread pool - hashlib releases the GIL
+# while deriving - so a burst of logins cannot starve the Streamlit script
+# threads or the API event loop. Legacy plaintext and unsalted SHA-256
+# passwords still verify and are re-hashed on the next successful login.
+#
+# After login the caller holds an HMAC-signed token; verifying it is a cache
+# lookup (or one HMAC on a miss), never a database round trip.
+
+SCRYPT_N = get_setting('auth', 'scrypt_n', 2 ** 14, int)
+SCRYPT_R = get_setting('auth', 'scrypt_r', 8, int)
+SCRYPT_P = get_setting('auth', 'scrypt_p', 1, int)
+PBKDF2_ITERATIONS = get_setting('auth', 'pbkdf2_iterations', 600000, int)
+HASH_WORKERS = get_setting('auth', 'hash_workers', 4, int)
+
+# Set a shared secret when several processes (API workers) must accept each
+# other's tokens; otherwise every process signs with its own random key, so
+# tokens die with the process. api.py refuses to start more than one worker
+# without it. Logout is still recorded per process only: a revoked token keeps
+# working on the other workers until it expires, so keep token_ttl short.
+TOKEN_SECRET = get_setting('auth', 'token_secret', None)
+TOKEN_TTL = get_setting('auth', 'token_ttl', 8 * 3600, int)
+TOKEN_CACHE_ENTRIES = get_setting('auth', 'token_cache_entries', 10000, int)
+
+HAS_SCRYPT = hasattr(hashlib, 'scrypt')
+_SHA256_HEX = re.compile(r'[0-9a-fA-F]{64}')
+
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2) + (1 << 20), dklen=32)
+
+
+def hash_password(password):
+    """Salted KDF hash of ``password`` in the stored string format. CPU-heavy; see PasswordHasher."""
+    salt = secrets.token_bytes(16)
+    if HAS_SCRYPT:
+        key = _scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${_b64(salt)}${_b64(key)}"
+    key = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, PBKDF2_ITERATIONS)
+    return f"pbkdf2_sha256${PBKDF2_ITERATIONS}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password, stored):
+    """Check ``password`` against a stored hash in constant time.
+
+    Returns (matches, new_hash); new_hash is set when the password matched a
+    legacy or weaker hash and should replace it.
+    """
+    try:
+        scheme = stored.split('$', 1)[0]
+        if scheme == 'scrypt':
+            _, n, r, p, salt, key = stored.split('$')
+            matches = hmac.compare_digest(_scrypt(password, _unb64(salt), int(n), int(r), int(p)), _unb64(key))
+            stale = not HAS_SCRYPT or (int(n), int(r), int(p)) != (SCRYPT_N, SCRYPT_R, SCRYPT_P)
+        elif scheme == 'pbkdf2_sha256':
+            _, iterations, salt, key = stored.split('$')
+            derived = hashlib.pbkdf2_hmac('sha256', password.encode(), _unb64(salt), int(iterations))
+            matches = hmac.compare_digest(derived, _unb64(key))
+            stale = HAS_SCRYPT or int(iterations) != PBKDF2_ITERATIONS
+        else:
+            # Legacy rows: unsalted SHA-256 hex (bank.create_customer) or
+            # plaintext (the old registration form); both are always upgraded.
+            # A row is one or the other - a hex digest is never accepted as
+            # the password itself, or knowing the hash would be enough
+            if _SHA256_HEX.fullmatch(stored):
+                candidate = hashlib.sha256(password.encode()).hexdigest()
+            else:
+                candidate = password
+            matches = hmac.compare_digest(candidate.encode(), stored.encode())
+            stale = True
+    except (ValueError, TypeError):
+        return False, None
+    return matches, (hash_password(password) if matches and stale else None)
+
+
+@functools.lru_cache(maxsize=1)
+def _dummy_hash():
+    return hash_password(secrets.token_hex(16))
+
+
+class PasswordHasher:
+    """Runs hash_password/verify_password on a bounded worker pool."""
+
+    def __init__(self, workers=HASH_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hash')
+
+    def hash(self, password):
+        return self.executor.submit(hash_password, password).result()
+
+    def verify(self, password, stored):
+        """(matches, new_hash) as verify_password; pass stored=None for an unknown user.
+
+        An unknown user is checked against a throwaway hash so the response
+        time does not reveal whether the email exists.
+        """
+        matches, new_hash = self.executor.submit(verify_password, password, stored or _dummy_hash()).result()
+        return (False, None) if stored is None else (matches, new_hash)
+
+    async def hash_async(self, password):
+        return await asyncio.wrap_future(self.executor.submit(hash_password, password))
+
+    async def verify_async(self, password, stored):
+        matches, new_hash = await asyncio.wrap_future(
+            self.executor.submit(verify_password, password, stored or _dummy_hash()))
+        return (False, None) if stored is None else (matches, new_hash)
+
+
+class SessionTokens:
+    """HMAC-signed, expiring session tokens with an in-memory verification cache.
+
+    A token is "<customer_id>.<expires>.<nonce>.<signature>". Revocation
+    (logout) is recorded in this process only, until the token would have
+    expired; other processes sharing the secret still accept the token.
+    """
+
+    def __init__(self, secret=TOKEN_SECRET, ttl=TOKEN_TTL, cache_entries=TOKEN_CACHE_ENTRIES):
+        self._key = (secret or secrets.token_hex(32)).encode()
+        self.ttl = ttl
+        self.cache = TTLCache(cache_entries, ttl)
+        self._revoked = {}   # token -> expires
+        self._lock = threading.Lock()
+
+    def _sign(self, payload):
+        return _b64(hmac.new(self._key, payload.encode(), hashlib.sha256).digest())
+
+    def issue(self, customer_id):
+        expires = int(time.time()) + self.ttl
+        payload = f"{customer_id}.{expires}.{secrets.token_urlsafe(12)}"
+        return f"{payload}.{self._sign(payload)}"
+
+    def verify(self, token):
+        """The customer_id of a valid, unexpired, unrevoked token, else None."""
+        if not token:
+            return None
+        claims = self.cache.get(token)
+        if claims is None:
+            payload, _, signature = token.rpartition('.')
+            if not payload or not hmac.compare_digest(signature.encode(), self._sign(payload).encode()):
+                return None
+            customer_id, expires, _ = payload.split('.')
+            claims = (int(customer_id), int(expires))
+            remaining = claims[1] - time.time()
+            if remaining <= 0:
+                return None
+            self.cache.set(token, claims, ttl=remaining)
+        if claims[1] <= time.time() or token in self._revoked:
+            return None
+        return claims[0]
+
+    def revoke(self, token):
+        if not token:
+            return
+        now = time.time()
+        with self._lock:
+            self._revoked = {revoked: expires for revoked, expires in self._revoked.items() if expires > now}
+            self._revoked[token] = now + self.ttl
+        self.cache.invalidate(token)
+
+
+LOGIN_SQL = "SELECT customer_id, password FROM customers WHERE email = %s"
+
+password_hasher = PasswordHasher()
+session_tokens = SessionTokens()
+
+
+def authenticate(db, email, password, hasher=password_hasher):
+    """The customer_id for valid credentials, else None.
+
+    A legacy or outdated stored hash is replaced after a successful check;
+    the compare-and-set UPDATE leaves a concurrently changed password alone.
+    """
+    with db.session() as session:
+        session.cursor.execute(LOGIN_SQL, (email,))
+        row = session.cursor.fetchone()
+    matches, new_hash = hasher.verify(password, row[1] if row else None)
+    if not matches:
+        return None
+    if new_hash:
+        with db.session() as session:
+            session.cursor.execute("UPDATE customers SET password = %s WHERE customer_id = %s AND password = %s",
+                                   (new_hash, row[0], row[1]))
+            session.connection.commit()
+    return row[0]
@@ -1,32 +1,347 @@
 from database import DatabaseConnection
-import hashlib
+from cache import TTLCache
+from auth import password_hasher
+from cards import CardNumberAllocator
+from outbox import ENQUEUE_SQL, card_issued_event
+from config import get_setting
+from decimal import Decimal, InvalidOperation
+from mysql.connector import Error
+import migrations
+import base64
 import datetime
-import secrets
+import random
+import threading
+import time
 
 # Card limits by tier (application-level enforcement)
-# Values are currency amounts. Adjust as needed.
+# Values are currency amounts, as Decimals so the tier edges match the
+# DECIMAL bounds in the credit card triggers exactly. Adjust as needed.
 CARD_LIMITS = {
-    'Silver': (0.00, 50000.00),
-    'Gold': (50000.01, 200000.00),
-    'Platinum': (200000.01, 1000000.00)
+    'Silver': (Decimal('0.00'), Decimal('50000.00')),
+    'Gold': (Decimal('50000.01'), Decimal('200000.00')),
+    'Platinum': (Decimal('200000.01'), Decimal('1000000.00'))
 }
 
+# Posting types accepted by post_batch and the default number of postings
+# committed together (BANK_BANK_BATCH_CHUNK_SIZE / [bank] batch_chunk_size).
+POSTING_TYPES = ('deposit', 'withdrawal')
+BATCH_CHUNK_SIZE = get_setting('bank', 'batch_chunk_size', 1000, int)
+
+CENT = Decimal('0.01')
+# Amounts and balances are DECIMAL(15, 2), so they must stay below 10^13
+MAX_AMOUNT = Decimal('10000000000000')
+# transaction_date is a MySQL TIMESTAMP, which only holds this range
+TIMESTAMP_RANGE = (datetime.datetime(1970, 1, 2), datetime.datetime(2038, 1, 18))
+
+
+def parse_amount(value):
+    """A positive Decimal amount with at most two decimal places that fits the amount columns."""
+    amount = Decimal(str(value))
+    if not amount.is_finite() or amount <= 0:
+        raise ValueError("Amount must be positive")
+    if amount != amount.quantize(CENT):
+        raise ValueError("Amount has more than two decimal places")
+    if amount >= MAX_AMOUNT:
+        raise ValueError(f"Amount must be less than {MAX_AMOUNT}")
+    return amount
+
+
+def parse_transaction_date(value):
+    """A naive datetime from a date/datetime or an ISO 8601 string, within TIMESTAMP_RANGE."""
+    if isinstance(value, datetime.datetime):
+        parsed = value
+    elif isinstance(value, datetime.date):
+        parsed = datetime.datetime.combine(value, datetime.time())
+    else:
+        parsed = datetime.datetime.fromisoformat(str(value).strip())
+    if parsed.tzinfo is not None:
+        raise ValueError("transaction_date must not carry a time zone")
+    if not TIMESTAMP_RANGE[0] <= parsed < TIMESTAMP_RANGE[1]:
+        raise ValueError(f"transaction_date {value} is outside the supported range")
+    return parsed
+
+# Deadlock (1213) and lock wait timeout (1205) leave nothing committed, so
+# transfers that hit them are retried up to TRANSFER_RETRIES times with
+# jittered exponential backoff starting at TRANSFER_BACKOFF seconds.
+RETRYABLE_ERRNOS = (1213, 1205)
+TRANSFER_RETRIES = get_setting('bank', 'transfer_retries', 5, int)
+TRANSFER_BACKOFF = get_setting('bank', 'transfer_backoff', 0.02, float)
+
+
+def lock_retry_delay(attempt):
+    """Seconds to wait before retrying after failed ``attempt`` (0-based)."""
+    # Full jitter keeps colliding transfers from retrying in lockstep
+    return random.uniform(0, TRANSFER_BACKOFF * 2 ** attempt)
+
+
+# Product terms shared by the Streamlit app and the HTTP API
+LOAN_INTEREST_RATE = 8.5
+
+
+def fd_interest_rate(term_months):
+    return 5.0 + (term_months / 12)  # Base rate + term bonus
+
+# Transaction types that take money out of an account; every other type
+# (deposit, transfer_in, interest, ...) adds to it.
+DEBIT_TYPES = ('withdrawal', 'transfer_out', 'fd_investment')
+# A transaction row's effect on its balance, for SQL sums over the ledger
+SIGNED_AMOUNT_SQL = f'''CASE WHEN type IN ({', '.join(f"'{t}'" for t in DEBIT_TYPES)})
+                        THEN -amount ELSE amount END'''
+
+# Read-through cache sizing ([cache] section / BANK_CACHE_*). Balances are
+# invalidated on every write made through BankManagement; the TTL bounds how
+# long writes from other processes (API workers, import jobs) can go unseen.
+CACHE_MAX_ENTRIES = get_setting('cache', 'max_entries', 4096, int)
+CACHE_TTL = get_setting('cache', 'ttl', 30.0, float)
+REFERENCE_TTL = get_setting('cache', 'reference_ttl', 300.0, float)
+
+# job_watermarks entry maintained by daily_balances.py
+DAILY_BALANCES_JOB = 'daily_balances'
+
+
+def signed_amount(txn_type, amount):
+    return -amount if txn_type in DEBIT_TYPES else amount
+
+
+def encode_page_token(row):
+    """Opaque keyset token for a (transaction_id, ..., transaction_date) row."""
+    raw = f"{row[-1].isoformat()}|{row[0]}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_page_token(token):
+    try:
+        raw = base64.urlsafe_b64decode(token.encode()).decode()
+        when, transaction_id = raw.split('|')
+        return datetime.datetime.fromisoformat(when), int(transaction_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid page token: {token}") from e
+
+
+# Single conditional balance write shared by post_transaction and api.py.
+# Parameters: (signed amount, account_id, signed amount).
+POST_BALANCE_SQL = '''UPDATE accounts
+                      SET balance = LAST_INSERT_ID(ROUND((balance + %s) * 100)) / 100
+                      WHERE account_id = %s AND status = 'active' AND balance + %s >= 0'''
+INSERT_TRANSACTION_SQL = '''INSERT INTO transactions (account_id, type, amount, description)
+                            VALUES (%s, %s, %s, %s)'''
+STATEMENT_LINES_SQL = '''SELECT transaction_id, transaction_date, type, description, amount
+                         FROM {table}
+                         WHERE account_id = %s AND transaction_date >= %s AND transaction_date < %s
+                         ORDER BY transaction_date, transaction_id'''
+INSERT_CARD_SQL = '''INSERT INTO credit_cards
+                     (customer_id, card_number, card_type, expiry_date, credit_limit, current_balance, status)
+                     VALUES (%s, %s, %s, %s, %s, %s, %s)'''
+
+# Statement opening balance: the last daily snapshot before the range, plus
+# the transactions before the range that the snapshot job has not reached.
+# OPENING_TAIL_SQL parameters: (account_id, start_date, job_name)
+OPENING_SNAPSHOT_SQL = '''SELECT closing_balance FROM daily_balances
+                          WHERE account_id = %s AND balance_date < %s
+                          ORDER BY balance_date DESC LIMIT 1'''
+OPENING_TAIL_SQL = f'''SELECT COALESCE(SUM({SIGNED_AMOUNT_SQL}), 0)
+                       FROM transactions
+                       WHERE account_id = %s AND transaction_date < %s
+                         AND transaction_id > COALESCE((SELECT last_transaction_id FROM job_watermarks
+                                                        WHERE job_name = %s), 0)'''
+
+# Per-customer reads shared by app.py, api.py and BankManagement
+CUSTOMER_ACCOUNTS_SQL = '''SELECT account_id, account_type, balance, status, created_at
+                           FROM accounts WHERE customer_id = %s'''
+PRIMARY_ACCOUNT_SQL = '''SELECT account_id FROM accounts
+                         WHERE customer_id = %s AND status = 'active' LIMIT 1'''
+ACCOUNT_BALANCE_SQL = "SELECT balance FROM accounts WHERE account_id = %s"
+BRANCHES_SQL = "SELECT branch_id, branch_name, city FROM branches"
+BRANCH_COUNT_SQL = "SELECT COUNT(*) FROM branches"
+BENEFICIARIES_SQL = '''SELECT name, account_number, bank_name, ifsc_code, relationship, created_at
+                       FROM beneficiaries WHERE customer_id = %s
+                       ORDER BY created_at DESC'''
+REMOVE_BENEFICIARY_SQL = "DELETE FROM beneficiaries WHERE customer_id = %s AND name = %s"
+
+
+def post_transaction(cursor, account_id, txn_type, amount, description):
+    """Apply one posting with a single conditional balance write; does not commit.
+
+    The UPDATE only matches while the account is active and the resulting
+    balance stays non-negative, so concurrent debits cannot overdraw it and
+    no prior SELECT or row lock is needed. LAST_INSERT_ID(expr) hands the new
+    balance (in cents) back in the UPDATE's own OK packet, exposed by the
+    driver as lastrowid. Returns the new balance, or None if the account was
+    not updated.
+    """
+    delta = signed_amount(txn_type, amount)
+    cursor.execute(POST_BALANCE_SQL, (delta, account_id, delta))
+    if cursor.rowcount != 1:
+        return None
+    new_balance = (Decimal(cursor.lastrowid) * CENT).quantize(CENT)
+    cursor.execute(INSERT_TRANSACTION_SQL, (account_id, txn_type, amount, description))
+    return new_balance
+
+
+def transfer_legs(from_account_id, to_account_id, amount, description=None):
+    """The two postings of a transfer, ordered by account_id.
+
+    Applying them in this order means every transfer touching the same pair
+    of accounts takes the row locks in the same order, so opposite transfers
+    queue behind each other instead of deadlocking.
+    """
+    legs = [(from_account_id, 'transfer_out', amount, description or f"Transfer to account {to_account_id}"),
+            (to_account_id, 'transfer_in', amount, description or f"Transfer from account {from_account_id}")]
+    return sorted(legs, key=lambda leg: leg[0])
+
+
+def lock_accounts_query(account_ids):
+    """SQL and parameters locking accounts FOR UPDATE in ascending account_id order."""
+    account_ids = sorted(account_ids)
+    return f'''SELECT account_id, balance, status FROM accounts
+               WHERE account_id IN ({', '.join(['%s'] * len(account_ids))})
+               ORDER BY account_id FOR UPDATE''', account_ids
+
+
+def lock_accounts(cursor, account_ids):
+    """Lock accounts FOR UPDATE in ascending account_id order.
+
+    Returns {account_id: [balance, status]} for the accounts that exist.
+    """
+    cursor.execute(*lock_accounts_query(account_ids))
+    return {row[0]: [row[1], row[2]] for row in cursor.fetchall()}
+
+
+def balance_deltas_query(deltas):
+    """SQL and parameters adding {account_id: delta} to balances with a single UPDATE."""
+    cases = ' '.join(['WHEN %s THEN %s'] * len(deltas))
+    params = [value for item in deltas.items() for value in item]
+    params.extend(deltas.keys())
+    return f'''UPDATE accounts
+               SET balance = balance + CASE account_id {cases} END
+               WHERE account_id IN ({', '.join(['%s'] * len(deltas))})''', params
+
+
+def apply_balance_deltas(cursor, deltas):
+    """Add {account_id: delta} to balances with a single UPDATE; zero deltas are skipped."""
+    deltas = {account_id: delta for account_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    cursor.execute(*balance_deltas_query(deltas))
+
+
+def check_card_request(card_type, requested_limit):
+    """Raise ValueError unless requested_limit fits the card tier."""
+    if card_type not in CARD_LIMITS:
+        raise ValueError(f"Invalid card tier: {card_type}. Valid tiers: {', '.join(CARD_LIMITS.keys())}")
+
+    min_lim, max_lim = CARD_LIMITS[card_type]
+    # Via str so a float limit compares by its written value, not its binary one
+    if not (min_lim <= Decimal(str(requested_limit)) <= max_lim):
+        raise ValueError(
+            f"Requested limit {requested_limit} not allowed for tier {card_type} (allowed: {min_lim} - {max_lim})"
+        )
+
+
+def transaction_page_query(account_id, page_size, token=None, newer=False,
+                           start_date=None, end_date=None, types=None, table='transactions'):
+    """SQL and parameters for one keyset page; see get_transaction_page.
+
+    ``table`` is 'transactions' or 'transactions_archive'.
+    """
+    conditions = ['account_id = %s']
+    params = [account_id]
+    if start_date is not None:
+        conditions.append('transaction_date >= %s')
+        params.append(start_date)
+    if end_date is not None:
+        conditions.append('transaction_date < %s')
+        params.append(end_date + datetime.timedelta(days=1))
+    if types:
+        conditions.append(f"type IN ({', '.join(['%s'] * len(types))})")
+        params.extend(types)
+    if token is not None:
+        op = '>' if newer else '<'
+        conditions.append(f'(transaction_date {op} %s OR (transaction_date = %s AND transaction_id {op} %s))')
+        params.extend([token[0], token[0], token[1]])
+    order = 'ASC' if newer else 'DESC'
+
+    query = f'''SELECT transaction_id, type, amount, description, transaction_date
+                FROM {table}
+                WHERE {' AND '.join(conditions)}
+                ORDER BY transaction_date {order}, transaction_id {order}
+                LIMIT %s'''
+    params.append(page_size + 1)
+    return query, params
+
+
+# Rows dated before this boundary may live in transactions_archive (archive.py)
+ARCHIVE_BOUNDARY_SQL = "SELECT archived_before FROM transaction_archive_state WHERE id = 1"
+
+
+def archive_boundary(row):
+    """The archive boundary as a datetime, from a fetched ARCHIVE_BOUNDARY_SQL row (None: nothing archived)."""
+    if row is None or row[0] is None:
+        return None
+    return datetime.datetime.combine(row[0], datetime.time())
+
+
+def page_needs_archive(boundary, rows, page_size, token=None, newer=False, start_date=None):
+    """Whether a page read from the hot table must also read transactions_archive.
+
+    Every archived row is dated before ``boundary``, so the archive is only
+    read when the page can reach back past it: a newest-first page that came
+    back short or ended before the boundary, or a newer page whose token lies
+    before it.
+    """
+    if boundary is None:
+        return False
+    if start_date is not None and datetime.datetime.combine(start_date, datetime.time()) >= boundary:
+        return False
+    if newer:
+        return token[0] < boundary
+    return len(rows) <= page_size or rows[-1][4] < boundary
+
+
+def merge_page_rows(hot_rows, archived_rows, page_size, newer=False):
+    """Combine hot and archived page rows in page order, keeping page_size + 1."""
+    rows = sorted([*hot_rows, *archived_rows], key=lambda row: (row[4], row[0]), reverse=not newer)
+    return rows[:page_size + 1]
+
+
+def transaction_page(rows, page_size, token=None, newer=False):
+    """Trim the page_size + 1 rows fetched by transaction_page_query into a page dict."""
+    has_more = len(rows) > page_size
+    rows = list(rows[:page_size])
+    if newer:
+        rows.reverse()
+        next_token = encode_page_token(rows[-1]) if rows else None
+        previous_token = encode_page_token(rows[0]) if has_more else None
+    else:
+        next_token = encode_page_token(rows[-1]) if has_more else None
+        previous_token = encode_page_token(rows[0]) if (token is not None and rows) else None
+    return {'rows': rows, 'next': next_token, 'previous': previous_token}
+
+
 class BankManagement:
-    def __init__(self):
-        self.db = DatabaseConnection()
-        self.db.create_tables()
+    def __init__(self, db=None):
+        # Share the caller's pool when given one (e.g. the Streamlit app)
+        self.db = db if db is not None else DatabaseConnection()
+        self.cache = TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+        self.card_allocator = CardNumberAllocator(self.db)
+        # Deadlock/lock-wait retries and transfers abandoned after the last retry
+        self.transfer_stats = {'retries': 0, 'aborts': 0}
+        self._stats_lock = threading.Lock()
+        self._single_write_schema = False
 
     def create_customer(self, name, address, phone, email, password):
         try:
-            # Hash the password
-            hashed_password = hashlib.sha256(password.encode()).hexdigest()
-            
+            # KDF on the shared hashing pool (see auth.py)
+            hashed_password = password_hasher.hash(password)
+
+
             query = '''INSERT INTO customers (name, address, phone, email, password) 
                       VALUES (%s, %s, %s, %s, %s)'''
             values = (name, address, phone, email, hashed_password)
             
-            self.db.cursor.execute(query, values)
-            self.db.connection.commit()
+            with self.db.session() as session:
+                session.cursor.execute(query, values)
+                session.connection.commit()
             return True
         except Exception as e:
             print(f"Error creating customer: {e}")
@@ -38,8 +353,15 @@ class BankManagement:
                       VALUES (%s, %s, %s)'''
             values = (customer_id, account_type, initial_balance)
             
-            self.db.cursor.execute(query, values)
-            self.db.connection.commit()
+            with self.db.session() as session:
+                session.cursor.execute(query, values)
+                # Record the opening balance in the ledger as well
+                if initial_balance > 0:
+                    session.cursor.execute('''INSERT INTO transactions (account_id, type, amount, description)
+                                              VALUES (%s, %s, %s, %s)''',
+                                           (session.cursor.lastrowid, 'deposit', initial_balance, 'Initial deposit'))
+                session.connection.commit()
+            self.cache.invalidate(('accounts', customer_id))
             return True
         except Exception as e:
             print(f"Error creating account: {e}")
@@ -47,110 +369,514 @@ class BankManagement:
 
     def deposit(self, account_id, amount):
         try:
-            # Update account balance
-            update_query = '''UPDATE accounts 
-                            SET balance = balance + %s 
-                            WHERE account_id = %s'''
-            self.db.cursor.execute(update_query, (amount, account_id))
-
-            # Record transaction
-            transaction_query = '''INSERT INTO transactions 
-                                 (account_id, type, amount, description) 
-                                 VALUES (%s, %s, %s, %s)'''
-            self.db.cursor.execute(transaction_query, 
-                                 (account_id, 'deposit', amount, 'Deposit transaction'))
-
-            self.db.connection.commit()
-            return True
+            return self.post(account_id, 'deposit', amount, 'Deposit transaction') is not None
         except Exception as e:
             print(f"Error processing deposit: {e}")
             return False
 
     def withdraw(self, account_id, amount):
         try:
-            # Check balance
-            self.db.cursor.execute('''SELECT balance FROM accounts 
-                                    WHERE account_id = %s''', (account_id,))
-            current_balance = self.db.cursor.fetchone()[0]
-
-            if current_balance >= amount:
-                # Update account balance
-                update_query = '''UPDATE accounts 
-                                SET balance = balance - %s 
-                                WHERE account_id = %s'''
-                self.db.cursor.execute(update_query, (amount, account_id))
-
-                # Record transaction
-                transaction_query = '''INSERT INTO transactions 
-                                     (account_id, type, amount, description) 
-                                     VALUES (%s, %s, %s, %s)'''
-                self.db.cursor.execute(transaction_query, 
-                                     (account_id, 'withdrawal', amount, 'Withdrawal transaction'))
-
-                self.db.connection.commit()
-                return True
-            else:
+            if self.post(account_id, 'withdrawal', amount, 'Withdrawal transaction') is None:
                 print("Insufficient balance")
                 return False
+            return True
         except Exception as e:
             print(f"Error processing withdrawal: {e}")
             return False
 
+    def post(self, account_id, txn_type, amount, description=None):
+        """Post one deposit or withdrawal and commit.
+
+        Returns the new balance, or None when the account is unknown,
+        inactive or short of funds. Raises ValueError on an invalid posting.
+        """
+        account_id, txn_type, amount, description, _ = self._parse_posting({
+            'account_id': account_id, 'type': txn_type, 'amount': amount, 'description': description
+        })
+        with self.db.session() as session:
+            new_balance = post_transaction(session.cursor, account_id, txn_type, amount, description)
+            if new_balance is not None:
+                session.connection.commit()
+                self.invalidate_accounts(account_id)
+            return new_balance
+
+    def post_batch(self, postings, chunk_size=None, before_commit=None):
+        """Post many deposits and withdrawals with one commit per chunk.
+
+        Each posting is a dict with ``account_id``, ``type`` ('deposit' or
+        'withdrawal') and ``amount``, plus optional ``description`` and
+        ``transaction_date`` (a date/datetime or ISO 8601 string). Amounts
+        and resulting balances must stay below MAX_AMOUNT; anything that
+        cannot be stored is rejected per posting rather than failing the
+        chunk. Postings are applied in order, so a withdrawal
+        can be covered by an earlier deposit in the same chunk. Balance
+        changes are netted per account and written with a single UPDATE per
+        chunk, and the transaction rows are inserted with executemany.
+
+        Returns one dict per posting, in input order:
+        ``{'index', 'account_id', 'status', 'reason'}`` where status is
+        'posted', 'rejected' (the posting itself is invalid) or 'failed'
+        (the chunk hit a database error and was rolled back; safe to retry).
+
+        ``before_commit(cursor, results)``, if given, runs inside each
+        chunk's transaction just before its commit, with that chunk's
+        results; whatever it writes commits or rolls back with the chunk.
+        It is not called for a chunk with no valid postings.
+
+        Raises RuntimeError on a schema that still has the balance triggers
+        (before migration 5), where every delta would be applied twice.
+        """
+        chunk_size = chunk_size or BATCH_CHUNK_SIZE
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        self._require_single_write_schema()
+
+        results = []
+        chunk = []
+        for index, posting in enumerate(postings):
+            chunk.append((index, posting))
+            if len(chunk) >= chunk_size:
+                results.extend(self._post_chunk(chunk, before_commit))
+                chunk = []
+        if chunk:
+            results.extend(self._post_chunk(chunk, before_commit))
+        return results
+
+    def _require_single_write_schema(self):
+        # DatabaseConnection only prints an out-of-date schema, so check here
+        # once rather than double-post through the old balance triggers
+        if self._single_write_schema:
+            return
+        with self.db.session() as session:
+            version = migrations.current_version(session.cursor)
+        if version < migrations.SINGLE_WRITE_POSTINGS_VERSION:
+            raise RuntimeError(f"Schema is at version {version}; post_batch needs version "
+                               f"{migrations.SINGLE_WRITE_POSTINGS_VERSION} or later "
+                               "(run 'python migrations.py')")
+        self._single_write_schema = True
+
+    @staticmethod
+    def _parse_posting(posting):
+        txn_type = posting['type']
+        if txn_type not in POSTING_TYPES:
+            raise ValueError(f"Invalid posting type: {txn_type}")
+        amount = parse_amount(posting['amount'])
+        description = posting.get('description') or f"{txn_type.capitalize()} transaction"
+        txn_date = posting.get('transaction_date')
+        if txn_date is not None:
+            txn_date = parse_transaction_date(txn_date)
+        return int(posting['account_id']), txn_type, amount, description, txn_date
+
+    def _post_chunk(self, chunk, before_commit=None):
+        results = {}
+        parsed = []
+        for index, posting in chunk:
+            try:
+                parsed.append((index, self._parse_posting(posting)))
+            except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+                account_id = posting.get('account_id') if isinstance(posting, dict) else None
+                results[index] = {'index': index, 'account_id': account_id,
+                                  'status': 'rejected', 'reason': f"Invalid posting: {e}"}
+
+        if parsed:
+            account_ids = {p[1][0] for p in parsed}
+            try:
+                with self.db.session() as session:
+                    accounts = lock_accounts(session.cursor, account_ids)
+
+                    deltas = {}
+                    rows = []
+                    dated_rows = []
+                    for index, (account_id, txn_type, amount, description, txn_date) in parsed:
+                        reason = None
+                        if account_id not in accounts:
+                            reason = "Unknown account"
+                        elif accounts[account_id][1] != 'active':
+                            reason = "Account is not active"
+                        else:
+                            signed = amount if txn_type == 'deposit' else -amount
+                            if accounts[account_id][0] + signed < 0:
+                                reason = "Insufficient balance"
+                            elif accounts[account_id][0] + signed >= MAX_AMOUNT:
+                                reason = "Balance would exceed the maximum"
+                        if reason:
+                            results[index] = {'index': index, 'account_id': account_id,
+                                              'status': 'rejected', 'reason': reason}
+                            continue
+
+                        accounts[account_id][0] += signed
+                        deltas[account_id] = deltas.get(account_id, Decimal('0')) + signed
+                        if txn_date is None:
+                            rows.append((account_id, txn_type, amount, description))
+                        else:
+                            dated_rows.append((account_id, txn_type, amount, description, txn_date))
+                        results[index] = {'index': index, 'account_id': account_id,
+                                          'status': 'posted', 'reason': None}
+
+                    apply_balance_deltas(session.cursor, deltas)
+                    if rows:
+                        session.cursor.executemany(INSERT_TRANSACTION_SQL, rows)
+                    if dated_rows:
+                        session.cursor.executemany('''INSERT INTO transactions
+                                                      (account_id, type, amount, description, transaction_date)
+                                                      VALUES (%s, %s, %s, %s, %s)''', dated_rows)
+                    if before_commit is not None:
+                        before_commit(session.cursor, [results[index] for index, _ in chunk])
+
+                    session.connection.commit()
+                self.invalidate_accounts(*deltas)
+            except Exception as e:
+                print(f"Error posting batch: {e}")
+                for index, (account_id, *_) in parsed:
+                    results[index] = {'index': index, 'account_id': account_id,
+                                      'status': 'failed', 'reason': str(e)}
+
+        return [results[index] for index, _ in chunk]
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.transfer_stats[key] += 1
+
+    def _with_lock_retry(self, work):
+        """Run ``work()``, retrying it when MySQL picks it as a deadlock victim or times out a lock wait."""
+        for attempt in range(TRANSFER_RETRIES + 1):
+            try:
+                return work()
+            except Error as e:
+                if e.errno not in RETRYABLE_ERRNOS:
+                    raise
+                if attempt == TRANSFER_RETRIES:
+                    self._count('aborts')
+                    raise
+                self._count('retries')
+                time.sleep(lock_retry_delay(attempt))
+
+    @staticmethod
+    def _parse_transfer(transfer):
+        from_account_id = int(transfer['from_account_id'])
+        to_account_id = int(transfer['to_account_id'])
+        if from_account_id == to_account_id:
+            raise ValueError("Cannot transfer to the same account")
+        amount = parse_amount(transfer['amount'])
+        return from_account_id, to_account_id, amount, transfer.get('description')
+
+    def transfer(self, from_account_id, to_account_id, amount, description=None):
+        """Move money between two accounts and commit.
+
+        Both legs are written in ascending account_id order and the whole
+        transfer is retried on deadlock or lock wait timeout. Returns the
+        source account's new balance, or None when either account is unknown
+        or inactive or the source is short of funds. Raises ValueError on an
+        invalid transfer and mysql.connector.Error once retries run out.
+        """
+        from_account_id, to_account_id, amount, description = self._parse_transfer({
+            'from_account_id': from_account_id, 'to_account_id': to_account_id,
+            'amount': amount, 'description': description
+        })
+
+        def work():
+            with self.db.session() as session:
+                balances = {}
+                for account_id, txn_type, leg_amount, leg_description in transfer_legs(
+                        from_account_id, to_account_id, amount, description):
+                    balance = post_transaction(session.cursor, account_id, txn_type, leg_amount, leg_description)
+                    if balance is None:
+                        return None
+                    balances[account_id] = balance
+                session.connection.commit()
+            self.invalidate_accounts(from_account_id, to_account_id)
+            return balances[from_account_id]
+
+        return self._with_lock_retry(work)
+
+    def transfer_batch(self, transfers, chunk_size=None):
+        """Apply many transfers with one commit per chunk (e.g. a payroll run).
+
+        Each transfer is a dict with ``from_account_id``, ``to_account_id``
+        and ``amount``, plus an optional ``description``. Every account in a
+        chunk is locked up front in account_id order, transfers are applied
+        in input order against the locked balances, and the net change per
+        account is written with a single UPDATE. A chunk that deadlocks is
+        retried as a whole.
+
+        Returns one dict per transfer, in input order:
+        ``{'index', 'from_account_id', 'to_account_id', 'status', 'reason'}``
+        with status 'posted', 'rejected' or 'failed' as in post_batch.
+        """
+        chunk_size = chunk_size or BATCH_CHUNK_SIZE
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        results = []
+        chunk = []
+        for index, transfer in enumerate(transfers):
+            chunk.append((index, transfer))
+            if len(chunk) >= chunk_size:
+                results.extend(self._transfer_chunk(chunk))
+                chunk = []
+        if chunk:
+            results.extend(self._transfer_chunk(chunk))
+        return results
+
+    def _transfer_chunk(self, chunk):
+        results = {}
+        parsed = []
+        for index, transfer in chunk:
+            try:
+                parsed.append((index, self._parse_transfer(transfer)))
+            except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+                source = transfer.get('from_account_id') if isinstance(transfer, dict) else None
+                target = transfer.get('to_account_id') if isinstance(transfer, dict) else None
+                results[index] = {'index': index, 'from_account_id': source, 'to_account_id': target,
+                                  'status': 'rejected', 'reason': f"Invalid transfer: {e}"}
+
+        def work():
+            outcome = {}
+            with self.db.session() as session:
+                accounts = lock_accounts(session.cursor, {account_id for _, (source, target, *_) in parsed
+                                                          for account_id in (source, target)})
+                deltas = {}
+                rows = []
+                for index, (source, target, amount, description) in parsed:
+                    reason = None
+                    if source not in accounts or target not in accounts:
+                        reason = "Unknown account"
+                    elif accounts[source][1] != 'active' or accounts[target][1] != 'active':
+                        reason = "Account is not active"
+                    elif accounts[source][0] < amount:
+                        reason = "Insufficient balance"
+                    outcome[index] = {'index': index, 'from_account_id': source, 'to_account_id': target,
+                                      'status': 'rejected' if reason else 'posted', 'reason': reason}
+                    if reason:
+                        continue
+
+                    accounts[source][0] -= amount
+                    accounts[target][0] += amount
+                    deltas[source] = deltas.get(source, Decimal('0')) - amount
+                    deltas[target] = deltas.get(target, Decimal('0')) + amount
+                    rows.extend(transfer_legs(source, target, amount, description))
+
+                apply_balance_deltas(session.cursor, deltas)
+                if rows:
+                    session.cursor.executemany(INSERT_TRANSACTION_SQL, rows)
+                session.connection.commit()
+            self.invalidate_accounts(*deltas)
+            return outcome
+
+        if parsed:
+            try:
+                results.update(self._with_lock_retry(work))
+            except Exception as e:
+                print(f"Error posting transfer batch: {e}")
+                for index, (source, target, *_) in parsed:
+                    results[index] = {'index': index, 'from_account_id': source, 'to_account_id': target,
+                                      'status': 'failed', 'reason': str(e)}
+
+        return [results[index] for index, _ in chunk]
+
+    def invalidate_accounts(self, *account_ids):
+        """Drop cached reads that include these accounts; call after committing a balance change."""
+        self.cache.invalidate_tag(*(('account', account_id) for account_id in account_ids))
+
+    def get_customer_accounts(self, customer_id):
+        """Cached (account_id, account_type, balance, status, created_at) rows of a customer."""
+        def load():
+            with self.db.session() as session:
+                session.cursor.execute(CUSTOMER_ACCOUNTS_SQL, (customer_id,))
+                return session.cursor.fetchall()
+
+        return self.cache.get_or_load(('accounts', customer_id), load,
+                                      tags=lambda rows: [('account', row[0]) for row in rows])
+
+    def get_branches(self):
+        """Cached (branch_id, branch_name, city) rows."""
+        def load():
+            with self.db.session() as session:
+                session.cursor.execute(BRANCHES_SQL)
+                return session.cursor.fetchall()
+
+        return self.cache.get_or_load(('branches',), load, ttl=REFERENCE_TTL)
+
     def check_balance(self, account_id):
         try:
-            self.db.cursor.execute('''SELECT balance FROM accounts 
-                                    WHERE account_id = %s''', (account_id,))
-            return self.db.cursor.fetchone()[0]
+            with self.db.session() as session:
+                session.cursor.execute(ACCOUNT_BALANCE_SQL, (account_id,))
+                return session.cursor.fetchone()[0]
         except Exception as e:
             print(f"Error checking balance: {e}")
             return None
 
-    def get_transaction_history(self, account_id):
+    def get_transaction_history(self, account_id, limit=50):
+        """Most recent transactions of an account; use get_transaction_page to go further back."""
+        return self.get_transaction_page(account_id, page_size=limit)['rows']
+
+    def get_transaction_page(self, account_id, page_size=50, after=None, before=None,
+                             start_date=None, end_date=None, types=None):
+        """One page of an account's transactions, newest first.
+
+        Pages are keyed on (transaction_date, transaction_id), so every page
+        costs one index range read no matter how long the history is. Pass
+        the returned ``next`` token as ``after`` to move to older rows and
+        ``previous`` as ``before`` to move back to newer ones. ``start_date``
+        and ``end_date`` are inclusive dates; ``types`` limits the
+        transaction types returned.
+
+        Returns ``{'rows', 'next', 'previous'}``; rows are
+        (transaction_id, type, amount, description, transaction_date).
+        Raises ValueError on a malformed token.
+        """
+        if after and before:
+            raise ValueError("Pass either after or before, not both")
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        newer = before is not None
+        token = decode_page_token(before if newer else after) if (before or after) else None
+
+        query, params = transaction_page_query(account_id, page_size, token, newer,
+                                               start_date, end_date, types)
         try:
-            query = '''SELECT * FROM transactions 
-                      WHERE account_id = %s 
-                      ORDER BY transaction_date DESC'''
-            self.db.cursor.execute(query, (account_id,))
-            return self.db.cursor.fetchall()
+            with self.db.session() as session:
+                # Both reads share the session's snapshot, so a row the
+                # archive job moves in between is seen exactly once
+                session.cursor.execute(ARCHIVE_BOUNDARY_SQL)
+                boundary = archive_boundary(session.cursor.fetchone())
+                session.cursor.execute(query, params)
+                rows = session.cursor.fetchall()
+                if page_needs_archive(boundary, rows, page_size, token, newer, start_date):
+                    query, params = transaction_page_query(account_id, page_size, token, newer, start_date,
+                                                           end_date, types, table='transactions_archive')
+                    session.cursor.execute(query, params)
+                    rows = merge_page_rows(rows, session.cursor.fetchall(), page_size, newer)
         except Exception as e:
             print(f"Error retrieving transaction history: {e}")
-            return []
+            return {'rows': [], 'next': None, 'previous': None}
+
+        return transaction_page(rows, page_size, token, newer)
+
+    def get_statement(self, account_id, start_date, end_date):
+        """Statement with opening, running and closing balances for a date range.
+
+        The opening balance comes from the last daily_balances snapshot before
+        ``start_date`` plus any transactions the snapshot job has not yet
+        reached, so only the range's own transactions are read in full.
+        The opening balance only needs the hot table: the archive job never
+        moves rows the snapshot job has not reached. Lines dated before the
+        archive boundary are read from transactions_archive as well.
+        Returns None on error.
+        """
+        range_end = end_date + datetime.timedelta(days=1)
+        try:
+            with self.db.session() as session:
+                cursor = session.cursor
+                cursor.execute(OPENING_SNAPSHOT_SQL, (account_id, start_date))
+                row = cursor.fetchone()
+                opening = row[0] if row else Decimal('0')
+
+                # Transactions before the range that are newer than the snapshots
+                cursor.execute(OPENING_TAIL_SQL, (account_id, start_date, DAILY_BALANCES_JOB))
+                opening += cursor.fetchone()[0]
+
+                cursor.execute(STATEMENT_LINES_SQL.format(table='transactions'), (account_id, start_date, range_end))
+                rows = cursor.fetchall()
+                cursor.execute(ARCHIVE_BOUNDARY_SQL)
+                boundary = archive_boundary(cursor.fetchone())
+                if boundary is not None and datetime.datetime.combine(start_date, datetime.time()) < boundary:
+                    cursor.execute(STATEMENT_LINES_SQL.format(table='transactions_archive'),
+                                   (account_id, start_date, range_end))
+                    rows = sorted([*rows, *cursor.fetchall()], key=lambda row: (row[1], row[0]))
+        except Exception as e:
+            print(f"Error building statement: {e}")
+            return None
+
+        balance = opening
+        lines = []
+        for transaction_id, txn_date, txn_type, description, amount in rows:
+            amount = signed_amount(txn_type, amount)
+            balance += amount
+            lines.append((transaction_id, txn_date, txn_type, description, amount, balance))
+        return {
+            'account_id': account_id,
+            'start_date': start_date,
+            'end_date': end_date,
+            'opening_balance': opening,
+            'closing_balance': balance,
+            'lines': lines,
+        }
 
     def close_connection(self):
         self.db.close_connection()
 
-    def issue_credit_card(self, customer_id, card_type, requested_limit, expiry_date=None):
+    def issue_credit_card(self, customer_id, card_type, requested_limit, expiry_date=None, status='active'):
         """Issue a new credit card for a customer with application-level tier checks.
 
         Raises ValueError on invalid tier or if requested_limit is outside allowed range.
-        Returns True on success, False on DB error.
+        Returns the card number on success, None on DB error.
         """
-        # Validate card tier
-        if card_type not in CARD_LIMITS:
-            raise ValueError(f"Invalid card tier: {card_type}. Valid tiers: {', '.join(CARD_LIMITS.keys())}")
-
-        min_lim, max_lim = CARD_LIMITS[card_type]
-        if not (min_lim <= requested_limit <= max_lim):
-            raise ValueError(
-                f"Requested limit {requested_limit} not allowed for tier {card_type} (allowed: {min_lim} - {max_lim})"
-            )
-
-        # Generate a simple random 16-digit card number (string)
-        card_number = ''.join(str(secrets.randbelow(10)) for _ in range(16))
+        check_card_request(card_type, requested_limit)
 
         # Default expiry: 4 years from today if not provided
         if expiry_date is None:
             expiry_date = (datetime.date.today() + datetime.timedelta(days=365 * 4)).isoformat()
 
         try:
-            insert_query = '''INSERT INTO credit_cards
-                              (customer_id, card_number, card_type, expiry_date, credit_limit, current_balance, status)
-                              VALUES (%s, %s, %s, %s, %s, %s, %s)'''
-            values = (customer_id, card_number, card_type, expiry_date, requested_limit, 0.0, 'active')
+            card_number = self.card_allocator.allocate(1)[0]
+            values = (customer_id, card_number, card_type, expiry_date, requested_limit, 0.0, status)
 
-            self.db.cursor.execute(insert_query, values)
-            self.db.connection.commit()
-            return True
+            with self.db.session() as session:
+                session.cursor.execute(INSERT_CARD_SQL, values)
+                session.cursor.execute(ENQUEUE_SQL, card_issued_event(customer_id, card_number, card_type, status))
+                session.connection.commit()
+            return card_number
         except Exception as e:
             print(f"Error issuing credit card: {e}")
-            return False
\ No newline at end of file
+            return None
+
+    def issue_credit_cards_bulk(self, applications, expiry_date=None, chunk_size=None):
+        """Issue many cards with one number reservation and one executemany per chunk.
+
+        Each application is a dict with ``customer_id``, ``card_type`` and
+        ``credit_limit``, plus an optional ``status`` (default 'active').
+        Tier limits are checked for the whole batch in Python before anything
+        is written. Returns one dict per application, in input order:
+        ``{'index', 'customer_id', 'card_number', 'status', 'reason'}`` with
+        status 'issued', 'rejected' or 'failed' (chunk rolled back).
+        """
+        chunk_size = chunk_size or BATCH_CHUNK_SIZE
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if expiry_date is None:
+            expiry_date = datetime.date.today() + datetime.timedelta(days=365 * 4)
+
+        results = []
+        valid = []
+        for index, application in enumerate(applications):
+            result = {'index': index, 'customer_id': None, 'card_number': None, 'status': 'rejected', 'reason': None}
+            try:
+                result['customer_id'] = int(application['customer_id'])
+                card_type = application['card_type']
+                credit_limit = Decimal(str(application['credit_limit']))
+                check_card_request(card_type, credit_limit)
+                valid.append((result, card_type, credit_limit, application.get('status', 'active')))
+            except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+                result['reason'] = f"Invalid application: {e}"
+            results.append(result)
+
+        for start in range(0, len(valid), chunk_size):
+            chunk = valid[start:start + chunk_size]
+            try:
+                numbers = self.card_allocator.allocate(len(chunk))
+                rows = [(result['customer_id'], number, card_type, expiry_date, credit_limit, 0, status)
+                        for (result, card_type, credit_limit, status), number in zip(chunk, numbers)]
+                events = [card_issued_event(row[0], row[1], row[2], row[6]) for row in rows]
+                with self.db.session() as session:
+                    session.cursor.executemany(INSERT_CARD_SQL, rows)
+                    session.cursor.executemany(ENQUEUE_SQL, events)
+                    session.connection.commit()
+            except Exception as e:
+                print(f"Error issuing credit cards: {e}")
+                for result, *_ in chunk:
+                    result.update(status='failed', reason=str(e))
+                continue
+            for (result, *_), number in zip(chunk, numbers):
+                result.update(card_number=number, status='issued')
+        return results
@@ -0,0 +1,241 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import mysql.connector
+
+from bank import BankManagement
+from config import database_settings
+from database import DatabaseConnection
+from seed_data import seed
+
+# Throughput/latency benchmark for the core banking operations. It seeds a
+# scratch database, drives each operation from N threads for a fixed number
+# of operations per level, and prints (or writes) a JSON report. With
+# --baseline the report is compared against a stored run and the exit code is
+# non-zero when any operation regresses beyond --tolerance.
+
+DOCKER_CONTAINER = 'bank-benchmark-mysql'
+DOCKER_IMAGE = 'mysql:8.0'
+
+
+def _transfer(bank, rng, account_ids):
+    source, target = rng.sample(account_ids, 2)
+    with bank.db.session() as session:
+        result = session.cursor.callproc('TransferMoney', (source, target, 1, ''))
+        return result[3] == 'Success'
+
+
+OPERATIONS = {
+    'deposit': lambda bank, rng, ids: bank.deposit(rng.choice(ids), 10),
+    'withdraw': lambda bank, rng, ids: bank.withdraw(rng.choice(ids), 10),
+    'check_balance': lambda bank, rng, ids: bank.check_balance(rng.choice(ids)) is not None,
+    'get_transaction_history': lambda bank, rng, ids: isinstance(bank.get_transaction_history(rng.choice(ids)), list),
+    'issue_credit_card': lambda bank, rng, ids: bank.issue_credit_card(rng.choice(ids), 'Silver', 10000),
+    # One op issues 1000 cards; cards/min = ops/s * 60000
+    'issue_credit_cards_bulk': lambda bank, rng, ids: all(
+        result['status'] == 'issued' for result in bank.issue_credit_cards_bulk(
+            [{'customer_id': rng.choice(ids), 'card_type': 'Silver', 'credit_limit': 10000} for _ in range(1000)])),
+    'transfer_money': _transfer,
+    'transfer': lambda bank, rng, ids: bank.transfer(*rng.sample(ids, 2), 1) is not None,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def run_level(bank, operation, concurrency, ops_per_level, account_ids, customer_ids, random_seed):
+    func = OPERATIONS[operation]
+    # card issuance takes customer ids, everything else account ids
+    ids = customer_ids if operation.startswith('issue_credit_card') else account_ids
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+    per_worker = max(1, ops_per_level // concurrency)
+
+    def worker(worker_id):
+        nonlocal errors
+        rng = random.Random(random_seed * 1000 + worker_id)
+        local_latencies = []
+        local_errors = 0
+        for _ in range(per_worker):
+            started = time.perf_counter()
+            try:
+                ok = func(bank, rng, ids)
+            except Exception:
+                ok = False
+            local_latencies.append(time.perf_counter() - started)
+            if not ok:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'operation': operation,
+        'concurrency': concurrency,
+        'ops': len(latencies),
+        'errors': errors,
+        'elapsed_s': round(elapsed, 4),
+        'ops_per_sec': round(len(latencies) / elapsed, 2) if elapsed else None,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Return human-readable regressions of ``results`` against ``baseline``."""
+    previous = {(r['operation'], r['concurrency']): r for r in baseline.get('results', [])}
+    regressions = []
+    for result in results:
+        old = previous.get((result['operation'], result['concurrency']))
+        if not old:
+            continue
+        label = f"{result['operation']} @ {result['concurrency']}"
+        if old['ops_per_sec'] and result['ops_per_sec'] < old['ops_per_sec'] * (1 - tolerance):
+            regressions.append(f"{label}: {result['ops_per_sec']} ops/sec vs baseline {old['ops_per_sec']}")
+        if old['p95_ms'] and result['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{label}: p95 {result['p95_ms']} ms vs baseline {old['p95_ms']} ms")
+    return regressions
+
+
+def start_docker_mysql(port, password):
+    subprocess.run(['docker', 'run', '-d', '--rm', '--name', DOCKER_CONTAINER,
+                    '-e', f'MYSQL_ROOT_PASSWORD={password}', '-p', f'{port}:3306', DOCKER_IMAGE],
+                   check=True, stdout=subprocess.DEVNULL)
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        ready = subprocess.run(['docker', 'exec', DOCKER_CONTAINER, 'mysql', '-uroot', f'-p{password}',
+                                '-h127.0.0.1', '-e', 'SELECT 1'],
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if ready.returncode == 0:
+            return
+        time.sleep(2)
+    raise RuntimeError("MySQL container did not become ready within 120s")
+
+
+def drop_database(overrides):
+    settings = database_settings()
+    settings.update(overrides)
+    connection = mysql.connector.connect(host=settings['host'], port=settings['port'],
+                                         user=settings['user'], password=settings['password'])
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP DATABASE IF EXISTS {settings['database']}")
+        cursor.close()
+    finally:
+        connection.close()
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark core banking operations.")
+    parser.add_argument('--database', default='bank_management_bench', help="Scratch database to seed and use")
+    parser.add_argument('--customers', type=int, default=1000, help="Customers to seed")
+    parser.add_argument('--transactions-per-account', type=int, default=20)
+    parser.add_argument('--concurrency', default='1,4,16', help="Comma-separated thread counts")
+    parser.add_argument('--ops', type=int, default=2000, help="Operations per operation/concurrency level")
+    parser.add_argument('--operations', default=','.join(OPERATIONS), help="Comma-separated operations to run")
+    parser.add_argument('--seed', type=int, default=42, help="Random seed for data and workload")
+    parser.add_argument('--reset', action='store_true', help="Drop the scratch database first for a clean run")
+    parser.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    parser.add_argument('--baseline', help="Compare against this stored JSON report")
+    parser.add_argument('--save-baseline', action='store_true', help="Write the report to --baseline instead")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="Allowed relative regression (0.15 = 15%%)")
+    parser.add_argument('--docker', action='store_true', help=f"Start a throwaway {DOCKER_IMAGE} container")
+    parser.add_argument('--docker-port', type=int, default=3307)
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.concurrency.split(',')]
+    operations = [name.strip() for name in args.operations.split(',')]
+    unknown = [name for name in operations if name not in OPERATIONS]
+    if unknown:
+        parser.error(f"Unknown operations: {', '.join(unknown)}")
+
+    overrides = {'database': args.database, 'pool_size': max(levels), 'auto_migrate': True}
+    if args.docker:
+        start_docker_mysql(args.docker_port, 'benchmark')
+        overrides.update(host='127.0.0.1', port=args.docker_port, user='root', password='benchmark')
+
+    try:
+        if args.reset:
+            drop_database(overrides)
+        db = DatabaseConnection(**overrides)
+        bank = BankManagement(db)
+        seed(db, customers=args.customers, transactions_per_account=args.transactions_per_account,
+             random_seed=args.seed)
+        with db.session() as session:
+            session.cursor.execute("SELECT account_id FROM accounts ORDER BY account_id")
+            account_ids = [row[0] for row in session.cursor.fetchall()]
+            session.cursor.execute("SELECT customer_id FROM customers ORDER BY customer_id")
+            customer_ids = [row[0] for row in session.cursor.fetchall()]
+
+        results = []
+        for operation in operations:
+            for concurrency in levels:
+                result = run_level(bank, operation, concurrency, args.ops, account_ids, customer_ids, args.seed)
+                print(f"{operation:<24} x{concurrency:<3} {result['ops_per_sec']:>10} ops/sec  "
+                      f"p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  p99 {result['p99_ms']} ms  "
+                      f"errors {result['errors']}", file=sys.stderr)
+                results.append(result)
+        db.close_connection()
+    finally:
+        if args.docker:
+            subprocess.run(['docker', 'stop', DOCKER_CONTAINER], stdout=subprocess.DEVNULL)
+
+    report = {
+        'revision': git_revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'dataset': {'customers': args.customers, 'transactions_per_account': args.transactions_per_account,
+                    'seed': args.seed},
+        'results': results,
+        'transfer_stats': dict(bank.transfer_stats),
+    }
+    text = json.dumps(report, indent=2)
+    if args.save_baseline and args.baseline:
+        with open(args.baseline, 'w') as file:
+            file.write(text + '\n')
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    elif not args.save_baseline:
+        print(text)
+
+    if args.baseline and not args.save_baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        if regressions:
+            print("Regressions against baseline:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print("No regressions against baseline", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
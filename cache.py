@@ -0,0 +1,150 @@
+import threading
+import time
+from collections import OrderedDict
+
+# In-process read-through cache for small, hot reads (account overview,
+# branches). Entries expire after a per-key TTL, the least recently used
+# entry is evicted beyond max_entries, and writers invalidate by key or by
+# tag so a balance is never served from before the write.
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL, tag invalidation and hit/miss counters."""
+
+    def __init__(self, max_entries=1024, default_ttl=30.0, clock=time.monotonic):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._clock = clock
+        self._entries = OrderedDict()   # key -> (expires_at, value, tags)
+        self._tags = {}                 # tag -> set of keys
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; a load that started before one is not stored
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _drop(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        if entry[0] <= self._clock():
+            self._drop(key)
+            return False, None
+        self._entries.move_to_end(key)
+        return True, entry[1]
+
+    def get(self, key, default=None):
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            return default
+
+    def set(self, key, value, ttl=None, tags=()):
+        with self._lock:
+            self._store(key, value, ttl, tags)
+
+    def _store(self, key, value, ttl, tags):
+        if key in self._entries:
+            self._drop(key)
+        ttl = self.default_ttl if ttl is None else ttl
+        tags = tuple(tags)
+        self._entries[key] = (self._clock() + ttl, value, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get_or_load(self, key, loader, ttl=None, tags=()):
+        """Return the cached value for key, calling ``loader()`` on a miss.
+
+        ``tags`` may be an iterable or a callable taking the loaded value.
+        The loader runs outside the lock; if the cache is invalidated while
+        it runs, the result is returned but not stored.
+        """
+        with self._lock:
+            found, value = self._lookup(key)
+            if found:
+                self.hits += 1
+                return value
+            self.misses += 1
+            generation = self._generation
+        value = loader()
+        with self._lock:
+            if generation == self._generation:
+                self._store(key, value, ttl, tags(value) if callable(tags) else tags)
+        return value
+
+    def get_many(self, keys):
+        """Cached values for whichever keys are present, and a generation for set_many.
+
+        Lets a caller fetch all of its misses in one round trip instead of
+        one get_or_load per key.
+        """
+        found = {}
+        with self._lock:
+            for key in keys:
+                hit, value = self._lookup(key)
+                if hit:
+                    self.hits += 1
+                    found[key] = value
+                else:
+                    self.misses += 1
+            return found, self._generation
+
+    def set_many(self, entries, generation):
+        """Store (key, value, ttl, tags) entries loaded after get_many.
+
+        Nothing is stored if the cache was invalidated since ``generation``.
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+            for key, value, ttl, tags in entries:
+                self._store(key, value, ttl, tags)
+
+    def invalidate(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                if key in self._entries:
+                    self._drop(key)
+
+    def invalidate_tag(self, *tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'size': len(self._entries),
+            }
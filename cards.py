@@ -0,0 +1,100 @@
+from config import get_setting
+
+# Card number allocation. A 16-digit number is the issuer BIN, an account
+# identifier and a Luhn check digit. Identifiers come from a per-BIN sequence
+# in card_sequences: a caller reserves a block of N values with one UPDATE
+# and maps each value through a fixed permutation of the identifier space, so
+# numbers are unique without probing the UNIQUE index and are not sequential.
+
+CARD_BIN = get_setting('cards', 'bin', '400000')
+CARD_LENGTH = 16
+
+# Affine permutation x -> (a*x + c) mod 10^k is a bijection whenever a is
+# coprime with 10, i.e. odd and not a multiple of 5
+PERMUTATION_MULTIPLIER = 738040403
+PERMUTATION_OFFSET = get_setting('cards', 'permutation_offset', 104729, int)
+
+SEQUENCE_INIT_SQL = "INSERT IGNORE INTO card_sequences (bin, next_value) VALUES (%s, 0)"
+# LAST_INSERT_ID(expr) returns the new high-water mark in the OK packet (lastrowid)
+RESERVE_SQL = "UPDATE card_sequences SET next_value = LAST_INSERT_ID(next_value + %s) WHERE bin = %s"
+
+CUSTOMER_CARDS_SQL = '''SELECT card_number, card_type, expiry_date, credit_limit,
+                               current_balance, status, created_at
+                        FROM credit_cards WHERE customer_id = %s
+                        ORDER BY created_at DESC'''
+
+
+def luhn_check_digit(body):
+    total = 0
+    for position, char in enumerate(reversed(body)):
+        digit = int(char)
+        if position % 2 == 0:
+            digit *= 2
+            if digit > 9:
+                digit -= 9
+        total += digit
+    return (10 - total % 10) % 10
+
+
+def luhn_valid(number):
+    return number.isdigit() and luhn_check_digit(number[:-1]) == int(number[-1])
+
+
+def identifier_space(bin_=CARD_BIN):
+    return 10 ** (CARD_LENGTH - 1 - len(bin_))
+
+
+def card_number(sequence, bin_=CARD_BIN):
+    """The card number for one sequence value of a BIN."""
+    space = identifier_space(bin_)
+    identifier = (PERMUTATION_MULTIPLIER * sequence + PERMUTATION_OFFSET) % space
+    body = f"{bin_}{identifier:0{CARD_LENGTH - 1 - len(bin_)}d}"
+    return body + str(luhn_check_digit(body))
+
+
+def card_numbers(start, count, bin_=CARD_BIN):
+    """Card numbers for the reserved sequence block [start, start + count)."""
+    if start + count > identifier_space(bin_):
+        raise ValueError(f"Card number space for BIN {bin_} is exhausted")
+    return [card_number(sequence, bin_) for sequence in range(start, start + count)]
+
+
+def existing_numbers_query(numbers):
+    """SQL and parameters selecting which of ``numbers`` are already on issued cards."""
+    return f'''SELECT card_number FROM credit_cards
+               WHERE card_number IN ({', '.join(['%s'] * len(numbers))})''', list(numbers)
+
+
+def reserve_block(cursor, count, bin_=CARD_BIN):
+    """Reserve ``count`` sequence values and return the first; does not commit."""
+    cursor.execute(SEQUENCE_INIT_SQL, (bin_,))
+    cursor.execute(RESERVE_SQL, (count, bin_))
+    return cursor.lastrowid - count
+
+
+class CardNumberAllocator:
+    def __init__(self, db, bin_=CARD_BIN):
+        self.db = db
+        self.bin = bin_
+
+    def allocate(self, count):
+        """Return ``count`` new Luhn-valid card numbers.
+
+        The block is reserved in its own short transaction, so concurrent
+        allocators never wait on each other's inserts; numbers from a block
+        whose cards are never inserted are simply skipped. Numbers that clash
+        with older, randomly generated cards are dropped and replaced.
+        """
+        numbers = []
+        while len(numbers) < count:
+            needed = count - len(numbers)
+            with self.db.session() as session:
+                start = reserve_block(session.cursor, needed, self.bin)
+                session.connection.commit()
+                block = card_numbers(start, needed, self.bin)
+                taken = set()
+                for offset in range(0, len(block), 1000):
+                    session.cursor.execute(*existing_numbers_query(block[offset:offset + 1000]))
+                    taken.update(row[0] for row in session.cursor.fetchall())
+            numbers.extend(number for number in block if number not in taken)
+        return numbers
@@ -0,0 +1,54 @@
+import configparser
+import os
+
+# Settings are read from BANK_<SECTION>_<KEY> environment variables first and
+# then from an INI file (BANK_CONFIG, default: bank.ini next to this module).
+CONFIG_FILE = os.environ.get(
+    'BANK_CONFIG',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bank.ini')
+)
+
+_TRUE_VALUES = {'1', 'true', 'yes', 'on'}
+
+_parser = None
+
+
+def _config_file():
+    global _parser
+    if _parser is None:
+        _parser = configparser.ConfigParser()
+        _parser.read(CONFIG_FILE)
+    return _parser
+
+
+def get_setting(section, key, default=None, cast=str):
+    """Look up a setting, e.g. get_setting('db', 'pool_size', 5, int).
+
+    The environment variable BANK_DB_POOL_SIZE wins over ``pool_size`` in the
+    ``[db]`` section of the config file; ``default`` is returned when neither
+    is set.
+    """
+    value = os.environ.get(f"BANK_{section}_{key}".upper())
+    if value is None:
+        value = _config_file().get(section, key, fallback=None)
+    if value is None:
+        return default
+    if cast is bool:
+        return value.strip().lower() in _TRUE_VALUES
+    return cast(value)
+
+
+def database_settings():
+    """Connection and pool settings for DatabaseConnection."""
+    return {
+        'host': get_setting('db', 'host', 'localhost'),
+        'port': get_setting('db', 'port', 3306, int),
+        'user': get_setting('db', 'user', 'root'),
+        'password': get_setting('db', 'password', ''),
+        'database': get_setting('db', 'name', 'bank_management'),
+        'connect_timeout': get_setting('db', 'connect_timeout', 5, int),
+        'pool_size': get_setting('db', 'pool_size', 5, int),
+        'checkout_timeout': get_setting('db', 'checkout_timeout', 10.0, float),
+        'health_check_interval': get_setting('db', 'health_check_interval', 30.0, float),
+        'auto_migrate': get_setting('db', 'auto_migrate', True, bool),
+    }
@@ -0,0 +1,105 @@
+import argparse
+from collections import defaultdict
+from decimal import Decimal
+
+from bank import DAILY_BALANCES_JOB, signed_amount
+from database import DatabaseConnection
+from jobs import fetch_settled_transactions, read_watermark, save_watermark
+
+# Maintains daily_balances incrementally: each run folds the transactions
+# above the job's watermark into per-account, per-day net changes and
+# re-derives closing balances from the earliest day touched. Run it from
+# cron as often as statements need to be fresh; an up-to-date run is one
+# indexed read.
+
+
+def snapshot_queries(first_day):
+    """SQL for the snapshots around {account_id: first touched day}, and their shared parameters.
+
+    The first query reads the closing balance of each account's last
+    snapshot before its first touched day; the second reads the existing
+    snapshot days from that day onwards.
+    """
+    touched = ' UNION ALL '.join(['SELECT %s AS account_id, %s AS first_day'] * len(first_day))
+    params = [value for item in first_day.items() for value in item]
+    base_sql = f'''SELECT d.account_id, d.closing_balance
+                   FROM daily_balances d
+                   JOIN ({touched}) t ON d.account_id = t.account_id
+                   WHERE d.balance_date = (SELECT MAX(p.balance_date) FROM daily_balances p
+                                           WHERE p.account_id = t.account_id
+                                             AND p.balance_date < t.first_day)'''
+    days_sql = f'''SELECT d.account_id, d.balance_date, d.net_change
+                   FROM daily_balances d
+                   JOIN ({touched}) t ON d.account_id = t.account_id AND d.balance_date >= t.first_day'''
+    return base_sql, days_sql, params
+
+
+def _apply_batch(cursor, rows):
+    deltas = defaultdict(Decimal)
+    for _, account_id, txn_type, amount, txn_date in rows:
+        deltas[(account_id, txn_date.date())] += signed_amount(txn_type, amount)
+
+    first_day = {}
+    for account_id, day in deltas:
+        if account_id not in first_day or day < first_day[account_id]:
+            first_day[account_id] = day
+
+    base_sql, days_sql, touched_params = snapshot_queries(first_day)
+    cursor.execute(base_sql, touched_params)
+    base = dict(cursor.fetchall())
+    cursor.execute(days_sql, touched_params)
+    net = defaultdict(dict)
+    for account_id, day, net_change in cursor.fetchall():
+        net[account_id][day] = net_change
+    for (account_id, day), delta in deltas.items():
+        net[account_id][day] = net[account_id].get(day, Decimal('0')) + delta
+
+    snapshots = []
+    for account_id, days in net.items():
+        closing = base.get(account_id, Decimal('0'))
+        for day in sorted(days):
+            closing += days[day]
+            snapshots.append((account_id, day, days[day], closing))
+
+    cursor.executemany('''INSERT INTO daily_balances (account_id, balance_date, net_change, closing_balance)
+                          VALUES (%s, %s, %s, %s)
+                          ON DUPLICATE KEY UPDATE net_change = VALUES(net_change),
+                                                  closing_balance = VALUES(closing_balance)''', snapshots)
+    return len(deltas)
+
+
+def refresh_daily_balances(db, batch_size=5000):
+    """Fold new transactions into daily_balances; returns (transactions, account-days) processed."""
+    processed = 0
+    account_days = 0
+    while True:
+        with db.session() as session:
+            cursor = session.cursor
+            watermark = read_watermark(cursor, DAILY_BALANCES_JOB)
+            rows = fetch_settled_transactions(cursor, watermark, batch_size)
+            if not rows:
+                break
+            account_days += _apply_batch(cursor, rows)
+            save_watermark(cursor, DAILY_BALANCES_JOB, rows[-1][0])
+            session.connection.commit()
+        processed += len(rows)
+        if len(rows) < batch_size:
+            break
+    return processed, account_days
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring daily_balances up to date with the ledger.")
+    parser.add_argument('--batch-size', type=int, default=5000, help="Transactions per committed batch")
+    args = parser.parse_args()
+
+    db = DatabaseConnection()
+    try:
+        processed, account_days = refresh_daily_balances(db, args.batch_size)
+        print(f"Processed {processed} transactions into {account_days} account-day snapshots")
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,273 +1,213 @@
-import mysql.connector
-from mysql.connector import Error
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 
-class DatabaseConnection:
-    def __init__(self):
+import mysql.connector
+from mysql.connector import Error, errorcode
+from mysql.connector.errors import PoolError
+
+import migrations
+from config import database_settings
+from query_stats import ENABLED as QUERY_STATS_ENABLED, METRICS_FILE, InstrumentedCursor, query_stats
+
+
+class ConnectionPool:
+    """Thread-safe pool of MySQL connections.
+
+    Connections are opened lazily up to ``size``. A checkout blocks for at most
+    ``checkout_timeout`` seconds when every connection is in use, and a
+    connection that has been idle for ``health_check_interval`` seconds or more
+    is pinged before it is handed out (0 pings on every checkout).
+    """
+
+    def __init__(self, size=5, checkout_timeout=10.0, health_check_interval=30.0, **connect_args):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_interval = health_check_interval
+        self._connect_args = connect_args
+        self._idle = deque()
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _connect(self):
+        return mysql.connector.connect(**self._connect_args)
+
+    def _is_healthy(self, connection):
         try:
-            # First connect without database to create it if it doesn't exist
-            self.connection = mysql.connector.connect(
-                host=input("Enter MySQL host (default: localhost): ") or 'localhost',
-                user=input("Enter MySQL username (default: root): ") or 'root',
-                password=input("Enter MySQL password: ")
-            )
-            
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor()
-                database_name = input("Enter database name (default: bank_management): ") or 'bank_management'
-                
-                # Create database if it doesn't exist
-                self.cursor.execute(f"CREATE DATABASE IF NOT EXISTS {database_name}")
-                self.cursor.execute(f"USE {database_name}")
-                print(f"Using database: {database_name}")
-            if self.connection.is_connected():
-                self.cursor = self.connection.cursor()
-                print("Connected to MySQL database")
-                self.create_tables()  # Create tables when connection is established
-        except Error as e:
-            print(f"Error connecting to MySQL database: {e}")
+            connection.ping(reconnect=False)
+            return True
+        except Error:
+            return False
 
-    def create_procedures_and_triggers(self):
+    def _discard(self, connection):
         try:
-            # Read and execute procedures
-            with open('database_procedures.sql', 'r') as file:
-                procedures = file.read()
-                for procedure in procedures.split('DELIMITER ;'):
-                    if procedure.strip():
-                        self.cursor.execute(procedure + 'DELIMITER ;')
-
-            # Read and execute triggers
-            with open('database_triggers.sql', 'r') as file:
-                triggers = file.read()
-                for trigger in triggers.split('DELIMITER ;'):
-                    if trigger.strip():
-                        self.cursor.execute(trigger + 'DELIMITER ;')
-
-            # Also read and execute user creation SQL if present
-            try:
-                with open('database_users.sql', 'r') as uf:
-                    users_sql = uf.read()
-                    # split by semicolon to execute individual statements safely
-                    for stmt in [s.strip() for s in users_sql.split(';') if s.strip()]:
-                        self.cursor.execute(stmt)
-            except FileNotFoundError:
-                # Not critical; proceed if file not present
-                pass
-
-            # Optionally execute complex queries file if intended to create views or stored queries
+            connection.close()
+        except Error:
+            pass
+        with self._cond:
+            self._created -= 1
+            self._cond.notify()
+
+    def checkout(self):
+        deadline = time.monotonic() + self.checkout_timeout
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolError(
+                        f"No connection available within {self.checkout_timeout}s (pool size {self.size})"
+                    )
+                self._cond.wait(remaining)
+
+        if connection is not None:
+            idle_for = time.monotonic() - last_used
+            if idle_for < self.health_check_interval or self._is_healthy(connection):
+                return connection
+            # Stale connection: drop it and open a replacement in its slot
             try:
-                with open('complex_queries.sql', 'r') as cq:
-                    cq_sql = cq.read()
-                    # If the file contains SELECTs for analysis, do not execute them here.
-                    # We execute statements that create views or stored queries only (CREATE VIEW/PROCEDURE/etc.)
-                    for stmt in [s.strip() for s in cq_sql.split(';') if s.strip()]:
-                        upper = stmt.strip().upper()
-                        if upper.startswith('CREATE') or upper.startswith('INSERT') or upper.startswith('CREATE VIEW') or upper.startswith('CREATE PROCEDURE'):
-                            try:
-                                self.cursor.execute(stmt)
-                            except Exception:
-                                # ignore individual failures to avoid blocking setup
-                                pass
-            except FileNotFoundError:
+                connection.close()
+            except Error:
                 pass
 
-            self.connection.commit()
-            print("Procedures and triggers created successfully")
-        except Exception as e:
-            print(f"Error creating procedures and triggers: {e}")
-
-    def create_tables(self):
         try:
-            # Create branches table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS branches (
-                    branch_id INT AUTO_INCREMENT PRIMARY KEY,
-                    branch_name VARCHAR(100) NOT NULL,
-                    branch_code VARCHAR(20) UNIQUE NOT NULL,
-                    address VARCHAR(200) NOT NULL,
-                    city VARCHAR(100) NOT NULL,
-                    state VARCHAR(100) NOT NULL,
-                    phone VARCHAR(15) NOT NULL,
-                    email VARCHAR(100) UNIQUE,
-                    manager_id INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Create employees table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS employees (
-                    employee_id INT AUTO_INCREMENT PRIMARY KEY,
-                    branch_id INT,
-                    name VARCHAR(100) NOT NULL,
-                    position VARCHAR(50) NOT NULL,
-                    email VARCHAR(100) UNIQUE NOT NULL,
-                    phone VARCHAR(15),
-                    address VARCHAR(200),
-                    hire_date DATE NOT NULL,
-                    salary DECIMAL(15, 2) NOT NULL,
-                    status VARCHAR(20) DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (branch_id) REFERENCES branches(branch_id)
-                )
-            ''')
-
-            # Create customers table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS customers (
-                    customer_id INT AUTO_INCREMENT PRIMARY KEY,
-                    branch_id INT,
-                    name VARCHAR(100) NOT NULL,
-                    address VARCHAR(200),
-                    phone VARCHAR(15),
-                    email VARCHAR(100) UNIQUE,
-                    password VARCHAR(255) NOT NULL,
-                    date_of_birth DATE,
-                    occupation VARCHAR(100),
-                    annual_income DECIMAL(15, 2),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (branch_id) REFERENCES branches(branch_id)
-                )
-            ''')
-
-            # Create accounts table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS accounts (
-                    account_id INT AUTO_INCREMENT PRIMARY KEY,
-                    customer_id INT,
-                    branch_id INT,
-                    account_type VARCHAR(20) NOT NULL,
-                    balance DECIMAL(15, 2) DEFAULT 0.00,
-                    status VARCHAR(20) DEFAULT 'active',
-                    interest_rate DECIMAL(5, 2),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
-                    FOREIGN KEY (branch_id) REFERENCES branches(branch_id)
-                )
-            ''')
-
-            # Create transactions table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS transactions (
-                    transaction_id INT AUTO_INCREMENT PRIMARY KEY,
-                    account_id INT,
-                    type VARCHAR(20) NOT NULL,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    description TEXT,
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    processed_by_employee INT,
-                    FOREIGN KEY (account_id) REFERENCES accounts(account_id),
-                    FOREIGN KEY (processed_by_employee) REFERENCES employees(employee_id)
-                )
-            ''')
-
-            # Create loans table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS loans (
-                    loan_id INT AUTO_INCREMENT PRIMARY KEY,
-                    customer_id INT,
-                    branch_id INT,
-                    loan_type VARCHAR(50) NOT NULL,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    interest_rate DECIMAL(5, 2) NOT NULL,
-                    term_months INT NOT NULL,
-                    start_date DATE NOT NULL,
-                    end_date DATE NOT NULL,
-                    status VARCHAR(20) DEFAULT 'pending',
-                    processed_by INT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
-                    FOREIGN KEY (branch_id) REFERENCES branches(branch_id),
-                    FOREIGN KEY (processed_by) REFERENCES employees(employee_id)
-                )
-            ''')
-
-            # Create credit_cards table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS credit_cards (
-                    card_id INT AUTO_INCREMENT PRIMARY KEY,
-                    customer_id INT,
-                    card_number VARCHAR(16) UNIQUE NOT NULL,
-                    card_type VARCHAR(50) NOT NULL,
-                    expiry_date DATE NOT NULL,
-                    credit_limit DECIMAL(15, 2) NOT NULL,
-                    current_balance DECIMAL(15, 2) DEFAULT 0.00,
-                    status VARCHAR(20) DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
-                )
-            ''')
-
-            # Create fixed_deposits table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS fixed_deposits (
-                    fd_id INT AUTO_INCREMENT PRIMARY KEY,
-                    account_id INT,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    interest_rate DECIMAL(5, 2) NOT NULL,
-                    term_months INT NOT NULL,
-                    start_date DATE NOT NULL,
-                    maturity_date DATE NOT NULL,
-                    status VARCHAR(20) DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (account_id) REFERENCES accounts(account_id)
-                )
-            ''')
+            return self._connect()
+        except Exception:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def checkin(self, connection, discard=False):
+        if discard or self._closed:
+            self._discard(connection)
+            return
+        with self._cond:
+            self._idle.append((connection, time.monotonic()))
+            self._cond.notify()
+
+    def close_all(self):
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            self._discard(connection)
+
+
+class PooledSession:
+    """One unit of work on a connection borrowed from a ConnectionPool."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        cursor = connection.cursor(buffered=True)
+        # Per-statement timings and counters (query_stats.py)
+        self.cursor = InstrumentedCursor(cursor) if QUERY_STATS_ENABLED else cursor
+
+    def close(self):
+        try:
+            self.cursor.close()
+        except Error:
+            pass
 
-            # Create beneficiaries table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS beneficiaries (
-                    beneficiary_id INT AUTO_INCREMENT PRIMARY KEY,
-                    customer_id INT,
-                    account_id INT,
-                    name VARCHAR(100) NOT NULL,
-                    account_number VARCHAR(20) NOT NULL,
-                    bank_name VARCHAR(100) NOT NULL,
-                    ifsc_code VARCHAR(20) NOT NULL,
-                    relationship VARCHAR(50),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
-                    FOREIGN KEY (account_id) REFERENCES accounts(account_id)
-                )
-            ''')
 
-            # Create atm_transactions table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS atm_transactions (
-                    atm_transaction_id INT AUTO_INCREMENT PRIMARY KEY,
-                    card_id INT,
-                    transaction_type VARCHAR(20) NOT NULL,
-                    amount DECIMAL(15, 2) NOT NULL,
-                    atm_location VARCHAR(200),
-                    status VARCHAR(20) DEFAULT 'completed',
-                    transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (card_id) REFERENCES credit_cards(card_id)
-                )
-            ''')
+class DatabaseConnection:
+    def __init__(self, **overrides):
+        # Settings come from BANK_DB_* environment variables or bank.ini
+        # (see config.py); keyword arguments override both.
+        settings = database_settings()
+        settings.update(overrides)
+        self.database_name = settings['database']
+        self.auto_migrate = settings['auto_migrate']
+        self._connect_args = {
+            'host': settings['host'],
+            'port': settings['port'],
+            'user': settings['user'],
+            'password': settings['password'],
+            'connection_timeout': settings['connect_timeout'],
+        }
+        self.pool = ConnectionPool(
+            size=settings['pool_size'],
+            checkout_timeout=settings['checkout_timeout'],
+            health_check_interval=settings['health_check_interval'],
+            database=self.database_name,
+            **self._connect_args
+        )
+        try:
+            try:
+                self.ensure_schema()
+            except Error as e:
+                if e.errno != errorcode.ER_BAD_DB_ERROR:
+                    raise
+                self._create_database()
+                self.ensure_schema()
+        except Error as e:
+            print(f"Error connecting to MySQL database: {e}")
 
-            # Create notifications table
-            self.cursor.execute('''
-                CREATE TABLE IF NOT EXISTS notifications (
-                    notification_id INT AUTO_INCREMENT PRIMARY KEY,
-                    customer_id INT,
-                    title VARCHAR(200) NOT NULL,
-                    message TEXT NOT NULL,
-                    type VARCHAR(50) NOT NULL,
-                    is_read BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    def _create_database(self):
+        bootstrap = mysql.connector.connect(**self._connect_args)
+        try:
+            cursor = bootstrap.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {self.database_name}")
+            cursor.close()
+            print(f"Created database: {self.database_name}")
+        finally:
+            bootstrap.close()
+
+    @contextmanager
+    def session(self):
+        """Borrow a pooled connection for one unit of work.
+
+        Work that was not committed when the block exits is rolled back before
+        the connection goes back to the pool.
+        """
+        connection = self.pool.checkout()
+        session = PooledSession(connection)
+        broken = False
+        try:
+            yield session
+        except Error:
+            broken = not connection.is_connected()
+            raise
+        finally:
+            session.close()
+            if not broken and connection.in_transaction:
+                try:
+                    connection.rollback()
+                except Error:
+                    broken = True
+            self.pool.checkin(connection, discard=broken)
+
+    def ensure_schema(self):
+        """Bring the schema up to date; a single version check when it already is."""
+        with self.session() as session:
+            version = migrations.current_version(session.cursor)
+            if version >= migrations.LATEST_VERSION:
+                return []
+            if not self.auto_migrate:
+                raise Error(
+                    msg=f"Schema is at version {version}, expected {migrations.LATEST_VERSION}; "
+                        "run 'python migrations.py' to upgrade"
                 )
-            ''')
-
-            self.connection.commit()
-            print("Tables created successfully")
-            
-            # Create procedures and triggers
-            self.create_procedures_and_triggers()
-        except Error as e:
-            print(f"Error creating tables: {e}")
+            applied = migrations.migrate(session.connection, session.cursor)
+        if applied:
+            print(f"Applied schema migrations: {', '.join(str(v) for v in applied)}")
+        return applied
 
     def close_connection(self):
-        if hasattr(self, 'connection') and self.connection.is_connected():
-            self.cursor.close()
-            self.connection.close()
-            print("MySQL connection closed")
\ No newline at end of file
+        self.pool.close_all()
+        if METRICS_FILE:
+            query_stats.write_file(METRICS_FILE)
+        print("MySQL connection pool closed")
\ No newline at end of file
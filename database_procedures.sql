@@ -1,6 +1,9 @@
 -- Stored Procedures
 
 -- 1. Transfer Money Procedure
+-- Both rows are locked in ascending account_id order, whatever the direction
+-- of the transfer, so opposite transfers between two accounts queue instead
+-- of deadlocking.
 DELIMITER //
 CREATE PROCEDURE TransferMoney(
     IN from_account_id INT,
@@ -10,6 +13,8 @@ CREATE PROCEDURE TransferMoney(
 )
 BEGIN
     DECLARE from_balance DECIMAL(15, 2);
+    DECLARE first_status VARCHAR(20);
+    DECLARE second_status VARCHAR(20);
     DECLARE EXIT HANDLER FOR SQLEXCEPTION
     BEGIN
         ROLLBACK;
@@ -18,12 +23,27 @@ BEGIN
     
     START TRANSACTION;
     
-    -- Check if sufficient balance
+    -- Lock both accounts, lowest id first
+    SELECT accounts.status INTO first_status
+    FROM accounts
+    WHERE account_id = LEAST(from_account_id, to_account_id)
+    FOR UPDATE;
+    
+    SELECT accounts.status INTO second_status
+    FROM accounts
+    WHERE account_id = GREATEST(from_account_id, to_account_id)
+    FOR UPDATE;
+    
     SELECT balance INTO from_balance 
     FROM accounts 
     WHERE account_id = from_account_id;
     
-    IF from_balance >= amount THEN
+    IF from_account_id = to_account_id
+       OR COALESCE(first_status, '') <> 'active'
+       OR COALESCE(second_status, '') <> 'active' THEN
+        ROLLBACK;
+        SET status = 'Invalid account';
+    ELSEIF from_balance >= amount THEN
         -- Deduct from source account
         UPDATE accounts 
         SET balance = balance - amount 
@@ -145,13 +165,18 @@ BEGIN
     FROM loans
     WHERE loan_id = p_loan_id;
     
-    -- Create notification
-    INSERT INTO notifications (customer_id, title, message, type)
+    -- Queue the notification under the trigger's event key, replacing its
+    -- generic text with one that carries the remarks (delivered by outbox.py)
+    INSERT INTO notification_outbox (event_key, customer_id, type, title, message)
     VALUES (
+        CONCAT('loan_status:', p_loan_id, ':', p_status),
         v_customer_id,
+        'loan_update',
         CONCAT('Loan Application ', p_status),
-        CONCAT('Your loan application (ID: ', p_loan_id, ') has been ', LOWER(p_status), '. ', p_remarks),
-        'loan_update'
-    );
+        CONCAT('Your loan application (ID: ', p_loan_id, ') has been ', LOWER(p_status), '. ',
+               COALESCE(p_remarks, ''))
+    )
+    ON DUPLICATE KEY UPDATE customer_id = VALUES(customer_id), type = VALUES(type),
+                            title = VALUES(title), message = VALUES(message);
 END //
 DELIMITER ;
\ No newline at end of file
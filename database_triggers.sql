@@ -1,58 +1,29 @@
 -- Triggers for Bank Management System
 
--- 1. After Transaction Trigger - Update Account Balance
-DELIMITER //
-CREATE TRIGGER after_transaction_insert
-AFTER INSERT ON transactions
-FOR EACH ROW
-BEGIN
-    IF NEW.type = 'deposit' THEN
-        UPDATE accounts 
-        SET balance = balance + NEW.amount 
-        WHERE account_id = NEW.account_id;
-    ELSEIF NEW.type = 'withdrawal' THEN
-        UPDATE accounts 
-        SET balance = balance - NEW.amount 
-        WHERE account_id = NEW.account_id;
-    END IF;
-END //
-DELIMITER ;
-
--- 2. Before Transaction Trigger - Validate Balance
-DELIMITER //
-CREATE TRIGGER before_transaction_insert
-BEFORE INSERT ON transactions
-FOR EACH ROW
-BEGIN
-    DECLARE current_balance DECIMAL(15, 2);
-    
-    IF NEW.type = 'withdrawal' THEN
-        SELECT balance INTO current_balance
-        FROM accounts
-        WHERE account_id = NEW.account_id;
-        
-        IF current_balance < NEW.amount THEN
-            SIGNAL SQLSTATE '45000'
-            SET MESSAGE_TEXT = 'Insufficient balance for withdrawal';
-        END IF;
-    END IF;
-END //
-DELIMITER ;
+-- 1-2. Balance maintenance on transactions used to live in triggers here
+-- (after_transaction_insert / before_transaction_insert). Postings now make
+-- exactly one conditional balance write in bank.post_transaction, so those
+-- triggers were removed (migration 5) to stop balances being applied twice.
 
--- 3. After Loan Status Change Trigger - Create Notification
+-- 3. After Loan Status Change Trigger - Queue Notification
+-- The event goes to notification_outbox (outbox.py delivers it); the key is
+-- shared with ProcessLoanApplication so one status change notifies once.
 DELIMITER //
 CREATE TRIGGER after_loan_status_update
 AFTER UPDATE ON loans
 FOR EACH ROW
 BEGIN
     IF NEW.status != OLD.status THEN
-        INSERT INTO notifications (customer_id, title, message, type)
+        INSERT INTO notification_outbox (event_key, customer_id, type, title, message)
         VALUES (
+            CONCAT('loan_status:', NEW.loan_id, ':', NEW.status),
             NEW.customer_id,
+            'loan_update',
             CONCAT('Loan Status Updated: ', NEW.status),
-            CONCAT('Your loan application (ID: ', NEW.loan_id, ') status has been updated to ', NEW.status),
-            'loan_update'
-        );
+            CONCAT('Your loan application (ID: ', NEW.loan_id, ') status has been updated to ', NEW.status)
+        )
+        ON DUPLICATE KEY UPDATE customer_id = VALUES(customer_id), type = VALUES(type),
+                                title = VALUES(title), message = VALUES(message);
     END IF;
 END //
 DELIMITER ;
@@ -105,4 +76,46 @@ BEGIN
             SIGNAL SQLSTATE '45000' SET MESSAGE_TEXT = 'Unknown card type';
     END CASE;
 END //
-DELIMITER ;
\ No newline at end of file
+DELIMITER ;
+
+-- 8-10. Unread notification counters
+-- notification_counters.unread follows every insert, read-state change and
+-- delete on notifications, so the unread badge never has to count rows.
+DELIMITER //
+CREATE TRIGGER after_notification_insert
+AFTER INSERT ON notifications
+FOR EACH ROW
+BEGIN
+    IF NEW.customer_id IS NOT NULL AND NOT COALESCE(NEW.is_read, FALSE) THEN
+        INSERT INTO notification_counters (customer_id, unread)
+        VALUES (NEW.customer_id, 1)
+        ON DUPLICATE KEY UPDATE unread = unread + 1;
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER after_notification_update
+AFTER UPDATE ON notifications
+FOR EACH ROW
+BEGIN
+    IF NEW.customer_id IS NOT NULL AND COALESCE(NEW.is_read, FALSE) <> COALESCE(OLD.is_read, FALSE) THEN
+        INSERT INTO notification_counters (customer_id, unread)
+        VALUES (NEW.customer_id, IF(NEW.is_read, 0, 1))
+        ON DUPLICATE KEY UPDATE unread = GREATEST(unread + IF(NEW.is_read, -1, 1), 0);
+    END IF;
+END //
+DELIMITER ;
+
+DELIMITER //
+CREATE TRIGGER after_notification_delete
+AFTER DELETE ON notifications
+FOR EACH ROW
+BEGIN
+    IF OLD.customer_id IS NOT NULL AND NOT COALESCE(OLD.is_read, FALSE) THEN
+        UPDATE notification_counters
+        SET unread = GREATEST(unread - 1, 0)
+        WHERE customer_id = OLD.customer_id;
+    END IF;
+END //
+DELIMITER ;
@@ -1,4 +1,10 @@
--- DDL extracted from database.py
+-- DDL extracted from migrations.py
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT PRIMARY KEY,
+    description VARCHAR(200) NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
 
 CREATE TABLE IF NOT EXISTS branches (
     branch_id INT AUTO_INCREMENT PRIMARY KEY,
@@ -64,6 +70,8 @@ CREATE TABLE IF NOT EXISTS transactions (
     description TEXT,
     transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     processed_by_employee INT,
+    -- Insert time, used by the settle check in jobs.py (migration 15)
+    posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (account_id) REFERENCES accounts(account_id),
     FOREIGN KEY (processed_by_employee) REFERENCES employees(employee_id)
 );
@@ -147,3 +155,108 @@ CREATE TABLE IF NOT EXISTS notifications (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
 );
+
+-- Hot-path composite indexes (migration 3)
+CREATE INDEX idx_transactions_account_date ON transactions (account_id, transaction_date, transaction_id);
+CREATE INDEX idx_notifications_customer_created ON notifications (customer_id, created_at);
+CREATE INDEX idx_loans_customer_created ON loans (customer_id, created_at);
+CREATE INDEX idx_fixed_deposits_account_created ON fixed_deposits (account_id, created_at);
+CREATE INDEX idx_beneficiaries_customer_created ON beneficiaries (customer_id, created_at);
+CREATE INDEX idx_credit_cards_customer_created ON credit_cards (customer_id, created_at);
+
+-- Daily balance snapshots and job watermarks (migration 4)
+CREATE TABLE IF NOT EXISTS daily_balances (
+    account_id INT NOT NULL,
+    balance_date DATE NOT NULL,
+    net_change DECIMAL(15, 2) NOT NULL,
+    closing_balance DECIMAL(15, 2) NOT NULL,
+    PRIMARY KEY (account_id, balance_date),
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+);
+
+CREATE TABLE IF NOT EXISTS job_watermarks (
+    job_name VARCHAR(50) PRIMARY KEY,
+    last_transaction_id INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+-- Unread notification counters, maintained by triggers (migration 7)
+CREATE TABLE IF NOT EXISTS notification_counters (
+    customer_id INT PRIMARY KEY,
+    unread INT NOT NULL DEFAULT 0,
+    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+);
+
+CREATE INDEX idx_notifications_read_created ON notifications (is_read, created_at);
+
+-- Fixed deposit maturity job (migration 8)
+CREATE INDEX idx_fixed_deposits_status_maturity ON fixed_deposits (status, maturity_date);
+
+-- Interest accrual partition checkpoints (migration 9)
+CREATE TABLE IF NOT EXISTS interest_accrual_runs (
+    accrual_date DATE NOT NULL,
+    range_start INT NOT NULL,
+    range_end INT NOT NULL,
+    accounts INT NOT NULL DEFAULT 0,
+    total_interest DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+    completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (accrual_date, range_start)
+);
+
+-- Card number sequences per BIN (migration 10)
+CREATE TABLE IF NOT EXISTS card_sequences (
+    bin VARCHAR(8) PRIMARY KEY,
+    next_value BIGINT NOT NULL DEFAULT 0
+);
+
+-- Transactions archive tier (migration 11); rows dated before
+-- archived_before may have been moved here by archive.py
+CREATE TABLE IF NOT EXISTS transactions_archive LIKE transactions;
+
+CREATE TABLE IF NOT EXISTS transaction_archive_state (
+    id TINYINT PRIMARY KEY,
+    archived_before DATE NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO transaction_archive_state (id, archived_before) VALUES (1, NULL);
+
+-- Notification outbox (migration 12); drained into notifications by outbox.py
+CREATE TABLE IF NOT EXISTS notification_outbox (
+    outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    event_key VARCHAR(150) NOT NULL,
+    customer_id INT NULL,
+    type VARCHAR(50) NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    message TEXT NOT NULL,
+    attempts INT NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE KEY uq_notification_outbox_event (event_key)
+);
+
+-- Balance reconciliation checkpoints and open discrepancies (migration 13)
+CREATE TABLE IF NOT EXISTS reconciliation_checkpoints (
+    account_id INT PRIMARY KEY,
+    ledger_balance DECIMAL(15, 2) NOT NULL,
+    last_transaction_id INT NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS reconciliation_discrepancies (
+    account_id INT PRIMARY KEY,
+    balance DECIMAL(15, 2) NOT NULL,
+    expected_balance DECIMAL(15, 2) NOT NULL,
+    difference DECIMAL(15, 2) NOT NULL,
+    checked_through INT NOT NULL,
+    first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+);
+
+-- Bulk import progress, written in each chunk's transaction (migration 14)
+CREATE TABLE IF NOT EXISTS import_checkpoints (
+    import_key VARCHAR(255) PRIMARY KEY,
+    byte_offset BIGINT NOT NULL DEFAULT 0,
+    rows_read INT NOT NULL DEFAULT 0,
+    rows_posted INT NOT NULL DEFAULT 0,
+    rows_rejected INT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
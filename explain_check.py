@@ -0,0 +1,204 @@
+import argparse
+import datetime
+import sys
+
+from archive import AGED_CHUNK_SQL
+from auth import LOGIN_SQL
+from bank import (ACCOUNT_BALANCE_SQL, ARCHIVE_BOUNDARY_SQL, BENEFICIARIES_SQL, BRANCH_COUNT_SQL,
+                  CUSTOMER_ACCOUNTS_SQL, DAILY_BALANCES_JOB, OPENING_SNAPSHOT_SQL, OPENING_TAIL_SQL,
+                  POST_BALANCE_SQL, PRIMARY_ACCOUNT_SQL, REMOVE_BENEFICIARY_SQL, STATEMENT_LINES_SQL,
+                  balance_deltas_query, lock_accounts_query, transaction_page_query)
+from cards import CUSTOMER_CARDS_SQL, RESERVE_SQL, SEQUENCE_INIT_SQL, existing_numbers_query
+from config import get_setting
+from daily_balances import snapshot_queries
+from database import DatabaseConnection
+from fixed_deposits import CUSTOMER_FDS_SQL, MATURED_CHUNK_SQL
+from interest_accrual import (COMPLETED_SQL, CREDIT_INTEREST_SQL, FINISH_RUN_SQL, INSERT_INTEREST_SQL,
+                              LOCK_RANGE_SQL, PARTITION_BOUNDS_SQL, TOTAL_INTEREST_SQL)
+from jobs import SETTLE_SECONDS, SETTLED_TRANSACTIONS_SQL, YOUNG_TRANSACTION_SQL
+from loans import CUSTOMER_LOANS_SQL
+from notifications import MARK_READ_BEFORE_SQL, PRUNE_SQL, UNREAD_COUNT_SQL, feed_query, mark_read_query
+from outbox import CLAIM_SQL
+from page_data import combined_query
+from reconcile import CHUNK_SQL
+from seed_data import seed
+
+# Query-plan regression check. The reads and keyed writes issued by app.py,
+# bank.py, api.py's shared queries and the batch jobs are listed here and
+# EXPLAINed against a seeded scratch database; a plan that falls back to a
+# full table/index scan or a filesort that is not explicitly allowed below
+# fails. Plain INSERT ... VALUES statements have no plan to regress and are
+# left out. Run it as `python explain_check.py` or through pytest
+# (test_query_plans.py, skipped unless [explain] database is set).
+#
+# Each entry is (name, sql, param_keys, allowed) where name is the call
+# site, param_keys name values from sample_values() and allowed may contain
+# 'scan' and/or 'filesort'. Every query is imported from the module that
+# runs it, so the check cannot drift from the code; add new queries there
+# as constants or builders and list them here.
+
+DATABASE = get_setting('explain', 'database', 'bank_management_explain')
+
+# Keyset page with a (date, id) token
+PAGE_PARAMS = ('account_id', 'page_date', 'page_date', 'page_id', 'page_size')
+# One touched account for the daily_balances snapshot reads
+SNAPSHOT_QUERIES = snapshot_queries({0: None})
+
+QUERIES = [
+    ('authenticate', LOGIN_SQL, ('email',), ()),
+    ('api.list_accounts', CUSTOMER_ACCOUNTS_SQL, ('customer_id',), ()),
+    ('check_balance', ACCOUNT_BALANCE_SQL, ('account_id',), ()),
+    ('lock_accounts', lock_accounts_query([0, 1])[0], ('account_id', 'other_account_id'), ()),
+    ('apply_balance_deltas', balance_deltas_query({0: 1, 1: -1})[0],
+     ('account_id', 'amount', 'other_account_id', 'amount', 'account_id', 'other_account_id'), ()),
+    ('post_transaction', POST_BALANCE_SQL, ('amount', 'account_id', 'amount'), ()),
+    ('transaction_page.first', transaction_page_query(0, 0)[0], ('account_id', 'page_size'), ()),
+    ('transaction_page.older', transaction_page_query(0, 0, (None, 0))[0], PAGE_PARAMS, ()),
+    ('transaction_page.archive_older', transaction_page_query(0, 0, (None, 0), table='transactions_archive')[0],
+     PAGE_PARAMS, ()),
+    ('transaction_page.archive_boundary', ARCHIVE_BOUNDARY_SQL, (), ()),
+    ('statement.opening_snapshot', OPENING_SNAPSHOT_SQL, ('account_id', 'start_date'), ()),
+    ('statement.opening_tail', OPENING_TAIL_SQL, ('account_id', 'start_date', 'job_name'), ()),
+    ('statement.lines', STATEMENT_LINES_SQL.format(table='transactions'),
+     ('account_id', 'retention_cutoff', 'page_date'), ()),
+    ('statement.archive_lines', STATEMENT_LINES_SQL.format(table='transactions_archive'),
+     ('account_id', 'retention_cutoff', 'page_date'), ()),
+    ('archive.chunk', AGED_CHUNK_SQL, ('first_id', 'page_id', 'page_size'), ()),
+    # One round trip for a page's accounts, unread badge and branch list;
+    # the branches part reads the whole (small) table
+    ('page_data.combined', combined_query(['accounts', 'unread', 'branches'], 0)[0],
+     ('customer_id', 'customer_id'), ('scan',)),
+    ('ensure_default_branch', BRANCH_COUNT_SQL, (), ('scan',)),
+    ('customer_loans', CUSTOMER_LOANS_SQL, ('customer_id',), ()),
+    ('view_credit_cards', CUSTOMER_CARDS_SQL, ('customer_id',), ()),
+    ('primary_account', PRIMARY_ACCOUNT_SQL, ('customer_id',), ()),
+    # Ordered by a column of the joined table across the customer's accounts;
+    # the sort is bounded by one customer's deposits.
+    ('view_fixed_deposits', CUSTOMER_FDS_SQL, ('customer_id',), ('filesort',)),
+    ('fd_maturity.chunk', MATURED_CHUNK_SQL, ('as_of', 'page_size'), ()),
+    ('view_beneficiaries', BENEFICIARIES_SQL, ('customer_id',), ()),
+    ('remove_beneficiary', REMOVE_BENEFICIARY_SQL, ('customer_id', 'beneficiary_name'), ()),
+    ('cards.sequence_init', SEQUENCE_INIT_SQL, ('card_bin',), ()),
+    ('cards.reserve', RESERVE_SQL, ('amount', 'card_bin'), ()),
+    ('cards.existing_numbers', existing_numbers_query(['0'])[0], ('card_number',), ()),
+    ('notifications.unread_count', UNREAD_COUNT_SQL, ('customer_id',), ()),
+    ('notifications.feed_first', feed_query(0, 0)[0], ('customer_id', 'page_size'), ()),
+    ('notifications.feed_older', feed_query(0, 0, (None, 0))[0],
+     ('customer_id', 'page_date', 'page_date', 'page_id', 'page_size'), ()),
+    ('notifications.mark_read', mark_read_query(0, [0])[0], ('customer_id', 'notification_id'), ()),
+    ('notifications.mark_all_read', MARK_READ_BEFORE_SQL, ('customer_id', 'page_date', 'page_size'), ()),
+    ('notifications.prune', PRUNE_SQL, ('retention_cutoff', 'page_size'), ()),
+    # The outbox only holds undelivered events, so its primary-key walk is short
+    ('outbox.claim', CLAIM_SQL, ('max_attempts', 'page_size'), ('scan',)),
+    ('daily_balances.settled_transactions', SETTLED_TRANSACTIONS_SQL,
+     ('settle_seconds', 'first_id', 'page_size'), ()),
+    ('daily_balances.base_snapshots', SNAPSHOT_QUERIES[0], ('account_id', 'as_of'), ()),
+    ('daily_balances.snapshot_days', SNAPSHOT_QUERIES[1], ('account_id', 'as_of'), ()),
+    ('interest_accrual.partitions', PARTITION_BOUNDS_SQL, (), ()),
+    ('interest_accrual.completed', COMPLETED_SQL, ('as_of',), ()),
+    ('interest_accrual.lock_range', LOCK_RANGE_SQL, ('first_id', 'page_id'), ()),
+    ('interest_accrual.insert', INSERT_INTEREST_SQL, ('description', 'first_id', 'page_id'), ()),
+    ('interest_accrual.total', TOTAL_INTEREST_SQL, ('first_id', 'page_id'), ()),
+    ('interest_accrual.credit', CREDIT_INTEREST_SQL, ('first_id', 'page_id'), ()),
+    ('interest_accrual.finish_run', FINISH_RUN_SQL, ('page_size', 'amount', 'as_of', 'first_id'), ()),
+    # Reconciliation reads new ledger rows by primary-key range only
+    ('reconcile.chunk', CHUNK_SQL.format(table='transactions'), ('first_id', 'page_id'), ()),
+    ('reconcile.settled', YOUNG_TRANSACTION_SQL, ('first_id', 'settle_seconds'), ()),
+]
+
+FULL_SCAN_TYPES = ('ALL', 'index')
+
+
+def sample_values(cursor):
+    cursor.execute("SELECT customer_id, email FROM customers ORDER BY customer_id LIMIT 1")
+    customer_id, email = cursor.fetchone()
+    cursor.execute("SELECT account_id FROM accounts WHERE customer_id = %s ORDER BY account_id LIMIT 2",
+                   (customer_id,))
+    account_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT MIN(notification_id) FROM notifications")
+    notification_id = cursor.fetchone()[0]
+    return {
+        'customer_id': customer_id,
+        'email': email,
+        'account_id': account_ids[0],
+        'other_account_id': account_ids[-1],
+        'notification_id': notification_id,
+        'beneficiary_name': 'Nobody',
+        'page_size': 51,
+        'page_date': datetime.datetime.now(),
+        'page_id': 2 ** 31 - 1,
+        'first_id': 0,
+        'amount': 1,
+        'max_attempts': 5,
+        'settle_seconds': SETTLE_SECONDS,
+        'as_of': datetime.date.today(),
+        'start_date': datetime.date.today() - datetime.timedelta(days=30),
+        'job_name': DAILY_BALANCES_JOB,
+        'description': 'explain',
+        'card_bin': '400000',
+        'card_number': '4000000000000002',
+        'retention_cutoff': datetime.datetime.now() - datetime.timedelta(days=365),
+    }
+
+
+def plan_problems(plan, allowed):
+    problems = []
+    for row in plan:
+        # Derived tables (<derivedN>, <unionN>) are read whole by
+        # construction; the tables they come from have rows of their own
+        if (row.get('table') or '').startswith('<'):
+            continue
+        access = row.get('type')
+        extra = row.get('Extra') or ''
+        if access in FULL_SCAN_TYPES and 'scan' not in allowed:
+            problems.append(f"full scan of {row.get('table')} (type={access})")
+        if 'Using filesort' in extra and 'filesort' not in allowed:
+            problems.append(f"filesort on {row.get('table')}")
+    return problems
+
+
+def check_query(cursor, values, sql, param_keys, allowed):
+    """EXPLAIN one query; returns (problems, one-line plan summary)."""
+    cursor.execute("EXPLAIN " + sql, tuple(values[key] for key in param_keys))
+    plan = [dict(zip(cursor.column_names, row)) for row in cursor.fetchall()]
+    summary = '; '.join(f"{r.get('table')}:{r.get('type')}/{r.get('key')}" for r in plan)
+    return plan_problems(plan, allowed), summary
+
+
+def run_checks(db):
+    failures = 0
+    with db.session() as session:
+        cursor = session.cursor
+        values = sample_values(cursor)
+        for name, sql, param_keys, allowed in QUERIES:
+            problems, summary = check_query(cursor, values, sql, param_keys, allowed)
+            if problems:
+                failures += 1
+                print(f"FAIL {name}: {', '.join(problems)} [{summary}]")
+            else:
+                print(f"ok   {name} [{summary}]")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXPLAIN every app query against a seeded scratch database.")
+    parser.add_argument('--database', default=DATABASE,
+                        help=f"Scratch database to create/seed (default: {DATABASE})")
+    parser.add_argument('--customers', type=int, default=2000, help="Customers to seed into an empty database")
+    args = parser.parse_args()
+
+    db = DatabaseConnection(database=args.database, auto_migrate=True)
+    try:
+        seed(db, customers=args.customers)
+        failures = run_checks(db)
+    finally:
+        db.close_connection()
+
+    if failures:
+        print(f"{failures} of {len(QUERIES)} query plans regressed")
+        sys.exit(1)
+    print(f"All {len(QUERIES)} query plans use indexes")
+
+
+if __name__ == "__main__":
+    main()
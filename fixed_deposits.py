@@ -0,0 +1,150 @@
+import argparse
+import datetime
+from decimal import Decimal
+
+import numpy as np
+
+from bank import CENT, INSERT_TRANSACTION_SQL, apply_balance_deltas
+from database import DatabaseConnection
+
+# Fixed-deposit maths over whole portfolios at once. Amounts are int64 cents
+# and rates int64 basis points, read straight from MySQL as integers, so the
+# only per-row Python work is building the arrays. Interest is simple
+# interest over the term, as quoted when the deposit is opened:
+#     interest = principal * rate% * term_months / 12
+
+# Selects (fd_id, account_id, principal cents, rate basis points, term_months,
+# start_date, maturity_date) for the engine
+FD_COLUMNS = '''fd.fd_id, fd.account_id, CAST(fd.amount * 100 AS SIGNED), CAST(fd.interest_rate * 100 AS SIGNED),
+                fd.term_months, fd.start_date, fd.maturity_date'''
+
+# A customer's deposits, newest first: FD_COLUMNS, status, account type, rate
+CUSTOMER_FDS_SQL = f'''SELECT {FD_COLUMNS}, fd.status, a.account_type, fd.interest_rate
+                       FROM fixed_deposits fd
+                       JOIN accounts a ON fd.account_id = a.account_id
+                       WHERE a.customer_id = %s
+                       ORDER BY fd.created_at DESC'''
+
+# Parameters: (as_of, chunk_size); rows are FD_COLUMNS plus the account status
+MATURED_CHUNK_SQL = f'''SELECT {FD_COLUMNS}, a.status
+                        FROM fixed_deposits fd JOIN accounts a ON fd.account_id = a.account_id
+                        WHERE fd.status = 'active' AND fd.maturity_date <= %s
+                        ORDER BY fd.maturity_date
+                        LIMIT %s
+                        FOR UPDATE OF fd SKIP LOCKED'''
+
+
+def interest_cents(principal_cents, rate_bp, term_months):
+    """Interest earned over the full term, in cents, rounded half up."""
+    principal_cents = np.asarray(principal_cents, dtype=np.int64)
+    # principal * (bp / 10000) * (months / 12) == principal * bp * months / 120000
+    return (principal_cents * np.asarray(rate_bp, dtype=np.int64) * np.asarray(term_months, dtype=np.int64)
+            + 60000) // 120000
+
+
+def portfolio(rows, today=None):
+    """Maturity figures for many deposits in one vectorised pass.
+
+    ``rows`` are tuples selected with FD_COLUMNS. Returns a dict of arrays
+    keyed fd_id, principal_cents, interest_cents, maturity_cents,
+    accrued_cents (interest earned so far, pro rata by day), days_remaining
+    and matured.
+    """
+    today = np.datetime64(today or datetime.date.today(), 'D')
+    columns = list(zip(*rows)) or [()] * 7
+    fd_id = np.array(columns[0], dtype=np.int64)
+    principal = np.array(columns[2], dtype=np.int64)
+    interest = interest_cents(principal, columns[3], columns[4])
+    start = np.array(columns[5], dtype='datetime64[D]')
+    maturity = np.array(columns[6], dtype='datetime64[D]')
+
+    term_days = np.maximum((maturity - start).astype(np.int64), 1)
+    elapsed = np.clip((today - start).astype(np.int64), 0, term_days)
+    remaining = (maturity - today).astype(np.int64)
+    return {
+        'fd_id': fd_id,
+        'principal_cents': principal,
+        'interest_cents': interest,
+        'maturity_cents': principal + interest,
+        'accrued_cents': interest * elapsed // term_days,
+        'days_remaining': np.maximum(remaining, 0),
+        'matured': remaining <= 0,
+    }
+
+
+def to_amount(cents):
+    return (Decimal(int(cents)) * CENT).quantize(CENT)
+
+
+def _mature_chunk(cursor, as_of, chunk_size):
+    """Pay out one chunk of matured deposits; returns (deposits paid, deposits held)."""
+    # Only the deposit rows are locked here; SKIP LOCKED lets several job
+    # instances share the backlog without waiting on each other.
+    cursor.execute(MATURED_CHUNK_SQL, (as_of, chunk_size))
+    rows = cursor.fetchall()
+    if not rows:
+        return 0, 0
+
+    payable = [row[:7] for row in rows if row[7] == 'active']
+    held = [row[0] for row in rows if row[7] != 'active']
+
+    if payable:
+        figures = portfolio(payable, as_of)
+        account_ids = np.array([row[1] for row in payable], dtype=np.int64)
+        accounts, index = np.unique(account_ids, return_inverse=True)
+        totals = np.zeros(len(accounts), dtype=np.int64)
+        np.add.at(totals, index, figures['maturity_cents'])
+
+        apply_balance_deltas(cursor, {int(account_id): to_amount(total)
+                                      for account_id, total in zip(accounts, totals)})
+        cursor.executemany(INSERT_TRANSACTION_SQL,
+                           [(int(account_id), 'fd_maturity', to_amount(cents), f"Fixed deposit {int(fd_id)} matured")
+                            for fd_id, account_id, cents in zip(figures['fd_id'], account_ids,
+                                                                 figures['maturity_cents'])])
+        cursor.execute(f'''UPDATE fixed_deposits SET status = 'matured'
+                           WHERE fd_id IN ({', '.join(['%s'] * len(payable))})''',
+                       [row[0] for row in payable])
+
+    # Deposits linked to an inactive account are parked for manual handling
+    if held:
+        cursor.execute(f'''UPDATE fixed_deposits SET status = 'on_hold'
+                           WHERE fd_id IN ({', '.join(['%s'] * len(held))})''', held)
+    return len(payable), len(held)
+
+
+def process_matured_deposits(db, as_of=None, chunk_size=5000):
+    """Credit every deposit matured on or before ``as_of`` (default today).
+
+    Each chunk credits principal plus interest to the linked accounts with
+    one UPDATE, records one 'fd_maturity' transaction per deposit and closes
+    the deposits, all in a single commit, so a rerun never pays twice.
+    Returns (deposits paid, deposits held).
+    """
+    as_of = as_of or datetime.date.today()
+    paid = held = 0
+    while True:
+        with db.session() as session:
+            chunk_paid, chunk_held = _mature_chunk(session.cursor, as_of, chunk_size)
+            session.connection.commit()
+        paid += chunk_paid
+        held += chunk_held
+        if chunk_paid + chunk_held < chunk_size:
+            return paid, held
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pay out matured fixed deposits.")
+    parser.add_argument('--as-of', type=datetime.date.fromisoformat, help="Maturity cut-off date (default: today)")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="Deposits paid per committed chunk")
+    args = parser.parse_args()
+
+    db = DatabaseConnection()
+    try:
+        paid, held = process_matured_deposits(db, args.as_of, args.chunk_size)
+        print(f"Paid out {paid} matured fixed deposits; {held} held (inactive account)")
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
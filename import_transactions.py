@@ -0,0 +1,256 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+
+from bank import BankManagement, BATCH_CHUNK_SIZE
+
+# Streams a CSV or JSONL transaction file into the ledger through
+# BankManagement.post_batch. Records need account_id, type and amount, and
+# may carry description and transaction_date. The byte offset reached is
+# saved to import_checkpoints inside each chunk's own transaction, so a
+# chunk and its checkpoint commit together and re-running the same command
+# after a crash resumes exactly after the last committed chunk; no chunk is
+# ever posted twice. (Rejected rows are appended to the rejects file after
+# the commit, so a crash at that moment can lose that chunk's reject lines.)
+
+# Parameters: (import_key, byte_offset, rows_read, rows_posted, rows_rejected)
+SAVE_CHECKPOINT_SQL = '''INSERT INTO import_checkpoints
+                         (import_key, byte_offset, rows_read, rows_posted, rows_rejected)
+                         VALUES (%s, %s, %s, %s, %s)
+                         ON DUPLICATE KEY UPDATE byte_offset = VALUES(byte_offset),
+                                                 rows_read = VALUES(rows_read),
+                                                 rows_posted = VALUES(rows_posted),
+                                                 rows_rejected = VALUES(rows_rejected)'''
+
+
+def detect_format(path):
+    return 'jsonl' if path.lower().endswith(('.jsonl', '.ndjson')) else 'csv'
+
+
+class _LineSource:
+    """Decoded lines of a binary file, tracking the byte offset and text consumed so far."""
+
+    def __init__(self, file):
+        self.file = file
+        self.offset = file.tell()
+        self.lines = []
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.file.readline()
+        if not line:
+            raise StopIteration
+        self.offset = self.file.tell()
+        # A newline byte is never part of a multi-byte UTF-8 sequence
+        text = line.decode('utf-8', errors='replace')
+        self.lines.append(text)
+        return text
+
+    def take_text(self):
+        """The text consumed since the last call, without its final line break."""
+        text = ''.join(self.lines).rstrip('\r\n')
+        self.lines = []
+        return text
+
+
+def _csv_records(source, header):
+    reader = csv.reader(source)
+    while True:
+        try:
+            values = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            # The reader cannot resume mid-record; start a fresh one on the next line
+            yield source.offset, source.take_text(), ValueError(f"Malformed CSV: {e}")
+            reader = csv.reader(source)
+            continue
+        text = source.take_text()
+        if not any(value.strip() for value in values):
+            continue
+        if len(values) > len(header):
+            yield source.offset, text, ValueError(f"expected at most {len(header)} columns, got {len(values)}")
+        else:
+            yield source.offset, text, dict(zip(header, values))
+
+
+def read_records(path, file_format, start_offset=0):
+    """Yield (end_offset, raw_text, record_or_error) for each record.
+
+    The file is read in binary mode so the byte offset after every record is
+    known exactly; nothing beyond the current record is held in memory. CSV
+    goes through one streaming csv.reader, so a quoted field may span lines
+    and field values keep their whitespace. JSONL is one object per line.
+    """
+    with open(path, 'rb') as file:
+        header = None
+        if file_format == 'csv':
+            header = next(csv.reader([file.readline().decode('utf-8-sig')]))
+            header = [name.strip() for name in header]
+        if start_offset > file.tell():
+            file.seek(start_offset)
+
+        if file_format == 'csv':
+            yield from _csv_records(_LineSource(file), header)
+            return
+
+        while True:
+            line = file.readline()
+            if not line:
+                break
+            offset = file.tell()
+            text = line.decode('utf-8', errors='replace').strip()
+            if not text:
+                continue
+            try:
+                record = json.loads(text)
+                if not isinstance(record, dict):
+                    raise ValueError("expected a JSON object")
+                yield offset, text, record
+            except ValueError as e:
+                yield offset, text, e
+
+
+def to_posting(record):
+    posting = {
+        'account_id': record.get('account_id'),
+        'type': (record.get('type') or '').strip().lower(),
+        'amount': record.get('amount'),
+        'description': record.get('description') or None,
+    }
+    if record.get('transaction_date'):
+        posting['transaction_date'] = record['transaction_date']
+    return posting
+
+
+def load_checkpoint(db, import_key):
+    with db.session() as session:
+        session.cursor.execute('''SELECT byte_offset, rows_read, rows_posted, rows_rejected
+                                  FROM import_checkpoints WHERE import_key = %s''', (import_key,))
+        row = session.cursor.fetchone()
+    if row is None:
+        return {'offset': 0, 'rows_read': 0, 'rows_posted': 0, 'rows_rejected': 0}
+    return dict(zip(('offset', 'rows_read', 'rows_posted', 'rows_rejected'), row))
+
+
+def save_checkpoint(cursor, import_key, checkpoint):
+    """Write the checkpoint on the caller's transaction; does not commit."""
+    cursor.execute(SAVE_CHECKPOINT_SQL, (import_key, checkpoint['offset'], checkpoint['rows_read'],
+                                         checkpoint['rows_posted'], checkpoint['rows_rejected']))
+
+
+def clear_checkpoint(db, import_key):
+    with db.session() as session:
+        session.cursor.execute("DELETE FROM import_checkpoints WHERE import_key = %s", (import_key,))
+        session.connection.commit()
+
+
+def import_file(bank, path, file_format, chunk_size, import_key, rejects_path):
+    checkpoint = load_checkpoint(bank.db, import_key)
+    if checkpoint['offset']:
+        print(f"Resuming from byte {checkpoint['offset']:,} ({checkpoint['rows_read']:,} rows already read)")
+
+    started = time.monotonic()
+    rows_this_run = 0
+    chunk = []
+
+    with open(rejects_path, 'a') as rejects:
+        def reject(line, reason):
+            rejects.write(json.dumps({'line': line, 'reason': reason}) + '\n')
+
+        def flush(end_offset):
+            postings = [(line, item) for line, item in chunk if not isinstance(item, Exception)]
+            malformed = len(chunk) - len(postings)
+            progress = dict(checkpoint, offset=end_offset, rows_rejected=checkpoint['rows_rejected'] + malformed)
+            saved = []
+
+            def record_progress(cursor, chunk_results):
+                progress['rows_posted'] += sum(r['status'] == 'posted' for r in chunk_results)
+                progress['rows_rejected'] += sum(r['status'] == 'rejected' for r in chunk_results)
+                save_checkpoint(cursor, import_key, progress)
+                saved.append(True)
+
+            results = []
+            if postings:
+                results = bank.post_batch([posting for _, posting in postings], chunk_size=len(postings),
+                                          before_commit=record_progress)
+                failed = [r for r in results if r['status'] == 'failed']
+                if failed:
+                    raise RuntimeError(f"Chunk ending at byte {end_offset} failed: {failed[0]['reason']}")
+            if not saved:
+                # Nothing was posted, so the checkpoint commits on its own
+                with bank.db.session() as session:
+                    for result in results:
+                        progress['rows_rejected'] += result['status'] == 'rejected'
+                    save_checkpoint(session.cursor, import_key, progress)
+                    session.connection.commit()
+
+            # Rejects are only written once the chunk is committed, so a
+            # failed chunk that is retried on resume does not repeat them
+            for line, item in chunk:
+                if isinstance(item, Exception):
+                    reject(line, f"Malformed record: {item}")
+            for (line, _), result in zip(postings, results):
+                if result['status'] != 'posted':
+                    reject(line, result['reason'])
+            rejects.flush()
+            checkpoint.update(progress)
+
+            elapsed = time.monotonic() - started
+            rate = rows_this_run / elapsed if elapsed else 0.0
+            print(f"{checkpoint['rows_read']:,} rows read, {checkpoint['rows_posted']:,} posted, "
+                  f"{checkpoint['rows_rejected']:,} rejected ({rate:,.0f} rows/sec)")
+            chunk.clear()
+
+        end_offset = checkpoint['offset']
+        for end_offset, line, record in read_records(path, file_format, checkpoint['offset']):
+            rows_this_run += 1
+            chunk.append((line, record if isinstance(record, Exception) else to_posting(record)))
+            if len(chunk) >= chunk_size:
+                checkpoint['rows_read'] += len(chunk)
+                flush(end_offset)
+        if chunk:
+            checkpoint['rows_read'] += len(chunk)
+            flush(end_offset)
+
+    return checkpoint
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a CSV or JSONL transaction file in resumable chunks.")
+    parser.add_argument('path', help="Input file (.csv, .jsonl)")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format (default: from the extension)")
+    parser.add_argument('--chunk-size', type=int, default=BATCH_CHUNK_SIZE, help="Rows per committed chunk")
+    parser.add_argument('--import-key', help="Checkpoint name in import_checkpoints (default: the file's absolute path)")
+    parser.add_argument('--rejects', help="Rejected rows file (default: <path>.rejects.jsonl)")
+    parser.add_argument('--restart', action='store_true', help="Ignore any existing checkpoint")
+    args = parser.parse_args()
+
+    file_format = args.format or detect_format(args.path)
+    import_key = args.import_key or os.path.abspath(args.path)
+    rejects_path = args.rejects or args.path + '.rejects.jsonl'
+
+    bank = BankManagement()
+    try:
+        if args.restart:
+            clear_checkpoint(bank.db, import_key)
+        started = time.monotonic()
+        checkpoint = import_file(bank, args.path, file_format, args.chunk_size, import_key, rejects_path)
+        elapsed = time.monotonic() - started
+        print(f"Import complete in {elapsed:.1f}s: {checkpoint['rows_posted']:,} posted, "
+              f"{checkpoint['rows_rejected']:,} rejected (see {rejects_path})")
+    except (OSError, RuntimeError) as e:
+        print(f"Import stopped: {e}")
+        print("Re-run the same command to resume from the last committed chunk.")
+        sys.exit(1)
+    finally:
+        bank.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import datetime
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from config import get_setting
+from database import DatabaseConnection
+
+# Nightly interest accrual for savings accounts. accounts is cut into fixed
+# account_id ranges and the ranges are processed concurrently, each in its
+# own transaction: lock the range's accounts, bulk-insert one 'interest'
+# transaction per account with INSERT ... SELECT, then add the same amounts
+# with one UPDATE. The range's checkpoint row in interest_accrual_runs is
+# written in that same transaction, so an interrupted run can simply be
+# started again and only the missing ranges are processed.
+
+PARTITION_SIZE = get_setting('accrual', 'partition_size', 10000, int)
+WORKERS = get_setting('accrual', 'workers', 4, int)
+
+# Daily simple interest on the current balance, in whole cents
+DAILY_INTEREST = 'ROUND(balance * interest_rate / 36500, 2)'
+ELIGIBLE = '''account_id BETWEEN %s AND %s AND account_type = 'Savings' AND status = 'active'
+              AND interest_rate > 0 AND balance > 0'''
+
+# Parameters are (range_start, range_end) unless noted
+PARTITION_BOUNDS_SQL = "SELECT MIN(account_id), MAX(account_id) FROM accounts"
+# Parameters: (accrual_date,)
+COMPLETED_SQL = "SELECT range_start, range_end FROM interest_accrual_runs WHERE accrual_date = %s"
+LOCK_RANGE_SQL = f"SELECT account_id FROM accounts WHERE {ELIGIBLE} ORDER BY account_id FOR UPDATE"
+# Parameters: (description, range_start, range_end)
+INSERT_INTEREST_SQL = f'''INSERT INTO transactions (account_id, type, amount, description)
+                          SELECT account_id, 'interest', {DAILY_INTEREST}, %s
+                          FROM accounts
+                          WHERE {ELIGIBLE} AND {DAILY_INTEREST} > 0'''
+TOTAL_INTEREST_SQL = f"SELECT COALESCE(SUM({DAILY_INTEREST}), 0) FROM accounts WHERE {ELIGIBLE}"
+CREDIT_INTEREST_SQL = f"UPDATE accounts SET balance = balance + {DAILY_INTEREST} WHERE {ELIGIBLE}"
+# Parameters: (accounts, total_interest, accrual_date, range_start)
+FINISH_RUN_SQL = '''UPDATE interest_accrual_runs SET accounts = %s, total_interest = %s
+                    WHERE accrual_date = %s AND range_start = %s'''
+
+
+def partitions(cursor, partition_size):
+    """Fixed account_id ranges covering every account, aligned to multiples of partition_size."""
+    cursor.execute(PARTITION_BOUNDS_SQL)
+    low, high = cursor.fetchone()
+    if low is None:
+        return []
+    first = (low // partition_size) * partition_size
+    return [(start, start + partition_size - 1) for start in range(first, high + 1, partition_size)]
+
+
+def completed_partitions(cursor, accrual_date):
+    cursor.execute(COMPLETED_SQL, (accrual_date,))
+    return set(cursor.fetchall())
+
+
+def accrue_partition(db, accrual_date, range_start, range_end):
+    """Accrue one range; returns (accounts credited, total interest) or None if already done."""
+    with db.session() as session:
+        cursor = session.cursor
+        cursor.execute('''INSERT IGNORE INTO interest_accrual_runs (accrual_date, range_start, range_end)
+                          VALUES (%s, %s, %s)''', (accrual_date, range_start, range_end))
+        if cursor.rowcount == 0:
+            return None
+
+        # Lock the range in id order before reading balances, so the amounts
+        # recorded and the amounts added are computed from the same balance
+        cursor.execute(LOCK_RANGE_SQL, (range_start, range_end))
+        cursor.fetchall()
+
+        cursor.execute(INSERT_INTEREST_SQL, (f"Interest for {accrual_date.isoformat()}", range_start, range_end))
+        credited = cursor.rowcount
+        cursor.execute(TOTAL_INTEREST_SQL, (range_start, range_end))
+        total = cursor.fetchone()[0]
+        cursor.execute(CREDIT_INTEREST_SQL, (range_start, range_end))
+
+        cursor.execute(FINISH_RUN_SQL, (credited, total, accrual_date, range_start))
+        session.connection.commit()
+    return credited, total
+
+
+def run_accrual(db, accrual_date, partition_size=PARTITION_SIZE, workers=WORKERS):
+    """Accrue interest for every pending partition; returns a summary dict.
+
+    Raises ValueError if the date was already (partly) accrued with a
+    different partition size, since the ranges would then overlap.
+    """
+    with db.session() as session:
+        ranges = partitions(session.cursor, partition_size)
+        done = completed_partitions(session.cursor, accrual_date)
+    if any(end - start + 1 != partition_size for start, end in done):
+        raise ValueError(f"{accrual_date} was accrued with a different partition size; rerun with that size")
+    pending = [r for r in ranges if r not in done]
+
+    summary = {'partitions': len(ranges), 'skipped': len(ranges) - len(pending),
+               'processed': 0, 'accounts': 0, 'total_interest': 0, 'failed': []}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(accrue_partition, db, accrual_date, start, end): (start, end)
+                   for start, end in pending}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Error accruing accounts {futures[future][0]}-{futures[future][1]}: {e}")
+                summary['failed'].append(futures[future])
+                continue
+            if result is None:
+                summary['skipped'] += 1
+                continue
+            summary['processed'] += 1
+            summary['accounts'] += result[0]
+            summary['total_interest'] += result[1]
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accrue one day's interest on savings accounts.")
+    parser.add_argument('--date', type=datetime.date.fromisoformat, default=datetime.date.today(),
+                        help="Accrual date (default: today); each date is applied at most once")
+    parser.add_argument('--partition-size', type=int, default=PARTITION_SIZE, help="account_ids per partition")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Partitions processed concurrently")
+    args = parser.parse_args()
+
+    db = DatabaseConnection(pool_size=args.workers + 1)
+    try:
+        summary = run_accrual(db, args.date, args.partition_size, args.workers)
+    finally:
+        db.close_connection()
+
+    print(f"{args.date}: {summary['processed']} partitions accrued, {summary['skipped']} already done, "
+          f"{summary['accounts']} accounts credited {summary['total_interest']} in total")
+    if summary['failed']:
+        print(f"{len(summary['failed'])} partitions failed; rerun to retry them")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+from config import get_setting
+
+# Shared plumbing for incremental ledger jobs. Each job records the highest
+# transaction_id it has fully processed in job_watermarks and only reads
+# transactions above it on the next run.
+
+# Age (by posted_at) at which a transaction is taken as committed or rolled
+# back. Must exceed the longest a posting transaction stays open after its
+# INSERT, plus innodb_lock_wait_timeout for a writer queued on a row lock.
+SETTLE_SECONDS = get_setting('jobs', 'settle_seconds', 60, int)
+
+# Settlement is judged by posted_at, the time the row was inserted.
+# transaction_date can be set explicitly (post_batch, the importer) and may
+# be far older than the insert. Parameters: (after_id, settle_seconds)
+YOUNG_TRANSACTION_SQL = '''SELECT MIN(transaction_id) FROM transactions
+                           WHERE transaction_id > %s AND posted_at >= NOW() - INTERVAL %s SECOND'''
+
+# Parameters: (settle_seconds, after_id, limit); the last column flags unsettled rows
+SETTLED_TRANSACTIONS_SQL = '''SELECT transaction_id, account_id, type, amount, transaction_date,
+                                     posted_at >= NOW() - INTERVAL %s SECOND
+                              FROM transactions
+                              WHERE transaction_id > %s
+                              ORDER BY transaction_id
+                              LIMIT %s'''
+
+
+def read_watermark(cursor, job_name):
+    """Lock and return a job's watermark, creating it at 0 on first use.
+
+    The row lock is held until the caller commits, so two runs of the same
+    job never process the same range concurrently.
+    """
+    cursor.execute("INSERT IGNORE INTO job_watermarks (job_name, last_transaction_id) VALUES (%s, 0)",
+                   (job_name,))
+    cursor.execute("SELECT last_transaction_id FROM job_watermarks WHERE job_name = %s FOR UPDATE",
+                   (job_name,))
+    return cursor.fetchone()[0]
+
+
+def peek_watermark(cursor, job_name):
+    """Return a job's watermark without locking it (0 if the job never ran)."""
+    cursor.execute("SELECT last_transaction_id FROM job_watermarks WHERE job_name = %s", (job_name,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def save_watermark(cursor, job_name, last_transaction_id):
+    cursor.execute("UPDATE job_watermarks SET last_transaction_id = %s WHERE job_name = %s",
+                   (last_transaction_id, job_name))
+
+
+def fetch_settled_transactions(cursor, after_id, limit, settle_seconds=SETTLE_SECONDS):
+    """Read up to ``limit`` transactions above ``after_id`` in id order.
+
+    AUTO_INCREMENT ids are assigned at insert time but become visible at
+    commit, so a recent id can still be hidden behind a slower transaction.
+    The batch therefore stops at the first row posted less than
+    ``settle_seconds`` ago. This assumes no writer keeps a transaction open
+    longer than ``settle_seconds`` after inserting into transactions; a
+    writer that does can commit a row below the watermark, and the job
+    never reads it.
+
+    Rows are (transaction_id, account_id, type, amount, transaction_date).
+    """
+    cursor.execute(SETTLED_TRANSACTIONS_SQL, (settle_seconds, after_id, limit))
+    settled = []
+    for row in cursor.fetchall():
+        if row[5]:
+            break
+        settled.append(row[:5])
+    return settled
+
+
+def settled_watermark(cursor, after_id, settle_seconds=SETTLE_SECONDS):
+    """Highest transaction_id a job may advance to from ``after_id``.
+
+    The same rule as fetch_settled_transactions, for jobs that read by id
+    range: stop just below the first row posted less than ``settle_seconds``
+    ago, otherwise at the newest row in either ledger table. It relies on the
+    same bound on how long a writer holds its transaction open.
+    """
+    cursor.execute(YOUNG_TRANSACTION_SQL, (after_id, settle_seconds))
+    young = cursor.fetchone()[0]
+    if young is not None:
+        return max(after_id, young - 1)
+    cursor.execute('''SELECT GREATEST(COALESCE((SELECT MAX(transaction_id) FROM transactions), 0),
+                                      COALESCE((SELECT MAX(transaction_id) FROM transactions_archive), 0))''')
+    return max(after_id, cursor.fetchone()[0])
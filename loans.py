@@ -0,0 +1,106 @@
+import numpy as np
+
+from cache import TTLCache
+from config import get_setting
+
+# Loan amortization in integer cents. Schedules depend only on
+# (amount, rate, term), and most loans are written on a handful of standard
+# terms, so schedules are computed once per distinct key - all keys of the
+# same term together as one NumPy matrix - and kept in an LRU cache.
+
+# Selects (loan_id, amount cents, rate basis points, term_months) for the engine
+LOAN_TERMS_COLUMNS = '''loan_id, CAST(amount * 100 AS SIGNED), CAST(interest_rate * 100 AS SIGNED), term_months'''
+
+# A customer's loans, newest first, with the amount and rate again as cents
+# and basis points for loan_summaries
+CUSTOMER_LOANS_SQL = '''SELECT l.loan_id, l.loan_type, l.amount, l.interest_rate,
+                               l.term_months, l.start_date, l.end_date, l.status,
+                               b.branch_name,
+                               CAST(l.amount * 100 AS SIGNED), CAST(l.interest_rate * 100 AS SIGNED)
+                        FROM loans l
+                        JOIN branches b ON l.branch_id = b.branch_id
+                        WHERE l.customer_id = %s
+                        ORDER BY l.created_at DESC'''
+
+schedule_cache = TTLCache(get_setting('loans', 'schedule_cache_entries', 10000, int),
+                          get_setting('loans', 'schedule_cache_ttl', 86400.0, float))
+
+
+def _schedules_for_term(amount_cents, rate_bp, term_months):
+    """Schedules for k loans sharing one term, as (k, term) int64 arrays.
+
+    Balances come from the closed form
+        B_m = P(1+r)^m - EMI((1+r)^m - 1)/r
+    rounded to cents with B_term forced to 0; each month's principal is the
+    drop in balance and interest is the rounded balance times the monthly
+    rate, so principal sums to the loan amount exactly.
+    """
+    principal0 = amount_cents.astype(np.float64)[:, None]
+    rate = (rate_bp.astype(np.float64) / 120000)[:, None]   # bp per year -> fraction per month
+    months = np.arange(1, term_months + 1, dtype=np.float64)[None, :]
+
+    growth = (1 + rate) ** months
+    growth_n = growth[:, -1:]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        emi = np.where(rate > 0, principal0 * rate * growth_n / (growth_n - 1), principal0 / term_months)
+        balance = np.where(rate > 0, principal0 * growth - emi * (growth - 1) / rate,
+                           principal0 - emi * months)
+    balance = np.rint(balance).astype(np.int64)
+    balance[:, -1] = 0
+    balance = np.maximum(balance, 0)
+
+    opening = np.concatenate([amount_cents[:, None], balance[:, :-1]], axis=1)
+    principal = opening - balance
+    interest = np.rint(opening * rate).astype(np.int64)
+    return np.rint(emi[:, 0]).astype(np.int64), principal + interest, principal, interest, balance
+
+
+def schedules(terms):
+    """Amortization schedules for many (amount_cents, rate_bp, term_months) keys.
+
+    Returns {key: schedule} where a schedule is a dict with ``emi_cents``
+    and int64 arrays ``payment_cents``, ``principal_cents``,
+    ``interest_cents`` and ``balance_cents`` (one entry per month).
+    Cached keys are reused; the rest are computed in one pass per term.
+    """
+    result = {}
+    missing = {}
+    for key in set(terms):
+        key = (int(key[0]), int(key[1]), int(key[2]))
+        schedule = schedule_cache.get(key)
+        if schedule is None:
+            missing.setdefault(key[2], []).append(key)
+        else:
+            result[key] = schedule
+
+    for term_months, keys in missing.items():
+        amounts = np.array([key[0] for key in keys], dtype=np.int64)
+        rates = np.array([key[1] for key in keys], dtype=np.int64)
+        emi, payment, principal, interest, balance = _schedules_for_term(amounts, rates, term_months)
+        for row, key in enumerate(keys):
+            schedule = {
+                'emi_cents': int(emi[row]),
+                'payment_cents': payment[row],
+                'principal_cents': principal[row],
+                'interest_cents': interest[row],
+                'balance_cents': balance[row],
+            }
+            for array in schedule.values():
+                if isinstance(array, np.ndarray):
+                    array.flags.writeable = False
+            schedule_cache.set(key, schedule)
+            result[key] = schedule
+    return result
+
+
+def loan_summaries(rows):
+    """EMI and total interest per loan for rows selected with LOAN_TERMS_COLUMNS.
+
+    Returns {loan_id: (emi_cents, total_interest_cents)}.
+    """
+    by_key = schedules(row[1:4] for row in rows)
+    summaries = {}
+    for loan_id, amount_cents, rate_bp, term_months in rows:
+        schedule = by_key[(int(amount_cents), int(rate_bp), int(term_months))]
+        summaries[loan_id] = (schedule['emi_cents'], int(schedule['interest_cents'].sum()))
+    return summaries
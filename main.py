@@ -74,16 +74,20 @@ def main():
         elif choice == '6':
             print("\n=== Transaction History ===")
             account_id = int(input("Enter account ID: "))
-            transactions = bank.get_transaction_history(account_id)
+            page = bank.get_transaction_page(account_id, page_size=20)
             
-            if transactions:
+            if page['rows']:
                 print("\nTransaction History:")
-                for transaction in transactions:
-                    print(f"ID: {transaction[0]}")
-                    print(f"Type: {transaction[2]}")
-                    print(f"Amount: ${transaction[3]:.2f}")
-                    print(f"Date: {transaction[5]}")
-                    print("-" * 30)
+                while True:
+                    for transaction in page['rows']:
+                        print(f"ID: {transaction[0]}")
+                        print(f"Type: {transaction[1]}")
+                        print(f"Amount: ${transaction[2]:.2f}")
+                        print(f"Date: {transaction[4]}")
+                        print("-" * 30)
+                    if not page['next'] or input("Show older transactions? (y/n): ").lower() != 'y':
+                        break
+                    page = bank.get_transaction_page(account_id, page_size=20, after=page['next'])
             else:
                 print("No transactions found.")
 
@@ -0,0 +1,508 @@
+import os
+import re
+
+from mysql.connector import Error
+
+# Ordered schema migrations. Each entry is (version, description, apply) and
+# is recorded in schema_version once applied, so startup only has to compare
+# MAX(version) with LATEST_VERSION. Append new migrations; never edit old ones.
+#
+# The migrations that (re)load database_procedures.sql and
+# database_triggers.sql run the files as they are now, written for the
+# latest schema, not as they were when the migration was added. So every
+# load first creates ROUTINE_TABLES, the tables those scripts use beyond
+# BASE_TABLES; on a fresh database, migration 2 then never installs a
+# trigger whose table arrives in a later migration. When a script starts
+# using a new table, add that table to ROUTINE_TABLES too.
+
+SQL_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_LOCK = 'bank_management_schema'
+SCHEMA_LOCK_TIMEOUT = 60
+ER_NO_SUCH_TABLE = 1146
+
+SCHEMA_VERSION_TABLE = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INT PRIMARY KEY,
+        description VARCHAR(200) NOT NULL,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+BASE_TABLES = [
+    '''
+    CREATE TABLE IF NOT EXISTS branches (
+        branch_id INT AUTO_INCREMENT PRIMARY KEY,
+        branch_name VARCHAR(100) NOT NULL,
+        branch_code VARCHAR(20) UNIQUE NOT NULL,
+        address VARCHAR(200) NOT NULL,
+        city VARCHAR(100) NOT NULL,
+        state VARCHAR(100) NOT NULL,
+        phone VARCHAR(15) NOT NULL,
+        email VARCHAR(100) UNIQUE,
+        manager_id INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS employees (
+        employee_id INT AUTO_INCREMENT PRIMARY KEY,
+        branch_id INT,
+        name VARCHAR(100) NOT NULL,
+        position VARCHAR(50) NOT NULL,
+        email VARCHAR(100) UNIQUE NOT NULL,
+        phone VARCHAR(15),
+        address VARCHAR(200),
+        hire_date DATE NOT NULL,
+        salary DECIMAL(15, 2) NOT NULL,
+        status VARCHAR(20) DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (branch_id) REFERENCES branches(branch_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS customers (
+        customer_id INT AUTO_INCREMENT PRIMARY KEY,
+        branch_id INT,
+        name VARCHAR(100) NOT NULL,
+        address VARCHAR(200),
+        phone VARCHAR(15),
+        email VARCHAR(100) UNIQUE,
+        password VARCHAR(255) NOT NULL,
+        date_of_birth DATE,
+        occupation VARCHAR(100),
+        annual_income DECIMAL(15, 2),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (branch_id) REFERENCES branches(branch_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS accounts (
+        account_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_id INT,
+        branch_id INT,
+        account_type VARCHAR(20) NOT NULL,
+        balance DECIMAL(15, 2) DEFAULT 0.00,
+        status VARCHAR(20) DEFAULT 'active',
+        interest_rate DECIMAL(5, 2),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+        FOREIGN KEY (branch_id) REFERENCES branches(branch_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS transactions (
+        transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+        account_id INT,
+        type VARCHAR(20) NOT NULL,
+        amount DECIMAL(15, 2) NOT NULL,
+        description TEXT,
+        transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        processed_by_employee INT,
+        FOREIGN KEY (account_id) REFERENCES accounts(account_id),
+        FOREIGN KEY (processed_by_employee) REFERENCES employees(employee_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS loans (
+        loan_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_id INT,
+        branch_id INT,
+        loan_type VARCHAR(50) NOT NULL,
+        amount DECIMAL(15, 2) NOT NULL,
+        interest_rate DECIMAL(5, 2) NOT NULL,
+        term_months INT NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE NOT NULL,
+        status VARCHAR(20) DEFAULT 'pending',
+        processed_by INT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+        FOREIGN KEY (branch_id) REFERENCES branches(branch_id),
+        FOREIGN KEY (processed_by) REFERENCES employees(employee_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS credit_cards (
+        card_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_id INT,
+        card_number VARCHAR(16) UNIQUE NOT NULL,
+        card_type VARCHAR(50) NOT NULL,
+        expiry_date DATE NOT NULL,
+        credit_limit DECIMAL(15, 2) NOT NULL,
+        current_balance DECIMAL(15, 2) DEFAULT 0.00,
+        status VARCHAR(20) DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS fixed_deposits (
+        fd_id INT AUTO_INCREMENT PRIMARY KEY,
+        account_id INT,
+        amount DECIMAL(15, 2) NOT NULL,
+        interest_rate DECIMAL(5, 2) NOT NULL,
+        term_months INT NOT NULL,
+        start_date DATE NOT NULL,
+        maturity_date DATE NOT NULL,
+        status VARCHAR(20) DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS beneficiaries (
+        beneficiary_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_id INT,
+        account_id INT,
+        name VARCHAR(100) NOT NULL,
+        account_number VARCHAR(20) NOT NULL,
+        bank_name VARCHAR(100) NOT NULL,
+        ifsc_code VARCHAR(20) NOT NULL,
+        relationship VARCHAR(50),
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id),
+        FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS atm_transactions (
+        atm_transaction_id INT AUTO_INCREMENT PRIMARY KEY,
+        card_id INT,
+        transaction_type VARCHAR(20) NOT NULL,
+        amount DECIMAL(15, 2) NOT NULL,
+        atm_location VARCHAR(200),
+        status VARCHAR(20) DEFAULT 'completed',
+        transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (card_id) REFERENCES credit_cards(card_id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS notifications (
+        notification_id INT AUTO_INCREMENT PRIMARY KEY,
+        customer_id INT,
+        title VARCHAR(200) NOT NULL,
+        message TEXT NOT NULL,
+        type VARCHAR(50) NOT NULL,
+        is_read BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    )
+    ''',
+]
+
+NOTIFICATION_COUNTERS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS notification_counters (
+        customer_id INT PRIMARY KEY,
+        unread INT NOT NULL DEFAULT 0,
+        FOREIGN KEY (customer_id) REFERENCES customers(customer_id)
+    )
+'''
+
+# No foreign key: enqueueing must stay a single cheap insert
+NOTIFICATION_OUTBOX_TABLE = '''
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        outbox_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        event_key VARCHAR(150) NOT NULL,
+        customer_id INT NULL,
+        type VARCHAR(50) NOT NULL,
+        title VARCHAR(200) NOT NULL,
+        message TEXT NOT NULL,
+        attempts INT NOT NULL DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE KEY uq_notification_outbox_event (event_key)
+    )
+'''
+
+# Tables referenced by database_procedures.sql / database_triggers.sql
+ROUTINE_TABLES = [NOTIFICATION_COUNTERS_TABLE, NOTIFICATION_OUTBOX_TABLE]
+
+_ROUTINE_PATTERN = re.compile(r'^CREATE\s+(PROCEDURE|FUNCTION|TRIGGER)\s+`?(\w+)`?', re.IGNORECASE)
+
+
+def split_sql_script(text):
+    """Split a mysql client script into statements, honouring DELIMITER lines."""
+    delimiter = ';'
+    statements = []
+    buffer = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if not buffer and (not stripped or stripped.startswith('--')):
+            continue
+        buffer.append(line)
+        if stripped.endswith(delimiter):
+            statement = '\n'.join(buffer).rstrip()[:-len(delimiter)].strip()
+            if statement:
+                statements.append(statement)
+            buffer = []
+    tail = '\n'.join(buffer).strip()
+    if tail:
+        statements.append(tail)
+    return statements
+
+
+def run_sql_file(cursor, filename):
+    """Execute a script file; routines and triggers are dropped before being recreated."""
+    with open(os.path.join(SQL_DIR, filename), 'r') as file:
+        statements = split_sql_script(file.read())
+    for statement in statements:
+        match = _ROUTINE_PATTERN.match(statement)
+        if match:
+            kind, name = match.groups()
+            cursor.execute(f"DROP {kind.upper()} IF EXISTS {name}")
+        cursor.execute(statement)
+
+
+def load_routines(cursor, *filenames):
+    """Create ROUTINE_TABLES, then run the given procedure/trigger scripts."""
+    for statement in ROUTINE_TABLES:
+        cursor.execute(statement)
+    for filename in filenames:
+        run_sql_file(cursor, filename)
+
+
+def _create_base_tables(cursor):
+    for statement in BASE_TABLES:
+        cursor.execute(statement)
+
+
+def _create_procedures_and_triggers(cursor):
+    load_routines(cursor, 'database_procedures.sql', 'database_triggers.sql')
+
+
+def create_index(cursor, table, name, columns):
+    """CREATE INDEX unless an index with this name already exists (MySQL has no IF NOT EXISTS)."""
+    cursor.execute('''SELECT 1 FROM information_schema.statistics
+                      WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+                      LIMIT 1''', (table, name))
+    if cursor.fetchone() is None:
+        cursor.execute(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})")
+
+
+# Composite indexes for the per-customer / per-account listings. The login
+# lookup on customers.email is already served by its UNIQUE index.
+HOT_PATH_INDEXES = [
+    ('transactions', 'idx_transactions_account_date', ['account_id', 'transaction_date', 'transaction_id']),
+    ('notifications', 'idx_notifications_customer_created', ['customer_id', 'created_at']),
+    ('loans', 'idx_loans_customer_created', ['customer_id', 'created_at']),
+    ('fixed_deposits', 'idx_fixed_deposits_account_created', ['account_id', 'created_at']),
+    ('beneficiaries', 'idx_beneficiaries_customer_created', ['customer_id', 'created_at']),
+    ('credit_cards', 'idx_credit_cards_customer_created', ['customer_id', 'created_at']),
+]
+
+
+def _add_hot_path_indexes(cursor):
+    for table, name, columns in HOT_PATH_INDEXES:
+        create_index(cursor, table, name, columns)
+
+
+def _create_daily_balances(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_balances (
+            account_id INT NOT NULL,
+            balance_date DATE NOT NULL,
+            net_change DECIMAL(15, 2) NOT NULL,
+            closing_balance DECIMAL(15, 2) NOT NULL,
+            PRIMARY KEY (account_id, balance_date),
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS job_watermarks (
+            job_name VARCHAR(50) PRIMARY KEY,
+            last_transaction_id INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _drop_balance_triggers(cursor):
+    cursor.execute("DROP TRIGGER IF EXISTS after_transaction_insert")
+    cursor.execute("DROP TRIGGER IF EXISTS before_transaction_insert")
+
+
+def _reload_procedures(cursor):
+    load_routines(cursor, 'database_procedures.sql')
+
+
+def _create_notification_counters(cursor):
+    # Retention pruning walks read notifications by age
+    create_index(cursor, 'notifications', 'idx_notifications_read_created', ['is_read', 'created_at'])
+    # Table and triggers first, then a full recount, so nothing inserted in
+    # between is lost
+    load_routines(cursor, 'database_triggers.sql')
+    cursor.execute('''INSERT INTO notification_counters (customer_id, unread)
+                      SELECT customer_id, SUM(is_read = FALSE) FROM notifications
+                      WHERE customer_id IS NOT NULL GROUP BY customer_id
+                      ON DUPLICATE KEY UPDATE unread = VALUES(unread)''')
+
+
+def _add_fd_maturity_index(cursor):
+    # The maturity job reads active deposits in maturity_date order
+    create_index(cursor, 'fixed_deposits', 'idx_fixed_deposits_status_maturity', ['status', 'maturity_date'])
+
+
+def _create_interest_accrual_runs(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS interest_accrual_runs (
+            accrual_date DATE NOT NULL,
+            range_start INT NOT NULL,
+            range_end INT NOT NULL,
+            accounts INT NOT NULL DEFAULT 0,
+            total_interest DECIMAL(15, 2) NOT NULL DEFAULT 0.00,
+            completed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (accrual_date, range_start)
+        )
+    ''')
+
+
+def _create_card_sequences(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS card_sequences (
+            bin VARCHAR(8) PRIMARY KEY,
+            next_value BIGINT NOT NULL DEFAULT 0
+        )
+    ''')
+
+
+def _create_transactions_archive(cursor):
+    # Same columns and indexes as transactions; no foreign key, so archived
+    # history does not pin accounts
+    cursor.execute("CREATE TABLE IF NOT EXISTS transactions_archive LIKE transactions")
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_archive_state (
+            id TINYINT PRIMARY KEY,
+            archived_before DATE NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute("INSERT IGNORE INTO transaction_archive_state (id, archived_before) VALUES (1, NULL)")
+
+
+def _create_notification_outbox(cursor):
+    # The loan trigger and ProcessLoanApplication now queue instead of inserting
+    load_routines(cursor, 'database_procedures.sql', 'database_triggers.sql')
+
+
+def _create_reconciliation(cursor):
+    # Checkpoints have no foreign key: archived history may outlive its account
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reconciliation_checkpoints (
+            account_id INT PRIMARY KEY,
+            ledger_balance DECIMAL(15, 2) NOT NULL,
+            last_transaction_id INT NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS reconciliation_discrepancies (
+            account_id INT PRIMARY KEY,
+            balance DECIMAL(15, 2) NOT NULL,
+            expected_balance DECIMAL(15, 2) NOT NULL,
+            difference DECIMAL(15, 2) NOT NULL,
+            checked_through INT NOT NULL,
+            first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (account_id) REFERENCES accounts(account_id)
+        )
+    ''')
+
+
+def _create_import_checkpoints(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS import_checkpoints (
+            import_key VARCHAR(255) PRIMARY KEY,
+            byte_offset BIGINT NOT NULL DEFAULT 0,
+            rows_read INT NOT NULL DEFAULT 0,
+            rows_posted INT NOT NULL DEFAULT 0,
+            rows_rejected INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _add_transaction_posted_at(cursor):
+    # Insert time, for the incremental jobs' settle check; transaction_date
+    # may be backdated. Added to both tables, which archive.py keeps in the
+    # same column order for INSERT ... SELECT *
+    for table in ('transactions', 'transactions_archive'):
+        cursor.execute('''SELECT 1 FROM information_schema.columns
+                          WHERE table_schema = DATABASE() AND table_name = %s AND column_name = 'posted_at'
+                          LIMIT 1''', (table,))
+        if cursor.fetchone() is None:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN posted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+
+
+# From this version on, balances are written only by the postings
+# themselves; on an older schema the balance triggers would apply every
+# post_batch delta a second time
+SINGLE_WRITE_POSTINGS_VERSION = 5
+
+MIGRATIONS = [
+    (1, 'Base tables', _create_base_tables),
+    (2, 'Stored procedures and triggers', _create_procedures_and_triggers),
+    (3, 'Hot-path composite indexes', _add_hot_path_indexes),
+    (4, 'Daily balance snapshots and job watermarks', _create_daily_balances),
+    (SINGLE_WRITE_POSTINGS_VERSION, 'Drop balance triggers superseded by single-write postings',
+     _drop_balance_triggers),
+    (6, 'TransferMoney locks accounts in account_id order', _reload_procedures),
+    (7, 'Trigger-maintained unread notification counters', _create_notification_counters),
+    (8, 'Fixed deposit maturity index', _add_fd_maturity_index),
+    (9, 'Interest accrual partition checkpoints', _create_interest_accrual_runs),
+    (10, 'Card number sequences per BIN', _create_card_sequences),
+    (11, 'Transactions archive tier', _create_transactions_archive),
+    (12, 'Notification outbox', _create_notification_outbox),
+    (13, 'Balance reconciliation checkpoints', _create_reconciliation),
+    (14, 'Bulk import checkpoints', _create_import_checkpoints),
+    (15, 'Transaction insert time for settle checks', _add_transaction_posted_at),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(cursor):
+    """Return the applied schema version, 0 for an empty database."""
+    try:
+        cursor.execute("SELECT MAX(version) FROM schema_version")
+    except Error as e:
+        if e.errno == ER_NO_SUCH_TABLE:
+            return 0
+        raise
+    return cursor.fetchone()[0] or 0
+
+
+def migrate(connection, cursor):
+    """Apply pending migrations in order and return the versions applied.
+
+    A named MySQL lock serialises concurrent workers; whoever gets it second
+    re-reads the version and finds nothing left to do.
+    """
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (SCHEMA_LOCK, SCHEMA_LOCK_TIMEOUT))
+    if cursor.fetchone()[0] != 1:
+        raise Error(msg="Timed out waiting for the schema migration lock")
+    try:
+        cursor.execute(SCHEMA_VERSION_TABLE)
+        version = current_version(cursor)
+        applied = []
+        for number, description, apply in MIGRATIONS:
+            if number <= version:
+                continue
+            apply(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (number, description)
+            )
+            connection.commit()
+            applied.append(number)
+        return applied
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (SCHEMA_LOCK,))
+        cursor.fetchone()
+
+
+if __name__ == "__main__":
+    from database import DatabaseConnection
+
+    db = DatabaseConnection(auto_migrate=True)
+    db.close_connection()
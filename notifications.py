@@ -0,0 +1,146 @@
+import argparse
+import datetime
+
+from bank import decode_page_token, encode_page_token
+from config import get_setting
+from database import DatabaseConnection
+
+# Customer notification feed. Unread counts live in notification_counters,
+# kept current by triggers on notifications (database_triggers.sql), so the
+# badge is a primary-key read however many notifications a customer has.
+# The feed is keyset-paged on (created_at, notification_id) and bulk updates
+# and retention deletes run in bounded chunks.
+
+RETENTION_DAYS = get_setting('notifications', 'retention_days', 365, int)
+CHUNK_SIZE = get_setting('notifications', 'chunk_size', 1000, int)
+
+
+def feed_query(customer_id, page_size, token=None):
+    """SQL and parameters for one feed page (newest first, page_size + 1 rows).
+
+    Rows are (notification_id, title, message, type, is_read, created_at).
+    """
+    conditions = ['customer_id = %s']
+    params = [customer_id]
+    if token is not None:
+        conditions.append('(created_at < %s OR (created_at = %s AND notification_id < %s))')
+        params.extend([token[0], token[0], token[1]])
+    params.append(page_size + 1)
+    return f'''SELECT notification_id, title, message, type, is_read, created_at
+               FROM notifications
+               WHERE {' AND '.join(conditions)}
+               ORDER BY created_at DESC, notification_id DESC
+               LIMIT %s''', params
+
+
+def feed_page(rows, page_size):
+    has_more = len(rows) > page_size
+    rows = list(rows[:page_size])
+    return {'rows': rows, 'next': encode_page_token(rows[-1]) if has_more else None}
+
+
+def mark_read_query(customer_id, notification_ids):
+    """SQL and parameters marking the given notifications of one customer read."""
+    placeholders = ', '.join(['%s'] * len(notification_ids))
+    return f'''UPDATE notifications SET is_read = TRUE
+               WHERE customer_id = %s AND is_read = FALSE
+                 AND notification_id IN ({placeholders})''', [customer_id, *notification_ids]
+
+
+UNREAD_COUNT_SQL = "SELECT unread FROM notification_counters WHERE customer_id = %s"
+
+MARK_READ_BEFORE_SQL = '''UPDATE notifications SET is_read = TRUE
+                          WHERE customer_id = %s AND created_at < %s AND is_read = FALSE
+                          LIMIT %s'''
+
+PRUNE_SQL = '''DELETE FROM notifications
+               WHERE is_read = TRUE AND created_at < %s
+               LIMIT %s'''
+
+
+class NotificationService:
+    def __init__(self, db):
+        self.db = db
+
+    def unread_count(self, customer_id):
+        with self.db.session() as session:
+            session.cursor.execute(UNREAD_COUNT_SQL, (customer_id,))
+            row = session.cursor.fetchone()
+        return row[0] if row else 0
+
+    def get_page(self, customer_id, page_size=20, after=None):
+        """One page of a customer's feed, newest first.
+
+        Pass the returned ``next`` token as ``after`` for older notifications.
+        Returns ``{'rows', 'next'}``; raises ValueError on a malformed token.
+        """
+        if page_size < 1:
+            raise ValueError("page_size must be at least 1")
+        token = decode_page_token(after) if after else None
+        query, params = feed_query(customer_id, page_size, token)
+        with self.db.session() as session:
+            session.cursor.execute(query, params)
+            return feed_page(session.cursor.fetchall(), page_size)
+
+    def mark_read(self, customer_id, notification_ids):
+        """Mark the listed notifications read in one statement; returns how many changed."""
+        notification_ids = list(notification_ids)
+        if not notification_ids:
+            return 0
+        query, params = mark_read_query(customer_id, notification_ids)
+        with self.db.session() as session:
+            session.cursor.execute(query, params)
+            changed = session.cursor.rowcount
+            session.connection.commit()
+        return changed
+
+    def mark_all_read(self, customer_id, before=None, chunk_size=CHUNK_SIZE):
+        """Mark every notification created before ``before`` (default: now) read.
+
+        Runs in committed chunks so a backlog of years does not hold one long
+        transaction. Returns how many notifications changed.
+        """
+        before = before or datetime.datetime.now()
+        changed = 0
+        while True:
+            with self.db.session() as session:
+                session.cursor.execute(MARK_READ_BEFORE_SQL, (customer_id, before, chunk_size))
+                count = session.cursor.rowcount
+                session.connection.commit()
+            changed += count
+            if count < chunk_size:
+                return changed
+
+    def prune(self, retention_days=RETENTION_DAYS, chunk_size=CHUNK_SIZE):
+        """Delete read notifications older than ``retention_days`` in committed chunks.
+
+        Unread notifications are always kept. Returns the number deleted.
+        """
+        cutoff = datetime.datetime.now() - datetime.timedelta(days=retention_days)
+        deleted = 0
+        while True:
+            with self.db.session() as session:
+                session.cursor.execute(PRUNE_SQL, (cutoff, chunk_size))
+                count = session.cursor.rowcount
+                session.connection.commit()
+            deleted += count
+            if count < chunk_size:
+                return deleted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prune read notifications past the retention period.")
+    parser.add_argument('--days', type=int, default=RETENTION_DAYS, help="Keep read notifications this many days")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="Rows deleted per committed chunk")
+    args = parser.parse_args()
+
+    db = DatabaseConnection()
+    try:
+        deleted = NotificationService(db).prune(args.days, args.chunk_size)
+        print(f"Deleted {deleted} read notifications older than {args.days} days")
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import argparse
+import threading
+from collections import namedtuple
+
+from config import get_setting
+from database import DatabaseConnection
+
+# Notification outbox. Business writes (loan status changes, card issuance)
+# add one small row to notification_outbox in their own transaction instead
+# of writing the notification itself, so the event exists exactly when the
+# change commits and the write path does one insert whatever is done with
+# the event afterwards. An OutboxDispatcher drains the outbox in batches:
+# it claims rows with SKIP LOCKED (several dispatchers can run), hands the
+# batch to each sink - by default one multi-row insert into notifications -
+# and deletes the rows, all in one transaction.
+#
+# event_key is unique while an event waits: enqueueing an existing key
+# replaces its title and message, so one change reported from two places
+# (the loan trigger and ProcessLoanApplication) becomes one notification.
+
+BATCH_SIZE = get_setting('outbox', 'batch_size', 500, int)
+POLL_INTERVAL = get_setting('outbox', 'poll_interval', 1.0, float)
+# Batches that fail this many times are left in the outbox for inspection
+MAX_ATTEMPTS = get_setting('outbox', 'max_attempts', 5, int)
+# Comma-separated sink names from SINKS
+SINK_NAMES = get_setting('outbox', 'sinks', 'table')
+# Run a dispatcher thread inside the Streamlit app process
+IN_PROCESS = get_setting('outbox', 'in_process', True, bool)
+
+# Parameters: (event_key, customer_id, type, title, message)
+ENQUEUE_SQL = '''INSERT INTO notification_outbox (event_key, customer_id, type, title, message)
+                 VALUES (%s, %s, %s, %s, %s)
+                 ON DUPLICATE KEY UPDATE customer_id = VALUES(customer_id), type = VALUES(type),
+                                         title = VALUES(title), message = VALUES(message)'''
+
+CLAIM_SQL = '''SELECT outbox_id, event_key, customer_id, type, title, message, created_at
+               FROM notification_outbox
+               WHERE attempts < %s
+               ORDER BY outbox_id
+               LIMIT %s
+               FOR UPDATE SKIP LOCKED'''
+
+INSERT_NOTIFICATION_SQL = '''INSERT INTO notifications (customer_id, title, message, type, created_at)
+                             VALUES (%s, %s, %s, %s, %s)'''
+
+OutboxEvent = namedtuple('OutboxEvent', 'outbox_id event_key customer_id type title message created_at')
+
+
+def enqueue(cursor, event_key, customer_id, event_type, title, message):
+    """Add an event to the outbox on the caller's transaction; does not commit."""
+    cursor.execute(ENQUEUE_SQL, (event_key, customer_id, event_type, title, message))
+
+
+def card_issued_event(customer_id, card_number, card_type, status='active'):
+    """ENQUEUE_SQL parameters announcing a new card (only the last four digits are shown)."""
+    if status == 'pending':
+        title = f"{card_type} Card Application Received"
+        message = f"Your {card_type} credit card application (card ending {card_number[-4:]}) is being reviewed."
+    else:
+        title = f"{card_type} Card Issued"
+        message = f"Your {card_type} credit card ending {card_number[-4:]} has been issued."
+    return f"card_issued:{card_number}", customer_id, 'card_update', title, message
+
+
+class TableSink:
+    """Writes the batch into notifications with one multi-row insert, in the dispatch transaction."""
+
+    def deliver(self, cursor, events):
+        cursor.executemany(INSERT_NOTIFICATION_SQL, [
+            (event.customer_id, event.title, event.message, event.type, event.created_at) for event in events
+        ])
+
+
+class LogSink:
+    """Prints each event; a template for email, SMS or webhook delivery."""
+
+    def deliver(self, cursor, events):
+        for event in events:
+            print(f"Notification {event.event_key} for customer {event.customer_id}: {event.title}")
+
+
+SINKS = {'table': TableSink, 'log': LogSink}
+
+
+def load_sinks(names=SINK_NAMES):
+    """Sink instances for a comma-separated list of SINKS names."""
+    sinks = []
+    for name in filter(None, (name.strip() for name in names.split(','))):
+        if name not in SINKS:
+            raise ValueError(f"Unknown notification sink: {name}")
+        sinks.append(SINKS[name]())
+    return sinks
+
+
+class OutboxDispatcher:
+    """Moves outbox events to the sinks in batches.
+
+    Sinks are objects with ``deliver(cursor, events)``. They run in order
+    inside the transaction that deletes the batch; if one raises, the batch
+    is rolled back and retried (so sinks outside the database must tolerate
+    redelivery), and after ``max_attempts`` failures its events are skipped.
+    """
+
+    def __init__(self, db, sinks=None, batch_size=BATCH_SIZE, max_attempts=MAX_ATTEMPTS):
+        self.db = db
+        self.sinks = load_sinks() if sinks is None else list(sinks)
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+    def dispatch_batch(self):
+        """Deliver one batch; returns how many events it delivered (0 when idle or the batch failed)."""
+        with self.db.session() as session:
+            session.cursor.execute(CLAIM_SQL, (self.max_attempts, self.batch_size))
+            events = [OutboxEvent(*row) for row in session.cursor.fetchall()]
+            if not events:
+                return 0
+            ids = [event.outbox_id for event in events]
+            placeholders = ', '.join(['%s'] * len(ids))
+            try:
+                for sink in self.sinks:
+                    sink.deliver(session.cursor, events)
+                session.cursor.execute(f"DELETE FROM notification_outbox WHERE outbox_id IN ({placeholders})", ids)
+                session.connection.commit()
+                return len(events)
+            except Exception as e:
+                print(f"Error dispatching notifications: {e}")
+                session.connection.rollback()
+            session.cursor.execute(f'''UPDATE notification_outbox SET attempts = attempts + 1
+                                       WHERE outbox_id IN ({placeholders})''', ids)
+            session.connection.commit()
+        return 0
+
+    def drain(self):
+        """Dispatch until the outbox has no deliverable events; returns the number handled."""
+        handled = 0
+        while True:
+            count = self.dispatch_batch()
+            handled += count
+            if count < self.batch_size:
+                return handled
+
+    def run(self, stop_event, poll_interval=POLL_INTERVAL):
+        """Drain, then poll every ``poll_interval`` seconds until ``stop_event`` is set."""
+        while not stop_event.is_set():
+            try:
+                self.drain()
+            except Exception as e:
+                print(f"Error reading notification outbox: {e}")
+            stop_event.wait(poll_interval)
+
+
+_dispatcher_thread = None
+_dispatcher_lock = threading.Lock()
+
+
+def start_dispatcher(db, poll_interval=POLL_INTERVAL):
+    """Run an OutboxDispatcher on a daemon thread (once per process); returns its stop event."""
+    global _dispatcher_thread
+    with _dispatcher_lock:
+        if _dispatcher_thread is None:
+            stop_event = threading.Event()
+            dispatcher = OutboxDispatcher(db)
+            _dispatcher_thread = threading.Thread(target=dispatcher.run, args=(stop_event, poll_interval),
+                                                  name='notification-outbox', daemon=True)
+            _dispatcher_thread.stop_event = stop_event
+            _dispatcher_thread.start()
+    return _dispatcher_thread.stop_event
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deliver queued notification events.")
+    parser.add_argument('--once', action='store_true', help="Drain the outbox once and exit")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Events delivered per transaction")
+    parser.add_argument('--sinks', default=SINK_NAMES, help=f"Comma-separated sinks ({', '.join(SINKS)})")
+    parser.add_argument('--requeue', action='store_true', help="Retry events that exhausted their attempts")
+    args = parser.parse_args()
+
+    db = DatabaseConnection()
+    try:
+        if args.requeue:
+            with db.session() as session:
+                session.cursor.execute("UPDATE notification_outbox SET attempts = 0 WHERE attempts > 0")
+                print(f"Requeued {session.cursor.rowcount} events")
+                session.connection.commit()
+        dispatcher = OutboxDispatcher(db, load_sinks(args.sinks), args.batch_size)
+        if args.once:
+            print(f"Dispatched {dispatcher.drain()} notification events")
+            return
+        stop_event = threading.Event()
+        try:
+            dispatcher.run(stop_event)
+        except KeyboardInterrupt:
+            stop_event.set()
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
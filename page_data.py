@@ -0,0 +1,114 @@
+from bank import REFERENCE_TTL
+
+# Request-scoped data loading for the Streamlit app. A PageData is built once
+# per rerun; the page declares the data it needs up front, and the first read
+# fetches every declared item that is not already in the bank's read cache
+# with one combined query. Identical lookups made by several page functions
+# (the account list read by the overview and again by the transaction
+# form, an account's type) are served from the same result.
+
+# One UNION ALL branch per kind of data. Columns line up by type
+# (kind, int, text, text, decimal, datetime) so no value is coerced.
+PARTS = {
+    'accounts': ('''SELECT 'account', account_id, account_type, status, balance, created_at
+                    FROM accounts WHERE customer_id = %s''', True),
+    'unread': ('''SELECT 'unread', unread, NULL, NULL, NULL, NULL
+                  FROM notification_counters WHERE customer_id = %s''', True),
+    'branches': ('''SELECT 'branch', branch_id, branch_name, city, NULL, NULL
+                    FROM branches''', False),
+}
+
+
+def combined_query(names, customer_id):
+    """SQL and parameters fetching every named kind of data in one statement."""
+    parts = [PARTS[name] for name in names]
+    return (' UNION ALL '.join(sql for sql, _ in parts),
+            [customer_id for _, per_customer in parts if per_customer])
+
+
+class PageData:
+    """The data one rerun of one page needs, loaded in as few round trips as possible.
+
+    ``round_trips`` counts the queries actually sent, for the sidebar.
+    """
+
+    def __init__(self, bank, customer_id, wanted=()):
+        self.bank = bank
+        self.customer_id = customer_id
+        self._wanted = set(wanted)
+        self._values = {}
+        self.round_trips = 0
+
+    def _cache_keys(self):
+        return {'accounts': ('accounts', self.customer_id), 'branches': ('branches',)}
+
+    def want(self, *names):
+        """Declare more data the page will read; it is fetched with the next load."""
+        unknown = set(names) - PARTS.keys()
+        if unknown:
+            raise ValueError(f"Unknown page data: {', '.join(sorted(unknown))}")
+        self._wanted.update(names)
+
+    def load(self):
+        """Fetch every wanted item that is neither loaded nor cached, in one query."""
+        missing = [name for name in PARTS if name in self._wanted and name not in self._values]
+        if not missing:
+            return
+        keys = self._cache_keys()
+        cached, generation = self.bank.cache.get_many([keys[name] for name in missing if name in keys])
+        for name in list(missing):
+            if keys.get(name) in cached:
+                self._values[name] = cached[keys[name]]
+                missing.remove(name)
+        if not missing:
+            return
+
+        query, params = combined_query(missing, self.customer_id)
+        with self.bank.db.session() as session:
+            session.cursor.execute(query, params)
+            rows = session.cursor.fetchall()
+        self.round_trips += 1
+
+        loaded = {'accounts': [], 'unread': 0, 'branches': []}
+        for kind, number, text1, text2, amount, created_at in rows:
+            if kind == 'account':
+                loaded['accounts'].append((number, text1, amount, text2, created_at))
+            elif kind == 'unread':
+                loaded['unread'] = number
+            else:
+                loaded['branches'].append((number, text1, text2))
+        for name in missing:
+            self._values[name] = loaded[name]
+
+        # Same keys, TTLs and tags as BankManagement.get_customer_accounts/get_branches
+        entries = []
+        if 'accounts' in missing:
+            entries.append((keys['accounts'], loaded['accounts'], None,
+                            [('account', row[0]) for row in loaded['accounts']]))
+        if 'branches' in missing:
+            entries.append((keys['branches'], loaded['branches'], REFERENCE_TTL, ()))
+        self.bank.cache.set_many(entries, generation)
+
+    def _get(self, name):
+        if name not in self._values:
+            self.want(name)
+            self.load()
+        return self._values[name]
+
+    def accounts(self):
+        """(account_id, account_type, balance, status, created_at) rows of the customer."""
+        return self._get('accounts')
+
+    def account_type(self, account_id):
+        """Type of one of the customer's accounts, or None if it is not theirs."""
+        for row in self.accounts():
+            if row[0] == account_id:
+                return row[1]
+        return None
+
+    def unread_count(self):
+        return self._get('unread')
+
+    def branches(self):
+        """(branch_id, branch_name, city) rows."""
+        return self._get('branches')
@@ -0,0 +1,156 @@
+import cProfile
+import marshal
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+from config import get_setting
+from query_stats import query_stats
+
+# Opt-in render profiler for the Streamlit app. While a page renders inside
+# PageProfiler.render(), each named phase (query, dataframe, format, ...) is
+# timed, SQL time is added automatically from query_stats, and the whole
+# render runs under cProfile. Timings are kept across reruns for
+# percentiles; the cProfile data of the last KEEP_PROFILES renders can be
+# downloaded as one pstats file (python -m pstats, snakeviz).
+
+# Profile every session (BANK_PROFILER_ENABLED=1), or only sessions opened
+# with ?profile=1 when session_flag is set
+ENABLED = get_setting('profiler', 'enabled', False, bool)
+SESSION_FLAG = get_setting('profiler', 'session_flag', False, bool)
+HISTORY = get_setting('profiler', 'history', 500, int)
+KEEP_PROFILES = get_setting('profiler', 'keep_profiles', 20, int)
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class _Render:
+    __slots__ = ('page', 'phases')
+
+    def __init__(self, page):
+        self.page = page
+        self.phases = {}
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+
+class PageProfiler:
+    """Per-page, per-phase render timings across reruns plus recent cProfile data."""
+
+    def __init__(self, history=HISTORY, keep_profiles=KEEP_PROFILES):
+        self._timings = {}   # (page, phase) -> deque of seconds
+        self._history = history
+        self._profiles = deque(maxlen=keep_profiles)   # (page, pstats dict)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.last = {}       # page -> {phase: seconds} of its latest render
+        query_stats.add_listener(self._on_query)
+
+    def _current(self):
+        return getattr(self._local, 'render', None)
+
+    def _on_query(self, statement, seconds):
+        render = self._current()
+        if render is not None:
+            render.add('sql', seconds)
+
+    @contextmanager
+    def render(self, page):
+        """Profile one render of ``page`` on this thread."""
+        render = _Render(page)
+        self._local.render = render
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Python 3.12+ allows one active profiler per process; another
+            # session is being profiled, so only time this render
+            profile = None
+        started = time.perf_counter()
+        try:
+            yield render
+        finally:
+            total = time.perf_counter() - started
+            if profile is not None:
+                profile.disable()
+            self._local.render = None
+            render.phases['total'] = total
+            self._store(render, profile)
+
+    def phase(self, name):
+        """Time a named phase of the current render (a no-op outside render())."""
+        render = self._current()
+        if render is None:
+            return nullcontext()
+        return self._phase(render, name)
+
+    @contextmanager
+    def _phase(self, render, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            render.add(name, time.perf_counter() - started)
+
+    def _store(self, render, profile):
+        stats = None
+        if profile is not None:
+            profile.create_stats()
+            stats = profile.stats
+        with self._lock:
+            for phase, seconds in render.phases.items():
+                timings = self._timings.get((render.page, phase))
+                if timings is None:
+                    timings = self._timings[(render.page, phase)] = deque(maxlen=self._history)
+                timings.append(seconds)
+            self.last[render.page] = dict(render.phases)
+            if stats is not None:
+                self._profiles.append((render.page, stats))
+
+    def summary(self):
+        """[(page, phase, renders, p50, p95, p99, max)] in milliseconds; totals first, then by p95."""
+        with self._lock:
+            timings = {key: sorted(values) for key, values in self._timings.items()}
+        rows = [(page, phase, len(values), *(percentile(values, f) * 1000 for f in (0.5, 0.95, 0.99)),
+                 values[-1] * 1000)
+                for (page, phase), values in timings.items()]
+        return sorted(rows, key=lambda row: (row[1] != 'total', -row[4]))
+
+    def dump(self):
+        """The kept renders' cProfile data merged into pstats file bytes (None if none kept)."""
+        with self._lock:
+            profiles = list(self._profiles)
+        if not profiles:
+            return None
+        merged = None
+        for _, stats in profiles:
+            holder = _StatsHolder(stats)
+            if merged is None:
+                merged = pstats.Stats(holder)
+            else:
+                merged.add(holder)
+        return marshal.dumps(merged.stats)
+
+    def profiled_renders(self):
+        with self._lock:
+            return len(self._profiles)
+
+
+class _StatsHolder:
+    """Adapter letting pstats.Stats load an in-memory profile dict."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+page_profiler = PageProfiler()
+phase = page_profiler.phase
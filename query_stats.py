@@ -0,0 +1,266 @@
+import functools
+import hashlib
+import http.server
+import os
+import re
+import threading
+import time
+
+from config import get_setting
+
+# Per-statement query instrumentation. Every cursor handed out by
+# DatabaseConnection (and the API's aiomysql cursors) is wrapped so each
+# execute is timed and counted under its normalized text - literals and
+# placeholders become ?, IN lists collapse to (?+) - so the hot or slow
+# statement shows up without MySQL's general log. Statements slower than
+# SLOW_QUERY_MS are logged with the shape of their bind values (types, never
+# the values). Counters are exposed in Prometheus text format over HTTP
+# (metrics.port) or written to a file (metrics.file) when a process exits.
+
+ENABLED = get_setting('metrics', 'enabled', True, bool)
+SLOW_QUERY_MS = get_setting('metrics', 'slow_query_ms', 200.0, float)
+# Append slow statements here instead of printing them
+SLOW_QUERY_LOG = get_setting('metrics', 'slow_query_log', None)
+METRICS_PORT = get_setting('metrics', 'port', 0, int)
+METRICS_FILE = get_setting('metrics', 'file', None)
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_REPEATED_UNION = re.compile(r'(SELECT [^()]*?)(?: UNION ALL \1)+')
+_REPEATED_ROWS = re.compile(r'\(\?\+?\)(?: ?, ?\(\?\+?\))+')
+_REPEATED_ARMS = re.compile(r'WHEN \? THEN \?(?: WHEN \? THEN \?)+', re.IGNORECASE)
+
+# Statements longer than this are normalized on every call instead of being
+# cached, so the cache holds at most about 1024 * 2 KB of SQL text
+_CACHED_SQL_LENGTH = 2048
+
+
+def _normalize(sql):
+    text = _WHITESPACE.sub(' ', sql).strip()
+    text = _STRING.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = text.replace('%s', '?')
+    text = _LIST.sub('(?+)', text)
+    # Batch size must not change the statement: VALUES rows, CASE arms and
+    # UNION ALL branches collapse like IN lists
+    text = _REPEATED_ROWS.sub('(?+), ...', text)
+    text = _REPEATED_ARMS.sub('WHEN ? THEN ? ...', text)
+    return _REPEATED_UNION.sub(r'\1 UNION ALL ...', text)
+
+
+_normalize_cached = functools.lru_cache(maxsize=1024)(_normalize)
+
+
+def normalize(sql):
+    """Statement text with values replaced, for grouping executions."""
+    if len(sql) > _CACHED_SQL_LENGTH:
+        return _normalize(sql)
+    return _normalize_cached(sql)
+
+
+def statement_id(statement):
+    """Short stable hash of a normalized statement, unique where its truncated label is not."""
+    return hashlib.sha1(statement.encode()).hexdigest()[:12]
+
+
+def bind_shape(params):
+    """Types of the bind values, e.g. "int, str x3" - never the values themselves."""
+    if params is None:
+        return ''
+    if isinstance(params, dict):
+        return ', '.join(f"{name}: {type(value).__name__}" for name, value in params.items())
+    runs = []
+    for value in params:
+        name = type(value).__name__
+        if runs and runs[-1][0] == name:
+            runs[-1][1] += 1
+        else:
+            runs.append([name, 1])
+    return ', '.join(name if count == 1 else f"{name} x{count}" for name, count in runs)
+
+
+class QueryStats:
+    """Thread-safe per-statement counters: calls, total/max seconds, rows and errors."""
+
+    def __init__(self, slow_query_ms=SLOW_QUERY_MS, slow_query_log=SLOW_QUERY_LOG):
+        self.slow_query_ms = slow_query_ms
+        self.slow_query_log = slow_query_log
+        self._stats = {}   # statement -> [calls, seconds, max seconds, rows, errors]
+        self._listeners = []
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener):
+        """Also call ``listener(statement, seconds)`` for every recorded execution."""
+        self._listeners.append(listener)
+
+    def record(self, sql, seconds, rows=0, error=False, shape=''):
+        statement = normalize(sql)
+        with self._lock:
+            entry = self._stats.get(statement)
+            if entry is None:
+                entry = self._stats[statement] = [0, 0.0, 0.0, 0, 0]
+            entry[0] += 1
+            entry[1] += seconds
+            entry[2] = max(entry[2], seconds)
+            entry[3] += max(rows, 0)
+            entry[4] += bool(error)
+        for listener in self._listeners:
+            listener(statement, seconds)
+        if seconds * 1000 >= self.slow_query_ms:
+            self._log_slow(statement, seconds, shape, error)
+
+    def _log_slow(self, statement, seconds, shape, error):
+        line = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} Slow query ({seconds * 1000:.1f} ms"
+                f"{', failed' if error else ''}): {statement} [binds: {shape or 'none'}]")
+        if not self.slow_query_log:
+            print(line)
+            return
+        with self._lock, open(self.slow_query_log, 'a') as file:
+            file.write(line + '\n')
+
+    def snapshot(self):
+        """{statement: {'calls', 'seconds', 'max_seconds', 'rows', 'errors'}}."""
+        with self._lock:
+            return {statement: dict(zip(('calls', 'seconds', 'max_seconds', 'rows', 'errors'), entry))
+                    for statement, entry in self._stats.items()}
+
+    def top(self, n=10, by='seconds'):
+        """The n statements with the most ``by`` (seconds, calls, max_seconds, rows or errors)."""
+        return sorted(self.snapshot().items(), key=lambda item: item[1][by], reverse=True)[:n]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def prometheus(self):
+        """Counters in Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        metrics = [
+            ('bank_query_calls_total', 'counter', 'Statements executed', 'calls'),
+            ('bank_query_seconds_total', 'counter', 'Time spent executing statements', 'seconds'),
+            ('bank_query_seconds_max', 'gauge', 'Slowest single execution', 'max_seconds'),
+            ('bank_query_rows_total', 'counter', 'Rows returned or affected', 'rows'),
+            ('bank_query_errors_total', 'counter', 'Executions that raised', 'errors'),
+        ]
+        lines = []
+        for name, kind, help_text, field in metrics:
+            lines.append(f"# HELP {name} {help_text}, per normalized statement.")
+            lines.append(f"# TYPE {name} {kind}")
+            for statement, values in snapshot.items():
+                label = statement[:300].replace('\\', '\\\\').replace('"', '\\"')
+                lines.append(f'{name}{{statement_id="{statement_id(statement)}",statement="{label}"}} '
+                             f'{values[field]}')
+        return '\n'.join(lines) + '\n'
+
+    def write_file(self, path):
+        """Write the Prometheus text atomically (e.g. for node_exporter's textfile collector)."""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            file.write(self.prometheus())
+        os.replace(tmp_path, path)
+
+
+query_stats = QueryStats()
+
+
+def _rows(cursor):
+    rowcount = getattr(cursor, 'rowcount', 0)
+    return rowcount if isinstance(rowcount, int) else 0
+
+
+class InstrumentedCursor:
+    """Wraps a DB-API cursor; execute/executemany/callproc are timed into QueryStats."""
+
+    def __init__(self, cursor, stats=query_stats):
+        self._cursor = cursor
+        self._stats = stats
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, sql, shape, call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = call(*args, **kwargs)
+        except Exception:
+            self._stats.record(sql, time.perf_counter() - started, error=True, shape=shape)
+            raise
+        self._stats.record(sql, time.perf_counter() - started, _rows(self._cursor), shape=shape)
+        return result
+
+    def execute(self, operation, params=None, **kwargs):
+        return self._timed(operation, bind_shape(params), self._cursor.execute, operation, params, **kwargs)
+
+    def executemany(self, operation, seq_params):
+        seq_params = list(seq_params)
+        shape = f"{len(seq_params)} rows of ({bind_shape(seq_params[0]) if seq_params else ''})"
+        return self._timed(operation, shape, self._cursor.executemany, operation, seq_params)
+
+    def callproc(self, procname, args=()):
+        return self._timed(f"CALL {procname}({', '.join(['?'] * len(args))})", bind_shape(args),
+                           self._cursor.callproc, procname, args)
+
+
+class AsyncInstrumentedCursor(InstrumentedCursor):
+    """The same for aiomysql cursors, whose execute methods are coroutines."""
+
+    async def _timed_async(self, sql, shape, coroutine):
+        started = time.perf_counter()
+        try:
+            result = await coroutine
+        except Exception:
+            self._stats.record(sql, time.perf_counter() - started, error=True, shape=shape)
+            raise
+        self._stats.record(sql, time.perf_counter() - started, _rows(self._cursor), shape=shape)
+        return result
+
+    async def execute(self, query, args=None):
+        return await self._timed_async(query, bind_shape(args), self._cursor.execute(query, args))
+
+    async def executemany(self, query, args):
+        args = list(args)
+        shape = f"{len(args)} rows of ({bind_shape(args[0]) if args else ''})"
+        return await self._timed_async(query, shape, self._cursor.executemany(query, args))
+
+    async def callproc(self, procname, args=()):
+        return await self._timed_async(f"CALL {procname}({', '.join(['?'] * len(args))})", bind_shape(args),
+                                       self._cursor.callproc(procname, args))
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    stats = query_stats
+
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = self.stats.prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port=METRICS_PORT, host='127.0.0.1'):
+    """Serve GET /metrics from a daemon thread (once per process); returns the server or None if port is 0."""
+    global _server
+    if not port:
+        return None
+    with _server_lock:
+        if _server is None:
+            _server = http.server.ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name='metrics', daemon=True).start()
+    return _server
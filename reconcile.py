@@ -0,0 +1,210 @@
+import argparse
+import csv
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from bank import SIGNED_AMOUNT_SQL
+from config import get_setting
+from database import DatabaseConnection
+from jobs import read_watermark, save_watermark, settled_watermark
+
+# Incremental proof that accounts.balance matches the ledger. For every
+# account, reconciliation_checkpoints holds the ledger balance (the signed
+# sum of its transactions) up to the job's watermark in job_watermarks.
+# A run reads only the transactions above the watermark - in parallel
+# transaction_id chunks over transactions and transactions_archive, each
+# chunk one indexed range read - and folds them into the checkpoints.
+# Balances are then compared in one consistent snapshot, adding the few
+# rows newer than the watermark, since a posting writes its balance and its
+# transaction row in the same commit. Mismatches are kept in
+# reconciliation_discrepancies until the account matches again.
+#
+# The first run reads the whole ledger once; after that a run costs
+# O(new transactions + accounts checked).
+
+RECONCILIATION_JOB = 'reconciliation'
+CHUNK_SIZE = get_setting('reconcile', 'chunk_size', 50000, int)
+WORKERS = get_setting('reconcile', 'workers', 4, int)
+# Accounts compared per statement
+BATCH_SIZE = 1000
+
+# Parameters: (first id, last id); rows are (account_id, signed sum, max id)
+CHUNK_SQL = f'''SELECT account_id, SUM({SIGNED_AMOUNT_SQL}), MAX(transaction_id)
+                FROM {{table}}
+                WHERE transaction_id BETWEEN %s AND %s
+                GROUP BY account_id'''
+
+TAIL_SQL = f'''SELECT account_id, SUM({SIGNED_AMOUNT_SQL})
+               FROM transactions
+               WHERE transaction_id > %s
+               GROUP BY account_id'''
+
+SAVE_CHECKPOINT_SQL = '''INSERT INTO reconciliation_checkpoints (account_id, ledger_balance, last_transaction_id)
+                         VALUES (%s, %s, %s)
+                         ON DUPLICATE KEY UPDATE ledger_balance = VALUES(ledger_balance),
+                                                 last_transaction_id = VALUES(last_transaction_id)'''
+
+SAVE_DISCREPANCY_SQL = '''INSERT INTO reconciliation_discrepancies
+                          (account_id, balance, expected_balance, difference, checked_through)
+                          VALUES (%s, %s, %s, %s, %s)
+                          ON DUPLICATE KEY UPDATE balance = VALUES(balance),
+                                                  expected_balance = VALUES(expected_balance),
+                                                  difference = VALUES(difference),
+                                                  checked_through = VALUES(checked_through)'''
+
+
+def id_chunks(after_id, through_id, chunk_size):
+    """Inclusive transaction_id ranges covering (after_id, through_id]."""
+    return [(start, min(start + chunk_size - 1, through_id))
+            for start in range(after_id + 1, through_id + 1, chunk_size)]
+
+
+def ledger_deltas(db, first_id, last_id):
+    """{account_id: [signed sum, max transaction_id]} for one id range of the ledger.
+
+    Both tables are read in the same snapshot, so a row the archive job
+    moves meanwhile is seen exactly once.
+    """
+    deltas = {}
+    with db.session() as session:
+        for table in ('transactions', 'transactions_archive'):
+            session.cursor.execute(CHUNK_SQL.format(table=table), (first_id, last_id))
+            for account_id, total, max_id in session.cursor.fetchall():
+                merge_delta(deltas, account_id, total, max_id)
+    return deltas
+
+
+def merge_delta(deltas, account_id, total, max_id):
+    entry = deltas.get(account_id)
+    if entry is None:
+        deltas[account_id] = [total, max_id]
+    else:
+        entry[0] += total
+        entry[1] = max(entry[1], max_id)
+
+
+def _in_list(column, ids):
+    return f"{column} IN ({', '.join(['%s'] * len(ids))})"
+
+
+def _accounts_to_check(cursor, deltas, all_accounts):
+    """Sorted account_ids to compare: every account, or those with new rows or an open discrepancy."""
+    if all_accounts:
+        cursor.execute("SELECT account_id FROM accounts")
+    else:
+        cursor.execute("SELECT account_id FROM reconciliation_discrepancies")
+    return sorted(set(deltas) | {row[0] for row in cursor.fetchall()})
+
+
+def compare_balances(cursor, account_ids, deltas, tail, through_id):
+    """Fold ``deltas`` into the checkpoints of ``account_ids`` and compare balances.
+
+    Returns the discrepancies as (account_id, balance, expected, difference).
+    """
+    cursor.execute(f"SELECT account_id, balance FROM accounts WHERE {_in_list('account_id', account_ids)}",
+                   account_ids)
+    balances = dict(cursor.fetchall())
+    cursor.execute(f'''SELECT account_id, ledger_balance FROM reconciliation_checkpoints
+                       WHERE {_in_list('account_id', account_ids)}''', account_ids)
+    checkpoints = dict(cursor.fetchall())
+
+    saved = []
+    found = []
+    for account_id in account_ids:
+        ledger = checkpoints.get(account_id, Decimal('0'))
+        if account_id in deltas:
+            ledger += deltas[account_id][0]
+            saved.append((account_id, ledger, deltas[account_id][1]))
+        # Archived history can outlive its account; only live accounts are compared
+        if account_id not in balances:
+            continue
+        expected = ledger + tail.get(account_id, Decimal('0'))
+        if balances[account_id] != expected:
+            found.append((account_id, balances[account_id], expected, balances[account_id] - expected))
+
+    if saved:
+        cursor.executemany(SAVE_CHECKPOINT_SQL, saved)
+    mismatched = {row[0] for row in found}
+    matched = [account_id for account_id in account_ids
+               if account_id in balances and account_id not in mismatched]
+    if matched:
+        cursor.execute(f"DELETE FROM reconciliation_discrepancies WHERE {_in_list('account_id', matched)}",
+                       matched)
+    if found:
+        cursor.executemany(SAVE_DISCREPANCY_SQL, [(*row, through_id) for row in found])
+    return found
+
+
+def reconcile(db, chunk_size=CHUNK_SIZE, workers=WORKERS, all_accounts=False):
+    """Bring the checkpoints up to date and compare balances; returns a summary dict.
+
+    The job's watermark row stays locked for the whole run, so concurrent
+    runs queue instead of counting the same transactions twice. With
+    ``all_accounts`` every account is compared, not only those with new
+    transactions or an open discrepancy.
+    """
+    with db.session() as session:
+        cursor = session.cursor
+        watermark = read_watermark(cursor, RECONCILIATION_JOB)
+        through_id = settled_watermark(cursor, watermark)
+        chunks = id_chunks(watermark, through_id, chunk_size)
+
+        deltas = {}
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for chunk_deltas in executor.map(lambda chunk: ledger_deltas(db, *chunk), chunks):
+                for account_id, (total, max_id) in chunk_deltas.items():
+                    merge_delta(deltas, account_id, total, max_id)
+
+        # Balances and the rows above the new watermark are read in one snapshot
+        cursor.execute(TAIL_SQL, (through_id,))
+        tail = dict(cursor.fetchall())
+        account_ids = _accounts_to_check(cursor, deltas, all_accounts)
+        discrepancies = []
+        for start in range(0, len(account_ids), BATCH_SIZE):
+            discrepancies.extend(compare_balances(cursor, account_ids[start:start + BATCH_SIZE],
+                                                  deltas, tail, through_id))
+
+        save_watermark(cursor, RECONCILIATION_JOB, through_id)
+        session.connection.commit()
+
+    return {'from_id': watermark, 'through_id': through_id, 'chunks': len(chunks),
+            'accounts_checked': len(account_ids), 'discrepancies': discrepancies}
+
+
+def write_report(path, summary):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['account_id', 'balance', 'expected_balance', 'difference', 'checked_through'])
+        for row in summary['discrepancies']:
+            writer.writerow([*row, summary['through_id']])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check account balances against the ledger incrementally.")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="transaction_ids per parallel chunk")
+    parser.add_argument('--workers', type=int, default=WORKERS, help="Chunks read concurrently")
+    parser.add_argument('--all-accounts', action='store_true',
+                        help="Compare every account, not only those with new transactions")
+    parser.add_argument('--report', help="Write this run's discrepancies to a CSV file")
+    args = parser.parse_args()
+
+    # One connection holds the watermark lock while the workers read chunks
+    db = DatabaseConnection(pool_size=args.workers + 1)
+    try:
+        summary = reconcile(db, args.chunk_size, args.workers, args.all_accounts)
+    finally:
+        db.close_connection()
+
+    if args.report:
+        write_report(args.report, summary)
+    print(f"Reconciled transactions {summary['from_id'] + 1}-{summary['through_id']} in {summary['chunks']} chunks; "
+          f"{summary['accounts_checked']} accounts checked, {len(summary['discrepancies'])} discrepancies")
+    for account_id, balance, expected, difference in summary['discrepancies'][:20]:
+        print(f"  account {account_id}: balance {balance}, ledger {expected} (difference {difference})")
+    if summary['discrepancies']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import datetime
+import random
+
+from auth import hash_password
+
+# Deterministic synthetic data for local performance work (query-plan checks,
+# benchmarks). Only ever run this against a scratch database.
+
+SEED_TABLES = [
+    'branches', 'customers', 'accounts', 'transactions', 'loans',
+    'credit_cards', 'fixed_deposits', 'beneficiaries', 'notifications',
+]
+
+
+def _insert_many(session, query, rows, batch_size=1000):
+    for start in range(0, len(rows), batch_size):
+        session.cursor.executemany(query, rows[start:start + batch_size])
+    session.connection.commit()
+
+
+def seed(db, customers=1000, accounts_per_customer=2, transactions_per_account=20, random_seed=42):
+    """Fill an empty database with synthetic rows; returns False if it already has customers."""
+    rng = random.Random(random_seed)
+    now = datetime.datetime.now().replace(microsecond=0)
+    today = now.date()
+
+    with db.session() as session:
+        cursor = session.cursor
+        cursor.execute("SELECT COUNT(*) FROM customers")
+        if cursor.fetchone()[0]:
+            print("Database already has customers; skipping seed")
+            return False
+
+        _insert_many(session, '''INSERT INTO branches (branch_name, branch_code, address, city, state, phone, email)
+                                 VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                     [(f"Branch {i}", f"BR{i:04d}", f"{i} Main St", "City", "State", "1234567890",
+                       f"branch{i}@bank.example") for i in range(1, 6)])
+        cursor.execute("SELECT branch_id FROM branches")
+        branch_ids = [row[0] for row in cursor.fetchall()]
+
+        # One hash shared by every seed customer; each login is "password"
+        password = hash_password("password")
+
+        _insert_many(session, '''INSERT INTO customers (branch_id, name, address, phone, email, password)
+                                 VALUES (%s, %s, %s, %s, %s, %s)''',
+                     [(rng.choice(branch_ids), f"Customer {i}", f"{i} Seed Rd", "5550000000",
+                       f"seed{i}@example.com", password) for i in range(customers)])
+        cursor.execute("SELECT customer_id, branch_id FROM customers ORDER BY customer_id")
+        customer_rows = cursor.fetchall()
+
+        _insert_many(session, '''INSERT INTO accounts (customer_id, branch_id, account_type, balance, interest_rate)
+                                 VALUES (%s, %s, %s, %s, %s)''',
+                     [(customer_id, branch_id, 'Savings' if n == 0 else 'Checking', 1000000, 3.5)
+                      for customer_id, branch_id in customer_rows for n in range(accounts_per_customer)])
+        cursor.execute("SELECT account_id, customer_id FROM accounts ORDER BY account_id")
+        account_rows = cursor.fetchall()
+
+        transactions = []
+        for account_id, _ in account_rows:
+            for _ in range(transactions_per_account):
+                txn_type = rng.choice(('deposit', 'withdrawal'))
+                when = now - datetime.timedelta(minutes=rng.randrange(3 * 365 * 24 * 60))
+                transactions.append((account_id, txn_type, rng.randrange(100, 50000) / 100,
+                                     f"Seed {txn_type}", when))
+        _insert_many(session, '''INSERT INTO transactions (account_id, type, amount, description, transaction_date)
+                                 VALUES (%s, %s, %s, %s, %s)''', transactions)
+
+        _insert_many(session, '''INSERT INTO loans (customer_id, branch_id, loan_type, amount, interest_rate,
+                                                    term_months, start_date, end_date, status)
+                                 VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)''',
+                     [(customer_id, branch_id, 'Personal', 100000, 8.5, 36, today,
+                       today + datetime.timedelta(days=30 * 36), 'pending')
+                      for customer_id, branch_id in customer_rows[::2]])
+
+        _insert_many(session, '''INSERT INTO credit_cards (customer_id, card_number, card_type, expiry_date,
+                                                           credit_limit, status)
+                                 VALUES (%s, %s, %s, %s, %s, %s)''',
+                     [(customer_id, f"9{i:015d}", 'Silver', today + datetime.timedelta(days=4 * 365),
+                       10000, 'active') for i, (customer_id, _) in enumerate(customer_rows)])
+
+        _insert_many(session, '''INSERT INTO fixed_deposits (account_id, amount, interest_rate, term_months,
+                                                             start_date, maturity_date)
+                                 VALUES (%s, %s, %s, %s, %s, %s)''',
+                     [(account_id, 10000, 6.0, 12, today, today + datetime.timedelta(days=360))
+                      for account_id, _ in account_rows[::2]])
+
+        _insert_many(session, '''INSERT INTO beneficiaries (customer_id, account_id, name, account_number,
+                                                            bank_name, ifsc_code, relationship)
+                                 VALUES (%s, %s, %s, %s, %s, %s, %s)''',
+                     [(customer_id, account_id, f"Beneficiary {account_id}", f"{account_id:012d}",
+                       "Other Bank", "OTHR0000001", 'Friend') for account_id, customer_id in account_rows])
+
+        _insert_many(session, '''INSERT INTO notifications (customer_id, title, message, type, is_read)
+                                 VALUES (%s, %s, %s, %s, %s)''',
+                     [(customer_id, "Welcome", "Seed notification", 'info', n % 3 == 0)
+                      for customer_id, _ in customer_rows for n in range(10)])
+
+        cursor.execute(f"ANALYZE TABLE {', '.join(SEED_TABLES)}")
+        cursor.fetchall()
+
+    print(f"Seeded {len(customer_rows)} customers, {len(account_rows)} accounts, "
+          f"{len(transactions)} transactions")
+    return True
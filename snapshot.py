@@ -0,0 +1,359 @@
+import argparse
+import csv
+import datetime
+import gzip
+import hashlib
+import json
+import os
+import queue
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from mysql.connector import Error
+
+import migrations
+from config import get_setting
+from database import DatabaseConnection
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # only needed for --format parquet
+    pa = pq = None
+
+# Parallel snapshot export and restore. Every table is cut into primary-key
+# ranges and each range is written to its own compressed chunk file by a pool
+# of workers; manifest.json records the columns, row counts and SHA-256 of
+# every chunk. All workers read inside one consistent snapshot: the exporter
+# briefly holds FLUSH TABLES WITH READ LOCK while each worker starts its
+# transaction. Restore verifies the checksums, then loads chunks in parallel
+# with foreign key and unique checks switched off for its sessions.
+
+WORKERS = get_setting('snapshot', 'workers', 4, int)
+CHUNK_ROWS = get_setting('snapshot', 'chunk_rows', 50000, int)
+# Rows per multi-row INSERT on restore
+BATCH_ROWS = get_setting('snapshot', 'batch_rows', 1000, int)
+
+FORMATS = {'csv': '.csv.gz', 'parquet': '.parquet'}
+MANIFEST = 'manifest.json'
+NULL = '\\N'
+
+# schema_version comes from migrations on the target; notification_counters
+# is rebuilt by the notification triggers as notifications are restored
+SKIP_TABLES = ('schema_version', 'notification_counters')
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+
+
+def table_layout(cursor):
+    """{table: (columns, primary key columns, first key column is an integer)}."""
+    cursor.execute('''SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, k.ORDINAL_POSITION
+                      FROM information_schema.COLUMNS c
+                      JOIN information_schema.TABLES t
+                        ON t.TABLE_SCHEMA = c.TABLE_SCHEMA AND t.TABLE_NAME = c.TABLE_NAME
+                      LEFT JOIN information_schema.KEY_COLUMN_USAGE k
+                        ON k.TABLE_SCHEMA = c.TABLE_SCHEMA AND k.TABLE_NAME = c.TABLE_NAME
+                       AND k.COLUMN_NAME = c.COLUMN_NAME AND k.CONSTRAINT_NAME = 'PRIMARY'
+                      WHERE c.TABLE_SCHEMA = DATABASE() AND t.TABLE_TYPE = 'BASE TABLE'
+                      ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION''')
+    columns, keys, types = {}, {}, {}
+    for table, column, data_type, key_position in cursor.fetchall():
+        if table in SKIP_TABLES:
+            continue
+        columns.setdefault(table, []).append(column)
+        types[(table, column)] = data_type
+        if key_position is not None:
+            keys.setdefault(table, []).append((key_position, column))
+    layout = {}
+    for table, names in columns.items():
+        key = [column for _, column in sorted(keys.get(table, []))]
+        layout[table] = (names, key, bool(key) and types[(table, key[0])] in INTEGER_TYPES)
+    return layout
+
+
+def plan_chunks(cursor, layout, chunk_rows):
+    """Export tasks (table, chunk number, first key, last key).
+
+    Tables keyed on an integer are split into ranges of ``chunk_rows`` key
+    values on the first key column; other tables are one chunk.
+    """
+    tasks = []
+    for table, (_, key, integer_key) in layout.items():
+        if not integer_key:
+            tasks.append((table, 0, None, None))
+            continue
+        cursor.execute(f"SELECT MIN(`{key[0]}`), MAX(`{key[0]}`) FROM `{table}`")
+        low, high = cursor.fetchone()
+        if low is None:
+            continue
+        for number, start in enumerate(range(low, high + 1, chunk_rows)):
+            tasks.append((table, number, start, start + chunk_rows - 1))
+    return tasks
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_chunk(path, file_format, columns, rows):
+    if file_format == 'parquet':
+        values = list(zip(*rows))
+        pq.write_table(pa.table({name: pa.array(values[i]) for i, name in enumerate(columns)}),
+                       path, compression='zstd')
+        return
+    with gzip.open(path, 'wt', newline='', compresslevel=6) as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        writer.writerows([NULL if value is None else value for value in row] for row in rows)
+
+
+def read_chunk(path, file_format, columns):
+    if file_format == 'parquet':
+        table = pq.read_table(path, columns=columns)
+        return list(zip(*(table.column(name).to_pylist() for name in columns)))
+    with gzip.open(path, 'rt', newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        if header != columns:
+            raise ValueError(f"{path}: columns {header} do not match the manifest")
+        return [tuple(None if value == NULL else value for value in row) for row in reader]
+
+
+def _export_chunk(cursor, directory, file_format, layout, task):
+    table, number, first, last = task
+    columns, key, _ = layout[table]
+    column_list = ', '.join(f"`{column}`" for column in columns)
+    order = ', '.join(f"`{column}`" for column in key) or column_list
+    if first is None:
+        cursor.execute(f"SELECT {column_list} FROM `{table}` ORDER BY {order}")
+    else:
+        cursor.execute(f'''SELECT {column_list} FROM `{table}`
+                           WHERE `{key[0]}` BETWEEN %s AND %s ORDER BY {order}''', (first, last))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    name = f"{table}.{number:05d}{FORMATS[file_format]}"
+    path = os.path.join(directory, name)
+    write_chunk(path, file_format, columns, rows)
+    return table, {'file': name, 'rows': len(rows), 'bytes': os.path.getsize(path), 'sha256': file_checksum(path)}
+
+
+def _drain(cursor, tasks, directory, file_format, layout):
+    entries = []
+    while True:
+        try:
+            task = tasks.get_nowait()
+        except queue.Empty:
+            return entries
+        entry = _export_chunk(cursor, directory, file_format, layout, task)
+        if entry is not None:
+            entries.append(entry)
+
+
+def _start_snapshots(lock_session, sessions):
+    """Start one consistent-snapshot transaction per worker; returns True if they share a point in time."""
+    locked = True
+    try:
+        lock_session.cursor.execute("FLUSH TABLES WITH READ LOCK")
+    except Error as e:
+        # Needs the RELOAD privilege; without it each worker sees its own snapshot
+        print(f"Warning: could not lock tables ({e}); chunks may come from slightly different points in time")
+        locked = False
+    try:
+        for session in sessions:
+            session.cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT, READ ONLY")
+    finally:
+        if locked:
+            lock_session.cursor.execute("UNLOCK TABLES")
+    return locked
+
+
+def write_manifest(directory, manifest):
+    path = os.path.join(directory, MANIFEST)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as file:
+        json.dump(manifest, file, indent=2)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_manifest(directory):
+    with open(os.path.join(directory, MANIFEST), 'r') as file:
+        return json.load(file)
+
+
+def export_snapshot(db, directory, file_format='csv', workers=WORKERS, chunk_rows=CHUNK_ROWS):
+    """Write every table to ``directory`` in parallel chunks and return the manifest.
+
+    Uses ``workers`` + 1 pooled connections at once, so size the pool for it.
+    Raises ValueError if the directory already holds a snapshot or the
+    format is unavailable.
+    """
+    if file_format not in FORMATS:
+        raise ValueError(f"Unknown format {file_format!r}; expected one of {', '.join(FORMATS)}")
+    if file_format == 'parquet' and pq is None:
+        raise ValueError("The parquet format needs pyarrow (pip install pyarrow)")
+    if os.path.exists(os.path.join(directory, MANIFEST)):
+        raise ValueError(f"{directory} already contains a snapshot")
+    os.makedirs(directory, exist_ok=True)
+
+    with ExitStack() as stack:
+        lock_session = stack.enter_context(db.session())
+        sessions = [stack.enter_context(db.session()) for _ in range(workers)]
+        consistent = _start_snapshots(lock_session, sessions)
+
+        cursor = sessions[0].cursor
+        schema_version = migrations.current_version(cursor)
+        layout = table_layout(cursor)
+        tasks = queue.Queue()
+        for task in plan_chunks(cursor, layout, chunk_rows):
+            tasks.put(task)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_drain, session.cursor, tasks, directory, file_format, layout)
+                       for session in sessions]
+            entries = [entry for future in futures for entry in future.result()]
+
+    tables = {table: {'columns': columns, 'rows': 0, 'chunks': []} for table, (columns, _, _) in layout.items()}
+    for table, chunk in sorted(entries, key=lambda entry: entry[1]['file']):
+        tables[table]['chunks'].append(chunk)
+        tables[table]['rows'] += chunk['rows']
+    manifest = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'format': file_format,
+        'schema_version': schema_version,
+        'consistent': consistent,
+        'tables': tables,
+    }
+    write_manifest(directory, manifest)
+    return manifest
+
+
+def verify_snapshot(directory, manifest, workers=WORKERS):
+    """Return the chunk files whose size or checksum does not match the manifest."""
+    chunks = [chunk for table in manifest['tables'].values() for chunk in table['chunks']]
+
+    def damaged(chunk):
+        path = os.path.join(directory, chunk['file'])
+        try:
+            return os.path.getsize(path) != chunk['bytes'] or file_checksum(path) != chunk['sha256']
+        except OSError:
+            return True
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return [chunk['file'] for chunk, bad in zip(chunks, executor.map(damaged, chunks)) if bad]
+
+
+def _load_chunk(db, directory, file_format, table, columns, chunk, batch_rows):
+    rows = read_chunk(os.path.join(directory, chunk['file']), file_format, columns)
+    if len(rows) != chunk['rows']:
+        raise ValueError(f"{chunk['file']}: {len(rows)} rows, manifest says {chunk['rows']}")
+    insert = f'''INSERT INTO `{table}` ({', '.join(f"`{column}`" for column in columns)})
+                 VALUES ({', '.join(['%s'] * len(columns))})'''
+    with db.session() as session:
+        cursor = session.cursor
+        cursor.execute("SET SESSION foreign_key_checks = 0, unique_checks = 0")
+        try:
+            for start in range(0, len(rows), batch_rows):
+                cursor.executemany(insert, rows[start:start + batch_rows])
+            session.connection.commit()
+        finally:
+            # The connection goes back to the pool
+            cursor.execute("SET SESSION foreign_key_checks = 1, unique_checks = 1")
+    return len(rows)
+
+
+def restore_snapshot(db, directory, workers=WORKERS, batch_rows=BATCH_ROWS):
+    """Load a snapshot into the (migrated, empty) database behind ``db``.
+
+    Checksums are verified before anything is written. Raises ValueError
+    when the snapshot is damaged, was taken at another schema version, or a
+    target table already has rows. Returns a summary dict; ``failed`` lists
+    chunks that could not be loaded.
+    """
+    manifest = load_manifest(directory)
+    if manifest['format'] == 'parquet' and pq is None:
+        raise ValueError("This snapshot is in parquet format, which needs pyarrow (pip install pyarrow)")
+    damaged = verify_snapshot(directory, manifest, workers)
+    if damaged:
+        raise ValueError(f"Checksum mismatch in {len(damaged)} chunk files, e.g. {damaged[0]}")
+
+    with db.session() as session:
+        version = migrations.current_version(session.cursor)
+        if version != manifest['schema_version']:
+            raise ValueError(f"Snapshot is at schema version {manifest['schema_version']}, "
+                             f"target database is at {version}")
+        populated = []
+        for table in manifest['tables']:
+            session.cursor.execute(f"SELECT 1 FROM `{table}` LIMIT 1")
+            if session.cursor.fetchone():
+                populated.append(table)
+    if populated:
+        raise ValueError(f"Target tables are not empty: {', '.join(populated)}")
+
+    # Largest chunks first, so one big table does not finish last on its own
+    chunks = sorted(((table, spec['columns'], chunk) for table, spec in manifest['tables'].items()
+                     for chunk in spec['chunks']), key=lambda item: -item[2]['bytes'])
+    summary = {'tables': len(manifest['tables']), 'chunks': 0, 'rows': 0, 'failed': []}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_load_chunk, db, directory, manifest['format'], table, columns, chunk,
+                                   batch_rows): chunk['file']
+                   for table, columns, chunk in chunks}
+        for future, name in futures.items():
+            try:
+                summary['rows'] += future.result()
+                summary['chunks'] += 1
+            except (Error, ValueError, OSError) as e:
+                print(f"Error loading {name}: {e}")
+                summary['failed'].append(name)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel snapshot export and restore of the bank database.")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Write a snapshot directory")
+    export.add_argument('directory', nargs='?',
+                        help="Output directory (default: exports/snapshot_<timestamp>)")
+    export.add_argument('--format', choices=list(FORMATS), default='csv', help="Chunk file format")
+    export.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help="Primary key values per chunk")
+    export.add_argument('--workers', type=int, default=WORKERS, help="Chunks written concurrently")
+    restore = commands.add_parser('restore', help="Load a snapshot into an empty, migrated database")
+    restore.add_argument('directory', help="Snapshot directory (contains manifest.json)")
+    restore.add_argument('--workers', type=int, default=WORKERS, help="Chunks loaded concurrently")
+    restore.add_argument('--batch-rows', type=int, default=BATCH_ROWS, help="Rows per INSERT statement")
+    args = parser.parse_args()
+
+    db = DatabaseConnection(pool_size=args.workers + 1)
+    started = time.monotonic()
+    try:
+        if args.command == 'export':
+            directory = args.directory or os.path.join(
+                'exports', f"snapshot_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}")
+            manifest = export_snapshot(db, directory, args.format, args.workers, args.chunk_rows)
+            rows = sum(table['rows'] for table in manifest['tables'].values())
+            chunks = sum(len(table['chunks']) for table in manifest['tables'].values())
+            print(f"Exported {rows:,} rows in {chunks} chunks to {directory} "
+                  f"in {time.monotonic() - started:.1f}s")
+        else:
+            summary = restore_snapshot(db, args.directory, args.workers, args.batch_rows)
+            print(f"Restored {summary['rows']:,} rows in {summary['chunks']} chunks "
+                  f"in {time.monotonic() - started:.1f}s")
+            if summary['failed']:
+                print(f"{len(summary['failed'])} chunks failed; truncate the tables and restore again")
+                sys.exit(1)
+    except (Error, ValueError, OSError) as e:
+        print(f"Snapshot {args.command} failed: {e}")
+        sys.exit(1)
+    finally:
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    main()
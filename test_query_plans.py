@@ -0,0 +1,36 @@
+import pytest
+
+from config import get_setting
+
+# Query-plan regression tests: every entry of explain_check.QUERIES is
+# EXPLAINed against a seeded scratch database. Set [explain] database (or
+# BANK_EXPLAIN_DATABASE) to a database the tests may create and fill;
+# without it the tests are skipped.
+
+DATABASE = get_setting('explain', 'database')
+CUSTOMERS = get_setting('explain', 'customers', 2000, int)
+
+pytestmark = pytest.mark.skipif(DATABASE is None, reason="no [explain] database configured")
+
+pytest.importorskip('mysql.connector')
+
+import explain_check  # noqa: E402
+
+
+@pytest.fixture(scope='module')
+def explain_cursor():
+    db = explain_check.DatabaseConnection(database=DATABASE, auto_migrate=True)
+    try:
+        explain_check.seed(db, customers=CUSTOMERS)
+        with db.session() as session:
+            yield session.cursor, explain_check.sample_values(session.cursor)
+    finally:
+        db.close_connection()
+
+
+@pytest.mark.parametrize('name, sql, param_keys, allowed', explain_check.QUERIES,
+                         ids=[entry[0] for entry in explain_check.QUERIES])
+def test_query_plan(explain_cursor, name, sql, param_keys, allowed):
+    cursor, values = explain_cursor
+    problems, summary = explain_check.check_query(cursor, values, sql, param_keys, allowed)
+    assert not problems, f"{name}: {', '.join(problems)} [{summary}]"